@@ -0,0 +1,142 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main as cli
+from generators.schema_model import compile_schema
+from synthetic_schema import add_schema_arguments, make_schema, schema_parameters
+
+# Times and memory-profiles every generator registered in main.py against a
+# synthetic schema:
+#   python benchmarks/bench_generators.py --preset 1k --output results.json
+# Each generator runs --repeat times for wall and CPU time (best run kept),
+# then once more under tracemalloc for its peak Python memory. Generators run
+# in a scratch directory, so nothing is written to the working tree.
+
+
+def tool_version():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def output_bytes(directory):
+    total = 0
+    for dirpath, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            total += os.path.getsize(os.path.join(dirpath, file_name))
+    return total
+
+
+def run_once(generator, schema, trace=False):
+    # Runs in a fresh scratch directory; generator chatter is discarded
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            if trace:
+                tracemalloc.start()
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                generator(schema)
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak = None
+            if trace:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            return wall, cpu, peak, output_bytes(workdir)
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            os.chdir(cwd)
+
+
+def benchmark(schema, options, repeat):
+    results = []
+    for option in options:
+        name = cli.GENERATORS[option][0]
+        entry = {'option': option, 'name': name}
+        try:
+            generator = cli.get_generator(option)
+            runs = [run_once(generator, schema) for _ in range(repeat)]
+            _, _, peak, written = run_once(generator, schema, trace=True)
+            entry.update({
+                'wall_s': min(run[0] for run in runs),
+                'cpu_s': min(run[1] for run in runs),
+                'peak_bytes': peak,
+                'output_bytes': written,
+                'error': None,
+            })
+        except Exception as e:
+            # e.g. an optional dependency that is not installed
+            entry['error'] = f'{type(e).__name__}: {e}'
+        results.append(entry)
+        if entry['error'] is None:
+            print(f"  {option:>2} {name:<10} {entry['wall_s']:9.4f}s wall {entry['cpu_s']:9.4f}s cpu "
+                  f"{entry['peak_bytes'] / 1e6:9.1f} MB peak {entry['output_bytes'] / 1e6:9.1f} MB out")
+        else:
+            print(f"  {option:>2} {name:<10} failed: {entry['error']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every generator on a synthetic CDS schema")
+    add_schema_arguments(parser)
+    parser.add_argument('--generators', default=None,
+                        help="Comma-separated generator numbers (default: all registered in main.py)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', '-o', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    params = schema_parameters(args)
+    options = [int(part) for part in args.generators.split(',')] if args.generators else list(cli.GENERATORS)
+
+    start = time.perf_counter()
+    raw = make_schema(**params)
+    synthesize = time.perf_counter() - start
+
+    start = time.perf_counter()
+    schema = compile_schema(raw)
+    compile_time = time.perf_counter() - start
+
+    columns = sum(len(table.columns) for table in schema.tables)
+    relationships = sum(len(column.relationships) for table in schema.tables for column in table.columns)
+    print(f"Schema: {len(schema.tables)} tables, {columns} columns, {relationships} relationships "
+          f"(synthesized in {synthesize:.3f}s, compiled in {compile_time:.3f}s)")
+
+    results = benchmark(schema, options, args.repeat)
+
+    report = {
+        'tool_version': tool_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'preset': args.preset,
+        'parameters': params,
+        'schema': {'tables': len(schema.tables), 'columns': columns, 'relationships': relationships},
+        'repeat': args.repeat,
+        'compile_s': compile_time,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to '{args.output}'")
+
+
+if __name__ == '__main__':
+    main()
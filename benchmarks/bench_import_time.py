@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main as cli
+
+# Measures CLI startup: importing main.py alone, then main.py plus each
+# generator, every time in a fresh interpreter:
+#   python benchmarks/bench_import_time.py --repeat 10
+# The best of --repeat runs is kept. It fails (exit status 1) when importing
+# main.py loads any generator module, or when --max-startup-ms is given and
+# the bare import is slower than that.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Runs in the child interpreter; prints its measurements as JSON
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+startup = time.perf_counter() - start
+option = int(sys.argv[1])
+error = None
+if option:
+    try:
+        main.load_generator(option)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+total = time.perf_counter() - start
+print(json.dumps({
+    'startup_s': startup,
+    'total_s': total,
+    'modules': len(sys.modules),
+    'generators': sorted(name for name in sys.modules if name.startswith('generators.generate_')),
+    'error': error,
+}))
+"""
+
+
+def probe(option):
+    # option 0 imports main.py only
+    result = subprocess.run([sys.executable, '-c', PROBE, str(option)], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def measure(option, repeat):
+    runs = [probe(option) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run['total_s'])
+    best['startup_s'] = min(run['startup_s'] for run in runs)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure main.py import time, alone and per generator")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-startup-ms', type=float, default=None,
+                        help="Fail when importing main.py alone takes longer than this")
+    parser.add_argument('--output', '-o', default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    bare = measure(0, args.repeat)
+    print(f"  {'main.py':<16} {bare['startup_s'] * 1000:8.1f} ms {bare['modules']:>5} modules")
+
+    results = []
+    for option, (name, _) in cli.GENERATORS.items():
+        entry = dict(measure(option, args.repeat), option=option, name=name)
+        results.append(entry)
+        if entry['error'] is None:
+            print(f"  {option:>2} {name:<13} {entry['total_s'] * 1000:8.1f} ms {entry['modules']:>5} modules")
+        else:
+            print(f"  {option:>2} {name:<13} failed: {entry['error']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat, 'main': bare,
+                       'generators': results}, f, indent=2)
+        print(f"Results written to '{args.output}'")
+
+    failed = False
+    if bare['generators']:
+        print(f"Error: importing main.py loads generator modules: {', '.join(bare['generators'])}")
+        failed = True
+    if args.max_startup_ms is not None and bare['startup_s'] * 1000 > args.max_startup_ms:
+        print(f"Error: importing main.py took {bare['startup_s'] * 1000:.1f} ms "
+              f"(limit {args.max_startup_ms:.1f} ms)")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from generators.schema_loader import available_backends, load_raw
+from generators.schema_model import compile_schema
+
+# Compares the schema loading backends on one schema file:
+#   python benchmarks/bench_schema_load.py <schema_file_path> [--repeat N]
+# Reports the best of N runs for decoding alone and for decoding plus
+# compiling, with and without memory-mapping.
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the schema loading backends")
+    parser.add_argument('schema_path')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    size = os.path.getsize(args.schema_path)
+    print(f"{args.schema_path}: {size / 1e6:.1f} MB, best of {args.repeat}")
+    print(f"  {'backend':<10} {'mmap':<5} {'decode':>10} {'+compile':>10} {'MB/s':>8}")
+    for backend in available_backends():
+        for use_mmap in (True, False):
+            decode = best_of(args.repeat, lambda: load_raw(args.schema_path, backend, use_mmap))
+            total = best_of(args.repeat, lambda: compile_schema(load_raw(args.schema_path, backend, use_mmap)))
+            print(f"  {backend:<10} {'yes' if use_mmap else 'no':<5} {decode:10.4f} {total:10.4f} {size / 1e6 / decode:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import json
+import random
+import uuid
+
+# Synthetic CDS schemas for benchmarking.
+#
+# Tables are split into fk_depth + 1 levels; foreign keys and Array columns
+# only reference tables one level down, so the longest foreign key chain is
+# exactly fk_depth. The same parameters and seed always give the same schema.
+
+COLUMN_TYPES = ['VARCHAR(255)', 'INT', 'FLOAT', 'BOOLEAN', 'DATE', 'DATETIME', 'BLOB', 'Array(VARCHAR(255))']
+PROPERTY_TYPES = ['nullable', 'PrimaryKey', 'indexed', 'unique']
+RELATIONSHIP_TYPES = ['ForeignKey', 'OneToOne', 'ManyToMany']
+
+# Scalar types plain data columns are drawn from
+DATA_TYPES = COLUMN_TYPES[:7]
+
+PRESETS = {
+    '10': {'tables': 10, 'columns': 8, 'relationship_density': 0.2, 'array_ratio': 0.1, 'fk_depth': 3},
+    '1k': {'tables': 1000, 'columns': 12, 'relationship_density': 0.15, 'array_ratio': 0.05, 'fk_depth': 8},
+    '50k': {'tables': 50000, 'columns': 12, 'relationship_density': 0.1, 'array_ratio': 0.05, 'fk_depth': 20},
+}
+
+
+def make_schema(tables=10, columns=8, relationship_density=0.2, array_ratio=0.1, fk_depth=3, seed=0):
+    # columns counts every column of a table, the UUID primary key included.
+    # relationship_density is the share of the other columns that are foreign
+    # keys, array_ratio the share that are Array columns.
+    rng = random.Random(seed)
+
+    def new_uuid():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    column_types = {name: new_uuid() for name in COLUMN_TYPES}
+    property_types = {name: new_uuid() for name in PROPERTY_TYPES}
+    relationship_types = {name: new_uuid() for name in RELATIONSHIP_TYPES}
+
+    # Every table gets its identity first so references can point anywhere
+    levels = fk_depth + 1
+    raw_tables = []
+    for index in range(tables):
+        raw_tables.append({
+            'uuid': new_uuid(),
+            'name': f'Table{index:05d}',
+            'level': index % levels,
+            'key_uuid': new_uuid(),
+        })
+    by_level = [[table for table in raw_tables if table['level'] == level] for level in range(levels)]
+
+    schema_tables = []
+    for table in raw_tables:
+        table_columns = [{
+            'uuid': table['key_uuid'],
+            'name': 'UUID',
+            'type': column_types['VARCHAR(255)'],
+            'properties': [
+                {'type': property_types['PrimaryKey'], 'value': 'true'},
+                {'type': property_types['nullable'], 'value': False},
+            ],
+            'relationship': [],
+        }]
+        targets = by_level[table['level'] - 1] if table['level'] > 0 else []
+
+        for position in range(1, columns):
+            roll = rng.random()
+            column = {'uuid': new_uuid(), 'properties': [], 'relationship': []}
+
+            if targets and roll < relationship_density:
+                referenced = rng.choice(targets)
+                column['name'] = f'Ref{position}'
+                column['type'] = column_types['VARCHAR(255)']
+                column['relationship'].append({
+                    'name': f"{table['name']}_Ref{position}",
+                    'table_uuid': referenced['uuid'],
+                    'column_uuid': referenced['key_uuid'],
+                    'relationship_type_uuid': relationship_types[rng.choice(['ForeignKey', 'ForeignKey', 'OneToOne'])],
+                })
+            elif roll < relationship_density + array_ratio:
+                column['name'] = f'List{position}'
+                column['type'] = column_types['Array(VARCHAR(255))']
+                if targets:
+                    referenced = rng.choice(targets)
+                    column['relationship'].append({
+                        'name': f"{table['name']}_List{position}",
+                        'table_uuid': referenced['uuid'],
+                        'column_uuid': referenced['key_uuid'],
+                        'relationship_type_uuid': relationship_types['ManyToMany'],
+                    })
+            else:
+                column['name'] = f'Col{position}'
+                column['type'] = column_types[rng.choice(DATA_TYPES)]
+                if rng.random() < 0.1:
+                    column['properties'].append({'type': property_types['indexed'], 'value': 'true'})
+
+            table_columns.append(column)
+
+        schema_tables.append({'uuid': table['uuid'], 'name': table['name'], 'columns': table_columns})
+
+    return {
+        'tables': schema_tables,
+        'column_types': [{'uuid': value, 'name': name} for name, value in column_types.items()],
+        'property_types': [{'uuid': value, 'name': name} for name, value in property_types.items()],
+        'relationship_types': [{'uuid': value, 'name': name} for name, value in relationship_types.items()],
+    }
+
+
+def add_schema_arguments(parser):
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='10',
+                        help="Base parameters; the options below override them")
+    parser.add_argument('--tables', type=int)
+    parser.add_argument('--columns', type=int, help="Columns per table, primary key included")
+    parser.add_argument('--relationship-density', type=float, help="Share of columns that are foreign keys")
+    parser.add_argument('--array-ratio', type=float, help="Share of columns that are Array columns")
+    parser.add_argument('--fk-depth', type=int, help="Length of the longest foreign key chain")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def schema_parameters(args):
+    params = dict(PRESETS[args.preset])
+    for name in params:
+        value = getattr(args, name)
+        if value is not None:
+            params[name] = value
+    params['seed'] = args.seed
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic CDS schema")
+    add_schema_arguments(parser)
+    parser.add_argument('--output', '-o', default='synthetic_schema.json')
+    args = parser.parse_args()
+
+    with open(args.output, 'w') as f:
+        json.dump(make_schema(**schema_parameters(args)), f)
+    print(f"Wrote '{args.output}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,4 +11,8 @@ Options:
   8 django    Generate Django models
   9 xml       Generate XML file
   10 mongodb  Generate MongoDB script
+  11 parquet  Generate Parquet files (requires pyarrow)
+
+Several options can be given as a comma-separated list (e.g. 1,2,5), or use
+--all to run every generator. Multiple targets run concurrently (--jobs N).
 """
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from .file_output import write_atomic
+
+# Incremental regeneration support.
+#
+# The manifest stores, per generator target, the content hash of every table's
+# schema definition (including the tables it references) and the hash of the
+# output fragment written for it. On a rerun a generator asks the cache whether
+# a table is still fresh and skips it, and only rewrites files whose content
+# actually changed.
+
+MANIFEST_PATH = '.cds_cache.json'
+CACHE_VERSION = 1
+
+
+def _hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _table_definition(table):
+    return [
+        table.uuid,
+        table.name,
+        [
+            [
+                column.uuid,
+                column.name,
+                column.type_name,
+                [[prop.name, prop.value] for prop in column.properties],
+                [
+                    [
+                        rel.name,
+                        rel.type_name,
+                        rel.table.name if rel.table else None,
+                        rel.column.name if rel.column else None,
+                    ]
+                    for rel in column.relationships
+                ],
+            ]
+            for column in table.columns
+        ],
+    ]
+
+
+def table_fingerprints(schema):
+    # Own definition hash for every table first...
+    own = {
+        table.uuid: _hash(json.dumps(_table_definition(table), sort_keys=True, default=str).encode('utf-8'))
+        for table in schema.tables
+    }
+
+    # ...then fold in the definitions of the tables it references, so a change
+    # to a referenced table (e.g. a renamed key column) invalidates this one too
+    fingerprints = {}
+    for table in schema.tables:
+        dependencies = sorted({
+            own[rel.table.uuid]
+            for column in table.columns
+            for rel in column.relationships
+            if rel.table is not None and rel.table is not table
+        })
+        fingerprints[table.name] = _hash('\n'.join([own[table.uuid]] + dependencies).encode('utf-8'))
+
+    return fingerprints
+
+
+def combined_fingerprint(fingerprints):
+    # Single hash for outputs that cover the whole schema in one file
+    return _hash('\n'.join(f'{name}:{fingerprints[name]}' for name in fingerprints).encode('utf-8'))
+
+
+class GenerationCache:
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.targets = {}
+        self._fingerprints = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == CACHE_VERSION:
+                    self.targets = manifest.get('targets', {})
+            except (OSError, json.JSONDecodeError):
+                # A corrupt manifest just means a full regeneration
+                self.targets = {}
+
+    def fingerprints(self, schema):
+        # Computed once per compiled schema and shared by every target
+        with self.lock:
+            key = id(schema)
+            if key not in self._fingerprints:
+                self._fingerprints[key] = (schema, table_fingerprints(schema))
+            return self._fingerprints[key][1]
+
+    def schema_fingerprint(self, schema):
+        return combined_fingerprint(self.fingerprints(schema))
+
+    def target(self, key, generator_file):
+        # The generator's own source is part of the key: changing a generator
+        # invalidates everything it produced before
+        with open(generator_file, 'rb') as f:
+            generator_hash = _hash(f.read())
+
+        with self.lock:
+            entry = self.targets.get(key)
+            if entry is None or entry.get('generator') != generator_hash:
+                entry = {'generator': generator_hash, 'fragments': {}}
+                self.targets[key] = entry
+
+        return TargetCache(entry['fragments'])
+
+    def save(self):
+        with self.lock:
+            manifest = {'version': CACHE_VERSION, 'targets': self.targets}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class TargetCache:
+    # Generators may check and write fragments from several threads; the
+    # bookkeeping is guarded by a lock, the file writes are not
+    def __init__(self, fragments):
+        self.lock = threading.Lock()
+        self.fragments = fragments
+        self.seen = set()
+        self.written = 0
+        self.skipped = 0
+
+    def is_fresh(self, name, fingerprint, path):
+        with self.lock:
+            self.seen.add(name)
+            fragment = self.fragments.get(name)
+        fresh = fragment is not None and fragment['input'] == fingerprint and _on_disk(fragment, path)
+        if fresh:
+            with self.lock:
+                self.skipped += 1
+        return fresh
+
+    def write(self, name, fingerprint, path, content, newline=None):
+        # Writes the fragment unless the same bytes are already on disk
+        with self.lock:
+            self.seen.add(name)
+            fragment = self.fragments.get(name)
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        output_hash = _hash(data)
+
+        if fragment is None or fragment['output'] != output_hash or not _on_disk(fragment, path):
+            if isinstance(content, str):
+                write_atomic(path, content, newline=newline)
+            else:
+                with open(path, 'wb') as f:
+                    f.write(content)
+            written = True
+        else:
+            written = False
+
+        with self.lock:
+            if written:
+                self.written += 1
+            else:
+                self.skipped += 1
+            self.fragments[name] = _fragment(fingerprint, output_hash, path)
+
+    @contextmanager
+    def stream(self, name, fingerprint, path, newline=None):
+        # Streaming variant of write(): the output goes to a temporary file and
+        # is hashed as it is written; the target is only replaced if it changed
+        with self.lock:
+            self.seen.add(name)
+            fragment = self.fragments.get(name)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        hasher = hashlib.sha256()
+        complete = False
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline=newline) as f:
+                yield _HashingWriter(f, hasher)
+            complete = True
+        finally:
+            # A failed write leaves the target as it was, and no temporary file
+            if not complete and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        output_hash = hasher.hexdigest()
+        written = not (fragment is not None and fragment['output'] == output_hash and _on_disk(fragment, path))
+        if written:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+
+        with self.lock:
+            if written:
+                self.written += 1
+            else:
+                self.skipped += 1
+            self.fragments[name] = _fragment(fingerprint, output_hash, path)
+
+    def record_file(self, name, fingerprint, path):
+        # For outputs written by a third-party library straight to disk
+        with open(path, 'rb') as f:
+            output_hash = _hash(f.read())
+        with self.lock:
+            self.seen.add(name)
+            self.fragments[name] = _fragment(fingerprint, output_hash, path)
+            self.written += 1
+
+    def prune(self):
+        # Drop fragments for tables that no longer exist, and their files
+        for name in list(self.fragments):
+            if name not in self.seen:
+                path = self.fragments.pop(name)['path']
+                if os.path.exists(path) and not any(f['path'] == path for f in self.fragments.values()):
+                    os.remove(path)
+
+
+def _fragment(fingerprint, output_hash, path):
+    stat = os.stat(path)
+    return {
+        'input': fingerprint,
+        'output': output_hash,
+        'path': path,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+    }
+
+
+def _on_disk(fragment, path):
+    # Whether the file recorded for a fragment is still there, untouched:
+    # same size and modification time as when it was written
+    if fragment['path'] != path:
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return stat.st_size == fragment['size'] and stat.st_mtime_ns == fragment.get('mtime')
+
+
+class _HashingWriter:
+    def __init__(self, f, hasher):
+        self.f = f
+        self.hasher = hasher
+
+    def write(self, text):
+        self.hasher.update(text.encode('utf-8'))
+        return self.f.write(text)
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .profiling import propagate
+
+# Helpers for generators that write one file per table.
+#
+# Files are written to a temporary name in the same directory, flushed to
+# disk and renamed into place, so readers never see a partial file. Tables
+# fan out over a bounded thread pool: on network filesystems the time goes
+# into per-file open/fsync/rename round trips, which overlap well in threads.
+
+MANIFEST_NAME = 'manifest.json'
+
+
+@contextmanager
+def atomic_open(path, newline=None, encoding='utf-8'):
+    # The temporary name is unique per thread so concurrent writers of the
+    # same directory never collide
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding=encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_atomic(path, content, newline=None):
+    with atomic_open(path, newline=newline) as f:
+        f.write(content)
+
+
+def map_tables(func, tables, jobs=None):
+    # Calls func(table) for every table on at most `jobs` threads and returns
+    # the results in table order, whatever order they finish in. jobs=1 runs
+    # serially; None uses the thread pool default. The first exception raised
+    # by a table is re-raised once the pool has finished.
+    tables = list(tables)
+    if jobs == 1 or len(tables) <= 1:
+        return [func(table) for table in tables]
+    func = propagate(func)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, tables))
+
+
+def write_manifest(output_dir, entries):
+    # entries: (table_name, file_path) pairs in schema order. The manifest
+    # keeps that order, so it is identical between runs whatever order the
+    # worker threads finished in.
+    files = []
+    for table_name, file_path in entries:
+        files.append({
+            'table': table_name,
+            'file': os.path.basename(file_path),
+            'bytes': os.path.getsize(file_path),
+        })
+    write_atomic(os.path.join(output_dir, MANIFEST_NAME), json.dumps({'files': files}, indent=4))
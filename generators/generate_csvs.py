@@ -1,22 +1,237 @@
 import json
 import csv
+import gzip
+import hashlib
+import io
 import os
+from .schema_model import compile_schema
+from .file_output import MANIFEST_NAME, map_tables, write_atomic, write_manifest
+from .profiling import phase
+from .records import iter_records, WriterPool
+
+# zstandard is optional: only the zstd compression of the data export needs it
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def generate(schema, cache=None, jobs=None, manifest=False):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
 
-def generate(schema):
     # Create a directory to store CSV files
     output_dir = 'csv_output'
     os.makedirs(output_dir, exist_ok=True)
 
-    # Iterate over each table in the schema
-    for table in schema['tables']:
-        table_name = table['name']
+    # Per-table cache: only tables whose definition changed are rewritten
+    if cache is not None:
+        target = cache.target('csv', __file__)
+        fingerprints = cache.fingerprints(schema)
+
+    def write_table(table):
+        table_name = table.name
         file_path = os.path.join(output_dir, f'{table_name}.csv')
 
-        # Extract column names
-        column_names = [column['name'] for column in table['columns']]
+        if cache is not None and target.is_fresh(table_name, fingerprints[table_name], file_path):
+            return table_name, file_path
+
+        with phase('render', light=True):
+            # Extract column names
+            column_names = [column.name for column in table.columns]
+            buffer = io.StringIO(newline='')
+            csv.writer(buffer).writerow(column_names)
 
         # Write to CSV file
-        with open(file_path, 'w', newline='') as csvfile:
-            csvwriter = csv.writer(csvfile)
-            # Write column headers
-            csvwriter.writerow(column_names)
\ No newline at end of file
+        with phase('write', light=True):
+            if cache is not None:
+                target.write(table_name, fingerprints[table_name], file_path, buffer.getvalue(), newline='')
+            else:
+                write_atomic(file_path, buffer.getvalue(), newline='')
+        return table_name, file_path
+
+    # Tables are written concurrently, at most `jobs` at a time
+    written = map_tables(write_table, schema.tables, jobs)
+    if manifest:
+        write_manifest(output_dir, written)
+
+    if cache is not None:
+        target.prune()
+
+
+# Data export: records streamed into per-table CSV shards
+
+DATA_DIR = 'csv_data'
+COMPRESSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+class _Tap(io.RawIOBase):
+    # Pass-through binary stream that counts, and optionally hashes, the bytes
+    # written through it
+
+    def __init__(self, f, hasher=None, owns=True):
+        self.f = f
+        self.hasher = hasher
+        self.owns = owns
+        self.count = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.hasher is not None:
+            self.hasher.update(data)
+        self.count += len(data)
+        self.f.write(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed and self.owns:
+            self.f.close()
+        super().close()
+
+
+class _Shard:
+    # One open CSV shard: csv.writer -> text -> (compressor) -> file. Reopening
+    # an existing shard appends a new gzip member / zstd frame, and the shard
+    # state (rows, uncompressed bytes, checksum of the file) carries over.
+
+    def __init__(self, path, compression, state, append):
+        self.state = state
+        self.raw = open(path, 'ab' if append else 'wb')
+        sink = _Tap(self.raw, state['hasher'], owns=False)
+        if compression == 'gzip':
+            # mtime=0 keeps the output, and so the checksum, reproducible
+            stream = gzip.GzipFile(fileobj=sink, mode='wb', mtime=0)
+        elif compression == 'zstd':
+            stream = zstandard.ZstdCompressor().stream_writer(sink, closefd=True)
+        else:
+            stream = sink
+        self.counter = _Tap(stream)
+        self.text = io.TextIOWrapper(self.counter, encoding='utf-8', newline='')
+        self.writer = csv.writer(self.text)
+        self.start_bytes = state['bytes']
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.text.flush()
+        self.state['rows'] += len(rows)
+        self.state['bytes'] = self.start_bytes + self.counter.count
+
+    def close(self):
+        self.text.close()
+        self.raw.close()
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def export_csv(schema, data_path, output_dir=DATA_DIR, batch_size=10000, max_rows=None,
+               max_bytes=None, compression=None, max_open=256):
+    # Streams a CDS data file into per-table CSV files. Rows are buffered per
+    # table and written batch_size at a time with writerows. With max_rows or
+    # max_bytes each table is split into numbered shards, each with its own
+    # header; max_bytes counts uncompressed bytes and may be exceeded by about
+    # one row. A manifest lists every shard with its row count and checksum.
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}' (expected gzip or zstd)")
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package (pip install zstandard)")
+
+    schema = compile_schema(schema)
+    os.makedirs(output_dir, exist_ok=True)
+
+    columns = {table.name: [column.name for column in table.columns] for table in schema.tables}
+    split = bool(max_rows or max_bytes)
+    shards = {table_name: [] for table_name in columns}
+    buffers = {}
+    skipped = 0
+
+    def shard_name(table_name, number):
+        if split:
+            return f'{table_name}_{number:05d}.csv{COMPRESSIONS[compression]}'
+        return f'{table_name}.csv{COMPRESSIONS[compression]}'
+
+    def open_file(table_name, new):
+        states = shards[table_name]
+        if new:
+            states.append({
+                'file': shard_name(table_name, len(states) + 1),
+                'rows': 0,
+                'bytes': 0,
+                'hasher': hashlib.sha256(),
+            })
+        state = states[-1]
+        shard = _Shard(os.path.join(output_dir, state['file']), compression, state, append=not new)
+        if new:
+            # The header is not counted as a row
+            shard.writer.writerow(columns[table_name])
+        return shard
+
+    pool = WriterPool(open_file, max_open)
+
+    def flush(table_name):
+        rows = buffers[table_name]
+        while rows:
+            shard = pool.get(table_name)
+            state = shard.state
+            chunk = rows if not max_rows else rows[:max_rows - state['rows']]
+            if max_bytes:
+                # Size the chunk from the average row so far; a fresh shard
+                # starts with a single row to measure
+                if state['rows']:
+                    average = state['bytes'] / state['rows']
+                    chunk = chunk[:max(1, int((max_bytes - state['bytes']) // average))]
+                else:
+                    chunk = chunk[:1]
+            shard.write_rows(chunk)
+            del rows[:len(chunk)]
+            if (max_rows and state['rows'] >= max_rows) or (max_bytes and state['bytes'] >= max_bytes):
+                # Shard is full: the next rows start a new one
+                pool.release(table_name)
+
+    try:
+        for table_name, record in iter_records(data_path):
+            column_names = columns.get(table_name)
+            if column_names is None:
+                skipped += 1
+                continue
+
+            buffer = buffers.setdefault(table_name, [])
+            buffer.append([_csv_value(record.get(name)) for name in column_names])
+            if len(buffer) >= batch_size:
+                flush(table_name)
+
+        for table_name in buffers:
+            flush(table_name)
+
+        # Tables without any records still get a header-only file
+        for table_name, states in shards.items():
+            if not states:
+                pool.get(table_name)
+    finally:
+        pool.close_all()
+
+    # Manifest in schema order, then shard order
+    files = []
+    counts = {}
+    for table_name, states in shards.items():
+        counts[table_name] = sum(state['rows'] for state in states)
+        for state in states:
+            files.append({
+                'table': table_name,
+                'file': state['file'],
+                'rows': state['rows'],
+                'bytes': os.path.getsize(os.path.join(output_dir, state['file'])),
+                'sha256': state['hasher'].hexdigest(),
+            })
+    manifest = {'compression': compression, 'files': files}
+    write_atomic(os.path.join(output_dir, MANIFEST_NAME), json.dumps(manifest, indent=4))
+
+    return {'rows': counts, 'skipped': skipped, 'files': len(files)}
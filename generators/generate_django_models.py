@@ -1,11 +1,149 @@
 import json
+from .schema_model import compile_schema
+from .profiling import phase
+from .sql_common import index_defs, is_true, order_tables
 
-def generate(schema):
+# Django rejects index and constraint names longer than this
+MAX_INDEX_NAME = 30
 
-    # Create mappings from UUIDs to names
-    column_type_map = {ct['uuid']: ct['name'] for ct in schema['column_types']}
-    relationship_type_map = {rt['uuid']: rt['name'] for rt in schema['relationship_types']}
-    property_type_map = {pt['uuid']: pt['name'] for pt in schema['property_types']}
+# Rows per INSERT in the generated loaders.py
+LOADER_BATCH_SIZE = 1000
+
+# Manager shared by the generated models: with_related() follows the model's
+# foreign keys with JOINs (select_related) and its many-to-many and Array
+# relations with one query each (prefetch_related)
+RELATED_MANAGER = '''class RelatedManager(models.Manager):
+    def __init__(self, select=(), prefetch=()):
+        super().__init__()
+        self.select = select
+        self.prefetch = prefetch
+
+    def with_related(self):
+        return self.get_queryset().select_related(*self.select).prefetch_related(*self.prefetch)
+'''
+
+# Generic part of loaders.py; the generated tables follow it
+LOADERS_HEADER = '''import gzip
+import json
+from django.db import transaction
+from . import models
+
+# Imports CDS data through the models generated next to this file:
+#   from app.loaders import load
+#   load('data.jsonl')
+
+BATCH_SIZE = {batch_size}
+
+
+def _binary(value):
+    return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+
+def _boolean(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('t', 'true', '1', 'yes', 'y')
+    return bool(value)
+
+
+_CONVERT = {{'binary': _binary, 'boolean': _boolean}}
+
+
+def iter_records(path):
+    # (table, record) pairs from a CDS data file: a JSON document mapping
+    # tables to lists of records, or JSON Lines of {{"table": ..., "record": ...}}
+    # (.jsonl/.ndjson); either may be gzip-compressed (.gz)
+    opener = gzip.open if path.endswith('.gz') else open
+    name = path[:-3] if path.endswith('.gz') else path
+    with opener(path, 'rt', encoding='utf-8') as f:
+        if name.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item['table'], item['record']
+        else:
+            for table_name, records in json.load(f).items():
+                for record in records:
+                    yield table_name, record
+
+
+def load(path, batch_size=BATCH_SIZE, using='default'):
+    # Imports a CDS data file with bulk_create(), batch_size rows per INSERT,
+    # in one transaction. Rows are buffered per table and written as buffers
+    # fill, after the buffered rows of the tables they reference, so a file
+    # in foreign key order loads into the tables of the SQL scripts, whose
+    # foreign keys are checked per statement. Other orders need constraints
+    # checked at commit, as in tables made by migrate on PostgreSQL or
+    # SQLite. Returns the rows created per table.
+    buffers = {{}}
+    counts = {{}}
+
+    def flush(table_name):
+        model, rows = buffers[table_name]
+        if rows:
+            batch = rows[:]
+            rows.clear()
+            for field in model._meta.concrete_fields:
+                if field.is_relation:
+                    parent = field.related_model._meta.db_table
+                    if parent != table_name and parent in buffers:
+                        flush(parent)
+            model._default_manager.using(using).bulk_create(batch, batch_size=batch_size)
+            counts[table_name] = counts.get(table_name, 0) + len(batch)
+
+    def add(table_name, model, row):
+        rows = buffers.setdefault(table_name, (model, []))[1]
+        rows.append(row)
+        if len(rows) >= batch_size:
+            flush(table_name)
+
+    with transaction.atomic(using=using):
+        for table_name, record in iter_records(path):
+            entry = TABLES.get(table_name)
+            if entry is None:
+                continue
+            model, fields = entry
+            convert = CONVERTERS.get(table_name, {{}})
+            values = {{}}
+            for column, attribute in fields:
+                value = record.get(column)
+                if value is not None and column in convert:
+                    value = _CONVERT[convert[column]](value)
+                values[attribute] = value
+            row = model(**values)
+            add(table_name, model, row)
+
+            # Array columns become rows of their intermediary tables
+            for column, through, owner, target in ARRAYS.get(table_name, ()):
+                items = record.get(column)
+                if not items:
+                    continue
+                if not isinstance(items, list):
+                    items = [items]
+                for item in items:
+                    add(through._meta.db_table, through, through(**{{owner: row.pk, target: item}}))
+
+        # Foreign key order for what is left
+        for table_name in list(TABLES) + [through._meta.db_table for arrays in ARRAYS.values() for _, through, _, _ in arrays]:
+            if table_name in buffers:
+                flush(table_name)
+
+    return counts
+
+'''
+
+def generate(schema, cache=None):
+
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # Skip the whole run when no table changed since the cached run
+    output_path = 'models.py'
+    loaders_path = 'loaders.py'
+    if cache is not None:
+        target = cache.target('django', __file__)
+        fingerprint = cache.schema_fingerprint(schema)
+        if target.is_fresh(output_path, fingerprint, output_path) and target.is_fresh(loaders_path, fingerprint, loaders_path):
+            return
 
     # Function to get Django field type and default parameters from column type name
     def get_django_field_type(column_type_name):
@@ -32,6 +170,70 @@ def generate(schema):
             # Default to ForeignKey
             return f'models.ForeignKey("{related_model_name}", on_delete=models.CASCADE{field_options})'
 
+    # Python tuple literal of names
+    def as_tuple(names):
+        if len(names) == 1:
+            return f'("{names[0]}",)'
+        return '(' + ', '.join(f'"{name}"' for name in names) + ')'
+
+    # Meta block with the table name and the indexes the SQL generators create
+    # for the same table (index_defs), as Django index and constraint objects
+    def render_meta(table_def):
+        lines = ['    class Meta:', f'        db_table = "{table_def["name"]}"']
+        indexes = []
+        constraints = []
+        for name, columns, unique in index_defs(table_def, max_length=MAX_INDEX_NAME):
+            fields = ', '.join(f'"{column}"' for column in columns)
+            if unique:
+                constraints.append(f'            models.UniqueConstraint(fields=[{fields}], name="{name}"),')
+            else:
+                indexes.append(f'            models.Index(fields=[{fields}], name="{name}"),')
+        if indexes:
+            lines += ['        indexes = ['] + indexes + ['        ]']
+        if constraints:
+            lines += ['        constraints = ['] + constraints + ['        ]']
+        return '\n'.join(lines) + '\n'
+
+    # Model for the intermediary table of an Array column, named and laid out
+    # like the SQL generators' one: an owner column and a value column, which
+    # is a foreign key when the Array column references a table
+    def intermediary_model(table_name, column_name, relationship):
+        related_table = relationship.table if relationship else None
+        through_name = (relationship.name if relationship else None) or f'{table_name}_{column_name}'
+        owner = f'{table_name}_ID'
+        fields_def = [
+            # Reverse accessor for plain value arrays: owner.<column>.all()
+            f'    {owner} = models.ForeignKey("{table_name}", on_delete=models.CASCADE, db_column="{owner}", '
+            f'db_index=False, related_name="{"+" if related_table else column_name}")'
+        ]
+        if related_table:
+            value = f'{column_name}_ID'
+            fields_def.append(
+                f'    {value} = models.ForeignKey("{related_table.name}", on_delete=models.CASCADE, '
+                f'db_column="{value}", db_index=False, related_name="+")'
+            )
+            value_attribute = f'{value}_id'
+            foreign_keys = [(owner, table_name, 'UUID'), (value, related_table.name, 'UUID')]
+        else:
+            value = 'UUID' if relationship else column_name
+            fields_def.append(f'    {value} = models.CharField(max_length=255)')
+            value_attribute = value
+            foreign_keys = [(owner, table_name, 'UUID')]
+
+        # The SQL table has no primary key and no id column; the (owner, value)
+        # pair stands in for one so Django does not add an id field
+        fields_def.insert(0, f'    pk = models.CompositePrimaryKey("{owner}", "{value}")')
+
+        table_def = {
+            'name': through_name,
+            'primary_keys': [],
+            'foreign_keys': foreign_keys,
+            'data_columns': [(owner, 'VARCHAR(255)'), (value, 'VARCHAR(255)')],
+            'array_source': (table_name, column_name),
+        }
+        class_def = f'class {through_name}(models.Model):\n' + '\n'.join(fields_def) + '\n\n' + render_meta(table_def)
+        return through_name, class_def, (column_name, through_name, f'{owner}_id', value_attribute), table_def
+
     # Collect model class definitions
     model_classes = []
 
@@ -42,9 +244,16 @@ def generate(schema):
     imports = set()
     imports.add('from django.db import models')
 
+    # What loaders.py needs per table: (column, attribute) pairs, Array
+    # intermediaries and the columns whose values need converting
+    loader_fields = {}
+    loader_arrays = {}
+    loader_converters = {}
+    table_defs = []
+
     # Iterate over each table
-    for table in schema['tables']:
-        table_name = table['name']
+    for table in schema.tables:
+        table_name = table.name
         class_name = table_name  # Use the table name as is
 
         # Start building the class definition
@@ -56,11 +265,45 @@ def generate(schema):
         # Keep track of primary key fields
         primary_keys = []
 
+        # Relations to follow in RelatedManager.with_related()
+        select_related = []
+        prefetch_related = []
+
+        # Reverse accessors of several relations to the same model would
+        # clash, so those get explicit related_names
+        targets = {}
+        for column in table.columns:
+            if column.relationships and column.relationships[0].table:
+                related_name = column.relationships[0].table.name
+                targets[related_name] = targets.get(related_name, 0) + 1
+
+        table_def = {'name': table_name, 'primary_keys': primary_keys, 'foreign_keys': [],
+                     'lookup_columns': [], 'data_columns': []}
+        fields = []
+        converters = {}
+
         # Iterate over columns
-        for column in table['columns']:
-            column_name = column['name']
-            column_type_uuid = column['type']
-            column_type_name = column_type_map.get(column_type_uuid)
+        for column in table.columns:
+            column_name = column.name
+            column_type_name = column.type_name
+
+            # Array columns become intermediary tables, as in the SQL generators
+            if column_type_name == 'Array(VARCHAR(255))':
+                relationship = column.relationships[0] if column.relationships else None
+                through_name, through_def, array, through_table_def = intermediary_model(table_name, column_name, relationship)
+                intermediary_models.append(through_def)
+                loader_arrays.setdefault(table_name, []).append(array)
+                table_defs.append(through_table_def)
+                if relationship and relationship.table:
+                    related_name = ''
+                    if targets[relationship.table.name] > 1:
+                        related_name = f', related_name="{table_name}_{column_name}"'
+                    fields_def.append(
+                        f'    {column_name} = models.ManyToManyField("{relationship.table.name}", through="{through_name}", '
+                        f'through_fields=("{table_name}_ID", "{column_name}_ID"){related_name})'
+                    )
+                prefetch_related.append(column_name)
+                continue
 
             # Get the field type and default parameters
             django_field_class, django_field_params = get_django_field_type(column_type_name)
@@ -68,10 +311,10 @@ def generate(schema):
             field_options = []
 
             # Handle properties (e.g., null, blank, primary_key)
-            if column.get('properties'):
-                for prop in column['properties']:
-                    prop_name = property_type_map.get(prop['type'])
-                    prop_value = prop['value']
+            if column.properties:
+                for prop in column.properties:
+                    prop_name = prop.name
+                    prop_value = prop.value
                     if prop_name == 'nullable':
                         field_options.append(f'null={str(prop_value)}')
                     if prop_name == 'blank':
@@ -80,24 +323,48 @@ def generate(schema):
                         if prop_value == 'true' or prop_value == True:
                             field_options.append('primary_key=True')
                             primary_keys.append(column_name)
+                    if prop_name in ('indexed', 'unique') and is_true(prop_value):
+                        table_def['lookup_columns'].append((column_name, prop_name == 'unique'))
+
+            if column_type_name == 'BLOB':
+                converters[column_name] = 'binary'
+            elif column_type_name == 'BOOLEAN':
+                converters[column_name] = 'boolean'
 
             # Handle relationships
-            if column.get('relationship'):
-                for rel in column['relationship']:
-                    related_table_uuid = rel['table_uuid']
-                    relationship_type_uuid = rel.get('relationship_type_uuid')
-                    relationship_type_name = relationship_type_map.get(relationship_type_uuid, 'ForeignKey')
-
-                    related_table = next((t for t in schema['tables'] if t['uuid'] == related_table_uuid), None)
-                    if related_table:
-                        related_table_name = related_table['name']
-                        field_options_str = ''
-                        if field_options:
-                            field_options_str = ', ' + ', '.join(field_options)
-                        django_field = get_django_relationship_field(relationship_type_name, related_table_name, field_options_str)
-                        field_def = f'    {column_name} = {django_field}'
-                        fields_def.append(field_def)
+            related = None
+            if column.relationships:
+                for rel in column.relationships:
+                    if rel.table:
+                        related = rel
                         break  # Assume only one relationship per column
+
+            if related:
+                relationship_type_name = related.type_name or 'ForeignKey'
+                # A scalar column holds a single reference: the SQL
+                # generators make it a foreign key whatever its type
+                if relationship_type_name == 'ManyToMany':
+                    relationship_type_name = 'ForeignKey'
+                related_table_name = related.table.name
+
+                # Same column name as the SQL table; the index comes from Meta
+                field_options.append(f'db_column="{column_name}"')
+                field_options.append('db_index=False')
+                related_pk = [c.name for c in related.table.columns
+                              if any(p.name == 'PrimaryKey' and is_true(p.value) for p in c.properties)]
+                if related.column and related_pk != [related.column.name]:
+                    field_options.append(f'to_field="{related.column.name}"')
+                if targets[related_table_name] > 1:
+                    field_options.append(f'related_name="{table_name}_{column_name}"')
+
+                field_options_str = ', ' + ', '.join(field_options)
+                django_field = get_django_relationship_field(relationship_type_name, related_table_name, field_options_str)
+                field_def = f'    {column_name} = {django_field}'
+                fields_def.append(field_def)
+                select_related.append(column_name)
+                fields.append((column_name, f'{column_name}_id'))
+                if related.column:
+                    table_def['foreign_keys'].append((column_name, related_table_name, related.column.name))
             else:
                 # No relationship, add the field normally
                 field_params = []
@@ -108,6 +375,7 @@ def generate(schema):
                 field_params_str = ', '.join(field_params)
                 field_def = f'    {column_name} = {django_field_class}({field_params_str})'
                 fields_def.append(field_def)
+                fields.append((column_name, column_name))
 
         # If no fields defined, add pass
         if not fields_def:
@@ -115,18 +383,55 @@ def generate(schema):
 
         # Combine the class definition
         class_def += '\n'.join(fields_def) + '\n'
+        if select_related or prefetch_related:
+            select = as_tuple(select_related)
+            prefetch = as_tuple(prefetch_related)
+            class_def += f'\n    objects = RelatedManager(select={select}, prefetch={prefetch})\n'
+        class_def += '\n' + render_meta(table_def)
         model_classes.append(class_def)
+        table_defs.append(table_def)
+
+        loader_fields[table_name] = fields
+        if converters:
+            loader_converters[table_name] = converters
 
     # Handle intermediary models (if any)
     model_classes.extend(intermediary_models)
 
     # Write the models.py file
-    with open('models.py', 'w') as f:
-        # Write imports
-        for imp in sorted(imports):
-            f.write(imp + '\n')
-        f.write('\n')
-
-        # Write model classes
-        for model_class in model_classes:
-            f.write(model_class + '\n')
+    content = ''.join(imp + '\n' for imp in sorted(imports)) + '\n'
+    content += RELATED_MANAGER + '\n'
+    content += ''.join(model_class + '\n' for model_class in model_classes)
+
+    # loaders.py lists the tables in foreign key order
+    ordered_defs, _ = order_tables([table_def for table_def in table_defs if 'array_source' not in table_def])
+    loaders = LOADERS_HEADER.format(batch_size=LOADER_BATCH_SIZE)
+    loaders += '# Models in foreign key order, with their (CDS column, model attribute) pairs\n'
+    loaders += 'TABLES = {\n'
+    for table_def in ordered_defs:
+        name = table_def['name']
+        loaders += f'    {json.dumps(name)}: (models.{name}, {json.dumps(loader_fields[name])}),\n'
+    loaders += '}\n\n'
+    loaders += '# Array columns as (column, intermediary model, owner attribute, value attribute)\n'
+    loaders += 'ARRAYS = {\n'
+    for table_def in ordered_defs:
+        arrays = loader_arrays.get(table_def['name'])
+        if arrays:
+            entries = ', '.join(
+                f'({json.dumps(column)}, models.{through}, {json.dumps(owner)}, {json.dumps(value)})'
+                for column, through, owner, value in arrays
+            )
+            loaders += f'    {json.dumps(table_def["name"])}: [{entries}],\n'
+    loaders += '}\n\n'
+    loaders += '# Columns whose CDS values are converted before Django sees them\n'
+    loaders += f'CONVERTERS = {json.dumps(loader_converters, indent=4)}\n'
+
+    with phase('write'):
+        if cache is not None:
+            target.write(output_path, fingerprint, output_path, content)
+            target.write(loaders_path, fingerprint, loaders_path, loaders)
+        else:
+            with open(output_path, 'w') as f:
+                f.write(content)
+            with open(loaders_path, 'w') as f:
+                f.write(loaders)
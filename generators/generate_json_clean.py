@@ -1,15 +1,47 @@
 import json
+from .schema_model import compile_schema
+from .profiling import phase
+from .records import NDJSONWriter
+
+def generate(schema, cache=None, format='json', layout='tagged', compression=None):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # JSON Lines output is written record by record and always rewritten
+    if format == 'ndjson':
+        write_ndjson(schema, layout, compression)
+        return
+    if format != 'json':
+        raise ValueError(f"Unknown JSON format '{format}' (expected json or ndjson)")
+
+    # Skip the whole run when no table changed since the cached run
+    output_path = 'clean_data.json'
+    if cache is not None:
+        target = cache.target('json_clean', __file__)
+        fingerprint = cache.schema_fingerprint(schema)
+        if target.is_fresh(output_path, fingerprint, output_path):
+            return
 
-def generate(schema):
     data = {}
 
     # Iterate over each table in the schema
-    for table in schema['tables']:
-        table_name = table['name']
+    for table in schema.tables:
+        table_name = table.name
         # Initialize each table with an empty list
         data[table_name] = []
 
     # Write the clean JSON file
-    with open('clean_data.json', 'w') as f:
-        json.dump(data, f, indent=4)
+    with phase('render'):
+        content = json.dumps(data, indent=4)
+    with phase('write'):
+        if cache is not None:
+            target.write(output_path, fingerprint, output_path, content)
+        else:
+            with open(output_path, 'w') as f:
+                f.write(content)
 
+def write_ndjson(schema, layout='tagged', compression=None):
+    # One (empty) file per table, or an empty tagged stream
+    with NDJSONWriter('clean_data', layout, compression) as writer:
+        for table in schema.tables:
+            writer.open_table(table.name)
@@ -1,18 +1,79 @@
 import json
+import os
+from .schema_model import compile_schema
+from .profiling import phase
+from .records import COMPRESSION_SUFFIXES, NDJSONWriter, iter_records
+
+def generate(schema, cache=None, format='json', layout='tagged', compression=None):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # JSON Lines output is written record by record and always rewritten
+    if format == 'ndjson':
+        write_ndjson(schema, layout, compression)
+        return
+    if format != 'json':
+        raise ValueError(f"Unknown JSON format '{format}' (expected json or ndjson)")
+
+    # Skip the whole run when no table changed since the cached run
+    output_path = 'sample_data.json'
+    if cache is not None:
+        target = cache.target('json_sample', __file__)
+        fingerprint = cache.schema_fingerprint(schema)
+        if target.is_fresh(output_path, fingerprint, output_path):
+            return
 
-def generate(schema):
     data = {}
 
     # Iterate over each table in the schema
-    for table in schema['tables']:
-        table_name = table['name']
+    for table in schema.tables:
+        table_name = table.name
         # Initialize each table with an single dictionary
         data[table_name] = [
-            {column['name']: None for column in table['columns']}
+            {column.name: None for column in table.columns}
         ]
 
     # Write the sample JSON file
-    with open('sample_data.json', 'w') as f:
-        json.dump(data, f, indent=4)
+    with phase('render'):
+        content = json.dumps(data, indent=4)
+    with phase('write'):
+        if cache is not None:
+            target.write(output_path, fingerprint, output_path, content)
+        else:
+            with open(output_path, 'w') as f:
+                f.write(content)
+
+def write_ndjson(schema, layout='tagged', compression=None):
+    # The same single null-valued record per table, one line each
+    with NDJSONWriter('sample_data', layout, compression) as writer:
+        for table in schema.tables:
+            writer.write(table.name, {column.name: None for column in table.columns})
+
+def export_ndjson(schema, data_path, layout='tagged', compression=None, output='cds_data'):
+    # Converts any CDS data file iter_records() reads (e.g. a large
+    # sample_data.json-shaped document) to JSON Lines, record by record
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown compression '{compression}' (expected gzip or zstd)")
 
+    # The output is opened for writing before the input is read, so an input
+    # that is, or lies inside, the output would be truncated
+    source = os.path.realpath(data_path)
+    if layout == 'tagged':
+        target = os.path.realpath(output + '.jsonl' + COMPRESSION_SUFFIXES[compression])
+    else:
+        target = os.path.realpath(output)
+    if source == target or source.startswith(target + os.sep):
+        raise ValueError(f"'{data_path}' is also the NDJSON output; choose another input or output path")
 
+    schema = compile_schema(schema)
+    table_names = {table.name for table in schema.tables}
+    skipped = 0
+    with NDJSONWriter(output, layout, compression) as writer:
+        for table in schema.tables:
+            writer.open_table(table.name)
+        for table_name, record in iter_records(data_path):
+            if table_name not in table_names:
+                skipped += 1
+                continue
+            writer.write(table_name, record)
+    return {'rows': writer.counts, 'skipped': skipped}
@@ -1,76 +1,606 @@
+import base64
+import datetime
+import glob
 import json
 import os
+import struct
+from .schema_model import compile_schema
+from .file_output import map_tables, write_atomic, write_manifest
+from .profiling import phase
+from .records import WriterPool, iter_records
+from .sql_common import is_true
+
+SCHEMA_DIR = 'mongodb_schemas'
+INGEST_DIR = 'mongodb_ingest'
+
+# insertMany batch limits: the 16 MB BSON document limit (an insert command
+# carries its batch in one) and the server's maxWriteBatchSize
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+MAX_BATCH_DOCUMENTS = 100000
+
+INGEST_FORMATS = ('ejson', 'bson')
+
+# Mapping from custom types to MongoDB/BSON types
+TYPE_MAPPING = {
+    'VARCHAR(255)': 'string',
+    'INT': 'int',
+    'FLOAT': 'double',
+    'BOOLEAN': 'bool',
+    'DATE': 'date',
+    'DATETIME': 'date',
+    'BLOB': 'binData',
+    'UUID': 'string',
+    'Array(VARCHAR(255))': 'array',
+    # Add more types as needed
+}
+
+# How a relationship is stored, chosen per relationship type: 'reference'
+# keeps the referenced key (the SQL model), 'embed' stores the referenced
+# document itself, as a subdocument or, for Array columns, an array of them
+EMBED_MODES = ('reference', 'embed')
+
+def embedded_columns(schema, embed):
+    # {table name: [(column, relationship), ...]} for the columns whose
+    # relationship type is embedded. Raises ValueError for unknown relationship
+    # types or modes.
+    embed = embed or {}
+    for type_name, mode in embed.items():
+        if mode not in EMBED_MODES:
+            raise ValueError(f"Unknown embedding mode '{mode}' (expected one of: {', '.join(EMBED_MODES)})")
+        if type_name not in schema.relationship_types.values():
+            raise ValueError(f"Unknown relationship type '{type_name}' "
+                             f"(schema has: {', '.join(sorted(schema.relationship_types.values()))})")
+
+    embedded = {}
+    for table in schema.tables:
+        for column in table.columns:
+            for rel in column.relationships:
+                if embed.get(rel.type_name) == 'embed' and rel.column is not None:
+                    embedded.setdefault(table.name, []).append((column, rel))
+                    break
+    return embedded
+
+def is_array(column):
+    return TYPE_MAPPING.get(column.type_name) == 'array'
+
+def index_specs(table, embedded=()):
+    # createIndexes entries for one collection: a unique index on the primary
+    # key, and one on every relationship column so lookups by reference do
+    # not scan the collection (on Array columns it is a multikey index). An
+    # embedded reference is indexed through the referenced key it carries.
+    indexes = []
+    primary_keys = [column.name for column in table.columns
+                    if any(prop.name == 'PrimaryKey' and is_true(prop.value) for prop in column.properties)]
+    if primary_keys:
+        indexes.append({
+            'key': {name: 1 for name in primary_keys},
+            'name': '_'.join(f'{name}_1' for name in primary_keys),
+            'unique': True,
+        })
+    embedded_keys = {column.name: rel.column.name for column, rel in embedded}
+    for column in table.columns:
+        if column.relationships and [column.name] != primary_keys:
+            field = column.name
+            if field in embedded_keys:
+                field = f'{field}.{embedded_keys[field]}'
+            indexes.append({'key': {field: 1}, 'name': f'{field}_1'})
+    return indexes
+
+def document_properties(table):
+    # The $jsonSchema properties of a table's documents, and its required
+    # fields
+    properties = {}
+
+    # Required fields in column order; a dict avoids duplicates and keeps
+    # the output stable between runs
+    required_fields = {}
+
+    for column in table.columns:
+        column_name = column.name
+        column_type_name = column.type_name or 'string'
+        mongodb_type = TYPE_MAPPING.get(column_type_name, 'string')
+
+        # Default property schema
+        property_schema = {
+            'bsonType': mongodb_type
+        }
+        if mongodb_type == 'array':
+            property_schema['items'] = {'bsonType': 'string'}
+
+        # Handle properties (e.g., nullable, required)
+        is_nullable = True  # Default to nullable
+        if column.properties:
+            for prop in column.properties:
+                prop_type_name = prop.name
+                prop_value = prop.value
+
+                if prop_type_name == 'nullable':
+                    is_nullable = prop_value
+                if prop_type_name == 'PrimaryKey' and prop_value == True:
+                    required_fields[column_name] = True
+
+        if not is_nullable:
+            required_fields[column_name] = True
+
+        properties[column_name] = property_schema
+
+    return properties, list(required_fields)
+
+def embedded_schema(column, rel):
+    # The referenced document, without a required list: a reference that does
+    # not resolve at load time is embedded as its key alone
+    properties, _ = document_properties(rel.table)
+    document = {'bsonType': 'object', 'properties': properties, 'additionalProperties': False}
+    if is_array(column):
+        return {'bsonType': 'array', 'items': document}
+    return document
+
+def generate(schema, cache=None, jobs=None, embed=None, manifest=False):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+    embedded = embedded_columns(schema, embed)
 
-def generate(schema):
     # Create a directory to store schema files
-    output_dir = 'mongodb_schemas'
+    output_dir = SCHEMA_DIR
     os.makedirs(output_dir, exist_ok=True)
 
-    # Mapping from custom types to MongoDB/BSON types
-    type_mapping = {
-        'VARCHAR(255)': 'string',
-        'INT': 'int',
-        'FLOAT': 'double',
-        'BOOLEAN': 'bool',
-        'DATE': 'date',
-        'DATETIME': 'date',
-        'BLOB': 'binData',
-        'UUID': 'string',
-        # Add more types as needed
-    }
-
-    # Iterate over each table in the schema
-    for table in schema['tables']:
-        collection_name = table['name']
-        columns = table['columns']
-
-        # Build the JSON schema for the collection
+    # Per-table cache: only collections whose definition changed are
+    # rewritten. Each set of embedding choices gets its own target.
+    if cache is not None:
+        key = 'mongodb'
+        if embedded:
+            key += ':' + ','.join(f'{name}={mode}' for name, mode in sorted(embed.items()))
+        target = cache.target(key, __file__)
+        fingerprints = cache.fingerprints(schema)
+
+    def write_file(name, fingerprint, file_path, content):
+        with phase('write', light=True):
+            if cache is not None:
+                target.write(name, fingerprint, file_path, content)
+            else:
+                write_atomic(file_path, content)
+
+    def write_indexes(table):
+        # createIndexes command for the collection, runnable as is with
+        # db.runCommand()
+        file_path = os.path.join(output_dir, f'{table.name}_indexes.json')
+        name = f'{table.name}/indexes'
+        fingerprint = fingerprints[table.name] if cache is not None else None
+        if cache is not None and target.is_fresh(name, fingerprint, file_path):
+            return file_path
+        with phase('render', light=True):
+            indexes = index_specs(table, embedded.get(table.name, ()))
+            content = json.dumps({'createIndexes': table.name, 'indexes': indexes}, indent=4)
+        write_file(name, fingerprint, file_path, content)
+        return file_path
+
+    def write_table(table):
+        collection_name = table.name
+        file_path = os.path.join(output_dir, f'{collection_name}_schema.json')
+        index_path = write_indexes(table)
+
+        if cache is not None and target.is_fresh(collection_name, fingerprints[collection_name], file_path):
+            return [(collection_name, file_path), (collection_name, index_path)]
+
+        properties, required = document_properties(table)
+        for column, rel in embedded.get(collection_name, ()):
+            properties[column.name] = embedded_schema(column, rel)
+
+        # Build the JSON schema for the collection. _id has to be listed:
+        # additional properties are rejected, and every document has one
         schema_dict = {
             'bsonType': 'object',
             'title': collection_name,
-            'properties': {},
-            'required': [],
+            'properties': {'_id': {'bsonType': 'objectId'}, **properties},
+            'required': required,
             'additionalProperties': False
         }
 
-        # Initialize the required fields as a set to avoid duplicates
-        required_fields = set()
+        # Write the collection schema to a JSON file
+        with phase('render', light=True):
+            content = json.dumps({'$jsonSchema': schema_dict}, indent=4)
+        write_file(collection_name, fingerprints[collection_name] if cache is not None else None, file_path, content)
+        return [(collection_name, file_path), (collection_name, index_path)]
 
-        for column in columns:
-            column_name = column['name']
-            column_type_uuid = column['type']
-            column_type_name = next((ct['name'] for ct in schema['column_types'] if ct['uuid'] == column_type_uuid), 'string')
-            mongodb_type = type_mapping.get(column_type_name, 'string')
+    # Collections are written concurrently, at most `jobs` at a time
+    written = map_tables(write_table, schema.tables, jobs)
+    if manifest:
+        write_manifest(output_dir, [entry for entries in written for entry in entries])
 
-            # Default property schema
-            property_schema = {
-                'bsonType': mongodb_type
-            }
+    if cache is not None:
+        target.prune()
 
-            # Handle properties (e.g., nullable, required)
-            is_nullable = True  # Default to nullable
-            if column.get('properties'):
-                for prop in column['properties']:
-                    prop_type_uuid = prop['type']
-                    prop_type_name = next((pt['name'] for pt in schema['property_types'] if pt['uuid'] == prop_type_uuid), None)
-                    prop_value = prop['value']
 
-                    if prop_type_name == 'nullable':
-                        is_nullable = prop_value
-                    if prop_type_name == 'PrimaryKey' and prop_value == True:
-                        required_fields.add(column_name)
+# BSON encoding for the ingest batches. Only the types CDS records convert to
+# are needed: a small encoder avoids depending on pymongo's bson package.
 
-            if not is_nullable:
-                required_fields.add(column_name)
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_INT32_MIN = -2 ** 31
+_INT32_MAX = 2 ** 31 - 1
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
 
-            # Add the property schema to the collection schema
-            schema_dict['properties'][column_name] = property_schema
+def _cstring(name):
+    return name.encode('utf-8') + b'\x00'
 
-        # Assign the list of required fields without duplicates
-        schema_dict['required'] = list(required_fields)
+def _millis(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return (moment - _EPOCH) // datetime.timedelta(milliseconds=1)
 
-        # Write the collection schema to a JSON file
-        file_path = os.path.join(output_dir, f'{collection_name}_schema.json')
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump({'$jsonSchema': schema_dict}, f, indent=4)
+def _encode_element(name, value):
+    key = _cstring(name)
+    if value is None:
+        return b'\x0a' + key
+    if value is True or value is False:
+        return b'\x08' + key + (b'\x01' if value else b'\x00')
+    if isinstance(value, int):
+        if _INT32_MIN <= value <= _INT32_MAX:
+            return b'\x10' + key + struct.pack('<i', value)
+        return b'\x12' + key + struct.pack('<q', value)
+    if isinstance(value, float):
+        return b'\x01' + key + struct.pack('<d', value)
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        return b'\x02' + key + struct.pack('<i', len(data) + 1) + data + b'\x00'
+    if isinstance(value, bytes):
+        return b'\x05' + key + struct.pack('<i', len(value)) + b'\x00' + value
+    if isinstance(value, datetime.datetime):
+        return b'\x09' + key + struct.pack('<q', _millis(value))
+    if isinstance(value, list):
+        return b'\x04' + key + encode_bson({str(i): item for i, item in enumerate(value)})
+    if isinstance(value, dict):
+        return b'\x03' + key + encode_bson(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} as BSON")
+
+def encode_bson(document):
+    body = b''.join(_encode_element(name, value) for name, value in document.items())
+    return struct.pack('<i', len(body) + 5) + body + b'\x00'
+
+def _decode_document(data, offset):
+    # Returns the document starting at offset and the offset after it
+    end = offset + struct.unpack_from('<i', data, offset)[0]
+    offset += 4
+    document = {}
+    while offset < end - 1:
+        kind = data[offset]
+        name_end = data.index(b'\x00', offset + 1)
+        name = data[offset + 1:name_end].decode('utf-8')
+        offset = name_end + 1
+        if kind == 0x0a:
+            value = None
+        elif kind == 0x08:
+            value = data[offset] == 1
+            offset += 1
+        elif kind == 0x10:
+            value = struct.unpack_from('<i', data, offset)[0]
+            offset += 4
+        elif kind == 0x12:
+            value = struct.unpack_from('<q', data, offset)[0]
+            offset += 8
+        elif kind == 0x01:
+            value = struct.unpack_from('<d', data, offset)[0]
+            offset += 8
+        elif kind == 0x02:
+            size = struct.unpack_from('<i', data, offset)[0]
+            value = data[offset + 4:offset + 3 + size].decode('utf-8')
+            offset += 4 + size
+        elif kind == 0x05:
+            size = struct.unpack_from('<i', data, offset)[0]
+            value = bytes(data[offset + 5:offset + 5 + size])
+            offset += 5 + size
+        elif kind == 0x09:
+            millis = struct.unpack_from('<q', data, offset)[0]
+            value = (_EPOCH + datetime.timedelta(milliseconds=millis)).replace(tzinfo=None)
+            offset += 8
+        elif kind in (0x03, 0x04):
+            value, offset = _decode_document(data, offset)
+            if kind == 0x04:
+                value = list(value.values())
+        else:
+            raise ValueError(f"Unsupported BSON element type 0x{kind:02x}")
+        document[name] = value
+    return document, end
+
+def decode_bson(data):
+    # Every document of a concatenated BSON stream, e.g. an ingest batch
+    offset = 0
+    while offset < len(data):
+        document, offset = _decode_document(data, offset)
+        yield document
+
+# Relaxed Extended JSON, as mongoimport and mongosh's EJSON.parse read it
+
+def _ejson_default(value):
+    if isinstance(value, datetime.datetime):
+        millis = _millis(value)
+        if 0 <= millis < 253402300800000:
+            return {'$date': (_EPOCH + datetime.timedelta(milliseconds=millis)).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'}
+        return {'$date': {'$numberLong': str(millis)}}
+    if isinstance(value, bytes):
+        return {'$binary': {'base64': base64.b64encode(value).decode('ascii'), 'subType': '00'}}
+    raise TypeError(f"Cannot encode {type(value).__name__} as Extended JSON")
+
+def encode_ejson(document):
+    return json.dumps(document, default=_ejson_default, ensure_ascii=False, separators=(',', ':'))
+
+def _ejson_hook(value):
+    if len(value) == 1:
+        if '$date' in value:
+            date = value['$date']
+            # The hook runs innermost first, so a {"$numberLong": ...} date
+            # arrives here already decoded to its milliseconds
+            if isinstance(date, int):
+                return (_EPOCH + datetime.timedelta(milliseconds=date)).replace(tzinfo=None)
+            moment = datetime.datetime.fromisoformat(date.replace('Z', '+00:00'))
+            return moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if '$binary' in value:
+            return base64.b64decode(value['$binary']['base64'])
+        if '$numberLong' in value:
+            return int(value['$numberLong'])
+    return value
+
+def decode_ejson(text):
+    return json.loads(text, object_hook=_ejson_hook)
+
+# CDS record values to the Python values that encode as the column's BSON type
+
+def _as_int(value):
+    value = int(value)
+    if not _INT64_MIN <= value <= _INT64_MAX:
+        raise OverflowError(value)
+    return value
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('t', 'true', '1', 'yes', 'y')
+    return bool(value)
+
+def _as_datetime(value):
+    if isinstance(value, datetime.datetime):
+        moment = value
+    elif isinstance(value, datetime.date):
+        moment = datetime.datetime(value.year, value.month, value.day)
+    else:
+        moment = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment
+
+def _as_date(value):
+    # BSON has no date-only type: dates are stored as midnight UTC
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    return _as_datetime(value)
+
+def _as_list(value):
+    values = value if isinstance(value, list) else [value]
+    return [None if item is None else str(item) for item in values]
+
+def _as_text(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+VALUE_CONVERTERS = {
+    'INT': _as_int,
+    'FLOAT': float,
+    'BOOLEAN': _as_bool,
+    'DATE': _as_date,
+    'DATETIME': _as_datetime,
+    'BLOB': lambda value: value.encode('utf-8') if isinstance(value, str) else bytes(value),
+    'Array(VARCHAR(255))': _as_list,
+}
+
+def table_converters(table):
+    return [(column.name, VALUE_CONVERTERS.get(column.type_name, _as_text)) for column in table.columns]
+
+def record_document(record, columns):
+    # The document and the number of values that did not convert to their
+    # column type. Null values are left out: a missing field reads as null in
+    # queries, and the validator only accepts the column's own type; values
+    # that do not convert are left out the same way.
+    document = {}
+    invalid = 0
+    for name, convert in columns:
+        value = record.get(name)
+        if value is None:
+            continue
+        try:
+            document[name] = convert(value)
+        except (TypeError, ValueError, OverflowError):
+            invalid += 1
+    return document, invalid
+
+class Denormalizer:
+    # Performs the joins of embedded relationships once, at load time, so
+    # reads need no $lookup. collect() takes a first pass over the records
+    # and keeps the documents of every referenced collection, by key; embed()
+    # then replaces each embedded reference of a document with the referenced
+    # document (one level deep: its own references stay as they are). Only
+    # the referenced collections are held in memory.
+
+    def __init__(self, schema, embed):
+        self.embedded = embedded_columns(schema, embed)
+        self.converters = {}
+        self.keys = {}
+        for columns in self.embedded.values():
+            for _, rel in columns:
+                self.converters[rel.table.name] = table_converters(rel.table)
+                self.keys.setdefault(rel.table.name, set()).add(rel.column.name)
+        # (collection, key field) -> {key value: document}
+        self.documents = {(table_name, key): {} for table_name, keys in self.keys.items() for key in keys}
+        self.unresolved = 0
+
+    def __bool__(self):
+        return bool(self.embedded)
+
+    def collect(self, records):
+        for table_name, record in records:
+            keys = self.keys.get(table_name)
+            if keys is None:
+                continue
+            document, _ = record_document(record, self.converters[table_name])
+            for key in keys:
+                value = document.get(key)
+                if value is not None:
+                    self.documents[(table_name, key)][value] = document
+
+    def resolve(self, table_name, key, value):
+        document = self.documents[(table_name, key)].get(value)
+        if document is None:
+            # Dangling reference: embed the key alone rather than lose it
+            self.unresolved += 1
+            return {key: value}
+        return document
+
+    def embed(self, table_name, document):
+        for column, rel in self.embedded.get(table_name, ()):
+            value = document.get(column.name)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                document[column.name] = [self.resolve(rel.table.name, rel.column.name, item)
+                                         for item in value if item is not None]
+            else:
+                document[column.name] = self.resolve(rel.table.name, rel.column.name, value)
+        return document
+
+def export_insert_many(schema, data_path, output_dir=INGEST_DIR, format='ejson', embed=None,
+                       max_bytes=MAX_BATCH_BYTES, max_documents=MAX_BATCH_DOCUMENTS, max_open=256):
+    # Converts a CDS data file into insertMany batches, written as they fill:
+    # <collection>.<n>.json files holding an Extended JSON array
+    # (mongoimport --jsonArray) or <collection>.<n>.bson files of concatenated
+    # BSON documents. A batch holds at most max_documents documents and
+    # max_bytes of BSON (and, for EJSON, of text). manifest.json lists the
+    # batches in order; insert_batches() loads them. With embed, the
+    # relationship types it embeds are joined in by a Denormalizer, which
+    # reads data_path once more beforehand.
+    if format not in INGEST_FORMATS:
+        raise ValueError(f"Unknown ingest format '{format}' (expected one of: {', '.join(INGEST_FORMATS)})")
+    extension = 'json' if format == 'ejson' else 'bson'
+
+    schema = compile_schema(schema)
+    os.makedirs(output_dir, exist_ok=True)
+
+    converters = {table.name: table_converters(table) for table in schema.tables}
+    denormalizer = Denormalizer(schema, embed)
+    if denormalizer:
+        with phase('join'):
+            denormalizer.collect(iter_records(data_path))
+    # Per collection: the open batch as [number, documents, BSON bytes, file bytes]
+    batches = {}
+    finished = []
+    counts = {}
+    skipped = 0
+    invalid = 0
+
+    def batch_path(collection_name):
+        return os.path.join(output_dir, f'{collection_name}.{batches[collection_name][0]:05d}.{extension}')
+
+    def open_file(collection_name, new):
+        f = open(batch_path(collection_name), 'wb' if new else 'ab')
+        if new and format == 'ejson':
+            f.write(b'[')
+        return f
+
+    def close_batch(collection_name):
+        batch = batches[collection_name]
+        if format == 'ejson':
+            pool.get(collection_name).write(b']\n')
+        pool.release(collection_name)
+        finished.append({
+            'collection': collection_name,
+            'file': os.path.basename(batch_path(collection_name)),
+            'documents': batch[1],
+            'bytes': batch[2],
+        })
+
+    pool = WriterPool(open_file, max_open)
+    try:
+        for table_name, record in iter_records(data_path):
+            columns = converters.get(table_name)
+            if columns is None:
+                skipped += 1
+                continue
+
+            document, record_invalid = record_document(record, columns)
+            invalid += record_invalid
+            if denormalizer:
+                denormalizer.embed(table_name, document)
+            encoded = encode_bson(document)
+            encoded_size = len(encoded)
+            if format == 'ejson':
+                encoded = encode_ejson(document).encode('utf-8')
+            if max(encoded_size, len(encoded) + 3) > max_bytes:
+                raise ValueError(f"A '{table_name}' record does not fit in a {max_bytes} byte batch")
+
+            batch = batches.get(table_name)
+            if batch is not None and (
+                batch[1] >= max_documents
+                or batch[2] + encoded_size > max_bytes
+                or batch[3] + len(encoded) + 3 > max_bytes
+            ):
+                close_batch(table_name)
+                batch = None
+            if batch is None:
+                number = batches[table_name][0] + 1 if table_name in batches else 1
+                batch = batches[table_name] = [number, 0, 0, 1]
+
+            f = pool.get(table_name)
+            if format == 'ejson' and batch[1]:
+                f.write(b',\n')
+                batch[3] += 2
+            f.write(encoded)
+            batch[1] += 1
+            batch[2] += encoded_size
+            batch[3] += len(encoded)
+            counts[table_name] = counts.get(table_name, 0) + 1
+
+        for collection_name in batches:
+            close_batch(collection_name)
+    finally:
+        pool.close_all()
+
+    # Batches of a collection stay in order; collections follow the schema
+    order = {table.name: position for position, table in enumerate(schema.tables)}
+    finished.sort(key=lambda entry: (order[entry['collection']], entry['file']))
+    manifest = {'format': format, 'ordered': False, 'batches': finished}
+    write_atomic(os.path.join(output_dir, 'manifest.json'), json.dumps(manifest, indent=4))
+
+    for table in schema.tables:
+        counts.setdefault(table.name, 0)
+    return {'rows': counts, 'skipped': skipped, 'invalid': invalid, 'batches': len(finished),
+            'unresolved': denormalizer.unresolved}
+
+def read_batch(path):
+    # The documents of one ingest batch file
+    if path.endswith('.bson'):
+        with open(path, 'rb') as f:
+            return list(decode_bson(f.read()))
+    with open(path, encoding='utf-8') as f:
+        return decode_ejson(f.read())
+
+def insert_batches(db, output_dir=INGEST_DIR):
+    # Loads an export_insert_many() output with one unordered insert_many per
+    # batch. db is a pymongo Database, or a stand-in with the same interface
+    # such as mongomock's for offline runs. Returns documents inserted per
+    # collection.
+    with open(os.path.join(output_dir, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    inserted = {}
+    for batch in manifest['batches']:
+        documents = read_batch(os.path.join(output_dir, batch['file']))
+        result = db[batch['collection']].insert_many(documents, ordered=manifest['ordered'])
+        inserted[batch['collection']] = inserted.get(batch['collection'], 0) + len(result.inserted_ids)
+    return inserted
 
+def create_indexes(db, schema_dir=SCHEMA_DIR):
+    # Applies the <collection>_indexes.json specs written by generate()
+    for path in sorted(glob.glob(os.path.join(schema_dir, '*_indexes.json'))):
+        with open(path, encoding='utf-8') as f:
+            spec = json.load(f)
+        collection = db[spec['createIndexes']]
+        for index in spec['indexes']:
+            collection.create_index(list(index['key'].items()), name=index['name'],
+                                     unique=index.get('unique', False))
@@ -0,0 +1,258 @@
+import datetime
+import io
+import os
+from .schema_model import compile_schema
+from .profiling import phase
+from .records import iter_records, WriterPool
+
+# pyarrow is optional: only this generator needs it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_DIR = 'parquet_output'
+
+# Rows per Parquet row group in the streaming export
+ROW_GROUP_SIZE = 100000
+
+# Rows buffered across all tables before the largest buffer is flushed early
+MAX_BUFFERED_ROWS = 1000000
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("The Parquet generator requires pyarrow (pip install pyarrow)")
+
+
+def get_arrow_type(column_type_name):
+    # Same CDS column type names the SQL generators map
+    type_mapping = {
+        'VARCHAR(255)': pa.string(),
+        'INT': pa.int64(),
+        'FLOAT': pa.float64(),
+        'BOOLEAN': pa.bool_(),
+        'DATE': pa.date32(),
+        'DATETIME': pa.timestamp('us'),
+        'BLOB': pa.binary(),
+        # Arrays stay in their table as list columns; no intermediary table
+        # is needed in a columnar format
+        'Array(VARCHAR(255))': pa.list_(pa.string()),
+    }
+    return type_mapping.get(column_type_name, pa.string())
+
+
+def arrow_schema(table, constraints=True):
+    # Without constraints every field is nullable: the data export stores
+    # missing and invalid values as null rather than abort on them, and NOT
+    # NULL belongs to the DDL
+    fields = []
+    for column in table.columns:
+        nullable = True
+        for prop in column.properties:
+            if constraints and prop.name == 'nullable' and not prop.value:
+                nullable = False
+        fields.append(pa.field(column.name, get_arrow_type(column.type_name), nullable=nullable))
+    return pa.schema(fields)
+
+
+def generate(schema, cache=None, compression='snappy'):
+    require_pyarrow()
+
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # Create a directory to store the Parquet files
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+
+    # Per-table cache: only tables whose definition changed are rewritten
+    if cache is not None:
+        target = cache.target('parquet', __file__)
+        fingerprints = cache.fingerprints(schema)
+
+    # One empty, fully typed file per table
+    for table in schema.tables:
+        table_name = table.name
+        file_path = os.path.join(PARQUET_DIR, f'{table_name}.parquet')
+
+        if cache is not None and target.is_fresh(table_name, fingerprints[table_name], file_path):
+            continue
+
+        with phase('render', light=True):
+            empty = arrow_schema(table).empty_table()
+        with phase('write', light=True):
+            if cache is not None:
+                buffer = io.BytesIO()
+                pq.write_table(empty, buffer, compression=compression)
+                target.write(table_name, fingerprints[table_name], file_path, buffer.getvalue())
+            else:
+                pq.write_table(empty, file_path, compression=compression)
+
+    if cache is not None:
+        target.prune()
+
+
+# Range of Arrow's int64
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+def _as_int(value):
+    value = int(value)
+    if not INT64_MIN <= value <= INT64_MAX:
+        raise OverflowError(value)
+    return value
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('t', 'true', '1', 'yes', 'y')
+    return bool(value)
+
+
+def convert_value(value, column_type_name):
+    # JSON values to the Python objects pyarrow expects for the column type.
+    # Raises TypeError, ValueError or OverflowError for a value that does not
+    # fit the column type
+    if value is None:
+        return None
+    if column_type_name == 'Array(VARCHAR(255))':
+        values = value if isinstance(value, list) else [value]
+        return [None if v is None else str(v) for v in values]
+    if column_type_name == 'DATE' and isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    if column_type_name == 'DATETIME' and isinstance(value, str):
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if column_type_name == 'BLOB' and isinstance(value, str):
+        return value.encode('utf-8')
+    if column_type_name == 'INT':
+        return _as_int(value)
+    if column_type_name == 'FLOAT':
+        return float(value)
+    if column_type_name == 'BOOLEAN':
+        return _as_bool(value)
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+def export_parquet(schema, data_path, output_dir=PARQUET_DIR, row_group_size=ROW_GROUP_SIZE,
+                   max_buffered_rows=MAX_BUFFERED_ROWS, compression='snappy', max_open=256):
+    # Streams a CDS data file into one Parquet file per table. Rows are
+    # buffered column by column and written as a row group once a table has
+    # row_group_size of them; when all buffers together pass max_buffered_rows
+    # the largest ones are flushed until half of that is left, so memory stays
+    # bounded whatever the number of tables or the order of the records.
+    # At most max_open writers stay open. A closed Parquet file cannot be
+    # appended to, so a table whose writer was closed continues in a new part
+    # file, <table>.2.parquet, <table>.3.parquet, ...; read the parts of a
+    # table together as one dataset. Files are written under a .tmp name and
+    # only renamed into place once the whole export succeeded, replacing the
+    # previous export's files, parts included.
+    require_pyarrow()
+    schema = compile_schema(schema)
+    os.makedirs(output_dir, exist_ok=True)
+
+    tables = {table.name: table for table in schema.tables}
+    schemas = {}
+    columns = {}
+    buffers = {}
+    parts = {}
+    # Final path -> temporary path of every file written
+    written = {}
+    counts = {}
+    skipped = 0
+    invalid = 0
+    buffered = 0
+
+    def open_writer(table_name, new):
+        parts[table_name] = 1 if new else parts[table_name] + 1
+        suffix = '' if parts[table_name] == 1 else f'.{parts[table_name]}'
+        path = os.path.join(output_dir, f'{table_name}{suffix}.parquet')
+        written[path] = f'{path}.tmp'
+        return pq.ParquetWriter(written[path], schemas[table_name], compression=compression)
+
+    pool = WriterPool(open_writer, max_open=max_open)
+
+    def flush(table_name):
+        buffer = buffers[table_name]
+        if not buffer[0]:
+            return 0
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(buffer, schemas[table_name])],
+            schema=schemas[table_name],
+        )
+        pool.get(table_name).write_batch(batch, row_group_size=row_group_size)
+        rows = len(buffer[0])
+        for values in buffer:
+            values.clear()
+        return rows
+
+    complete = False
+    try:
+        for table_name, record in iter_records(data_path):
+            table = tables.get(table_name)
+            if table is None:
+                skipped += 1
+                continue
+
+            buffer = buffers.get(table_name)
+            if buffer is None:
+                schemas[table_name] = arrow_schema(table, constraints=False)
+                columns[table_name] = [(column.name, column.type_name) for column in table.columns]
+                buffer = buffers[table_name] = [[] for _ in table.columns]
+
+            for values, (name, type_name) in zip(buffer, columns[table_name]):
+                try:
+                    values.append(convert_value(record.get(name), type_name))
+                except (TypeError, ValueError, OverflowError):
+                    # Values that do not fit the column type are stored as null
+                    values.append(None)
+                    invalid += 1
+            counts[table_name] = counts.get(table_name, 0) + 1
+            buffered += 1
+
+            if len(buffer[0]) >= row_group_size:
+                buffered -= flush(table_name)
+            elif buffered >= max_buffered_rows:
+                # One pass over the buffers, largest first; the next overflow
+                # is at least max_buffered_rows / 2 records away
+                for name in sorted(buffers, key=lambda name: len(buffers[name][0]), reverse=True):
+                    if buffered <= max_buffered_rows // 2:
+                        break
+                    buffered -= flush(name)
+
+        for table_name in buffers:
+            flush(table_name)
+
+        # Tables without any records still get an empty typed file
+        for table_name, table in tables.items():
+            if table_name not in parts:
+                path = os.path.join(output_dir, f'{table_name}.parquet')
+                written[path] = f'{path}.tmp'
+                pq.write_table(arrow_schema(table, constraints=False).empty_table(), written[path],
+                               compression=compression)
+                parts[table_name] = 1
+                counts.setdefault(table_name, 0)
+        complete = True
+    finally:
+        pool.close_all()
+        if not complete:
+            for tmp_path in written.values():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    for path, tmp_path in written.items():
+        os.replace(tmp_path, path)
+    # Part files a previous, more fragmented export left behind
+    for name in os.listdir(output_dir):
+        stem = name[:-len('.parquet')]
+        if not name.endswith('.parquet') or stem in parts:
+            continue
+        table_name, _, part = stem.rpartition('.')
+        if table_name in parts and part.isdigit() and int(part) > parts[table_name]:
+            os.remove(os.path.join(output_dir, name))
+
+    return {'rows': counts, 'skipped': skipped, 'invalid': invalid}
@@ -1,232 +1,460 @@
+import datetime
 import json
-import re
-from collections import defaultdict
-    
-def generate(schema):
-    # Create mappings from UUIDs to names
-    column_type_map = {ct['uuid']: ct['name'] for ct in schema['column_types']}
-    relationship_type_map = {rt['uuid']: rt['name'] for rt in schema['relationship_types']}
-    property_type_map = {pt['uuid']: pt['name'] for pt in schema['property_types']}
-
-    # Function to get SQL data type from column type name
-    def get_sql_type(column_type_name):
-        type_mapping = {
-            'VARCHAR(255)': 'VARCHAR(255)',
-            'INT': 'INT',
-            'FLOAT': 'FLOAT',
-            'BOOLEAN': 'TINYINT(1)',  # MySQL uses TINYINT(1) for BOOLEAN
-            'DATE': 'DATE',
-            'DATETIME': 'DATETIME',
-            'BLOB': 'BLOB',
-        }
-        return type_mapping.get(column_type_name, 'VARCHAR(255)')
-
-    # Collect SQL statements
-    sql_statements = []
-
-    # Keep track of intermediary tables for Array types
-    intermediary_tables = []
-
-    # Iterate over each table
-    for table in schema['tables']:
-        table_name = table['name']
-        columns_sql = []
-        primary_keys = []
-        foreign_keys = []
-        
-        # Iterate over columns
-        for column in table['columns']:
-            column_name = column['name']
-            column_type_uuid = column['type']
-            column_type_name = column_type_map.get(column_type_uuid)
-            
-            # Special handling for Array(VARCHAR(255))
-            if column_type_name == 'Array(VARCHAR(255))':
-                # Create intermediary table instead of column
-                if column['relationship'] and len(column['relationship']) > 0:
-                    relationship = column['relationship'][0]
-                    intermediary_table_name = relationship['name']
-                    
-                    related_table_uuid = relationship['table_uuid']
-                    related_column_uuid = relationship['column_uuid']
-                    
-                    # Get the related table name and column name
-                    related_table = next((t for t in schema['tables'] if t['uuid'] == related_table_uuid), None)
-                    if related_table:
-                        related_table_name = related_table['name']
-                        related_column = next((col for col in related_table['columns'] if col['uuid'] == related_column_uuid), None)
-                        if related_column:
-                            related_column_name = related_column['name']
-                        else:
-                            related_column_name = 'UUID'  # Default to 'UUID' if not found
-                    else:
-                        related_table_name = None
-                        related_column_name = 'UUID'
-                else:
-                    # No relationship info
-                    intermediary_table_name = f"{table_name}_{column_name}"
-                    related_table_name = None
-                    related_column_name = column_name
-
-                intermediary_tables.append({
-                    'name': intermediary_table_name,
-                    'primary_table': table_name,
-                    'primary_column': 'UUID',  # Assuming 'UUID' is the primary key
-                    'foreign_table': related_table_name,
-                    'foreign_column': related_column_name,
-                    'column_name': column_name
-                })
-                continue  # Skip adding this column to the main table
-            else:
-                sql_type = get_sql_type(column_type_name)
-            
-            column_def = f'    `{column_name}` {sql_type}'
-            
-            # Handle properties (e.g., nullable, primary key)
-            if column['properties']:
-                for prop in column['properties']:
-                    prop_name = property_type_map.get(prop['type'])
-                    prop_value = prop['value']
-                    
-                    if prop_name == 'nullable' and not prop_value:
-                        column_def += ' NOT NULL'
-                    if prop_name == 'PrimaryKey' and prop_value == 'true':
-                        primary_keys.append(column_name)
-            
-            columns_sql.append(column_def)
-            
-            # Handle relationships for non-array types (if needed)
-            if column['relationship']:
-                for rel in column['relationship']:
-                    related_table_uuid = rel['table_uuid']
-                    related_column_uuid = rel['column_uuid']
-                    related_table_name = next(
-                        (t['name'] for t in schema['tables'] if t['uuid'] == related_table_uuid),
-                        None
-                    )
-                    related_column_name = next(
-                        (
-                            col['name']
-                            for t in schema['tables'] if t['uuid'] == related_table_uuid
-                            for col in t['columns'] if col['uuid'] == related_column_uuid
-                        ),
-                        None
-                    )
-                    if related_table_name and related_column_name:
-                        foreign_keys.append(
-                            f'    FOREIGN KEY (`{column_name}`) REFERENCES '
-                            f'`{related_table_name}`(`{related_column_name}`)'
-                        )
-        
-        # Create the CREATE TABLE statement
-        create_table_sql = f'CREATE TABLE `{table_name}` (\n' + ",\n".join(columns_sql)
-        
-        # Add primary key constraint
-        if primary_keys:
-            pk = ", ".join([f'`{pk}`' for pk in primary_keys])
-            create_table_sql += f',\n    PRIMARY KEY ({pk})'
-        
-        # Add foreign key constraints
-        if foreign_keys:
-            create_table_sql += ',\n' + ",\n".join(foreign_keys)
-        
-        # Close the CREATE TABLE statement
-        create_table_sql += '\n) ENGINE=InnoDB;\n'  # Use InnoDB for foreign key support
-        
-        sql_statements.append(create_table_sql)
-
-    # Create intermediary tables for Array types
-    for inter_table in intermediary_tables:
-        table_name = inter_table['name']
-        primary_table = inter_table['primary_table']
-        primary_column = inter_table['primary_column']
-        foreign_table = inter_table['foreign_table']
-        foreign_column = inter_table['foreign_column']
-        column_name = inter_table['column_name']
-
-        columns = []
-        constraints = []
-
-        # Primary table foreign key
-        columns.append(f'    `{primary_table}_ID` VARCHAR(255) NOT NULL')
-        constraints.append(
-            f'    FOREIGN KEY (`{primary_table}_ID`) REFERENCES '
-            f'`{primary_table}`(`{primary_column}`)'
-        )
-
-        if foreign_table:
-            # Foreign table foreign key
-            columns.append(f'    `{column_name}_ID` VARCHAR(255) NOT NULL')
-            constraints.append(
-                f'    FOREIGN KEY (`{column_name}_ID`) REFERENCES '
-                f'`{foreign_table}`(`{foreign_column}`)'
+import os
+from contextlib import ExitStack
+from .schema_model import compile_schema
+from .sql_common import (StatementStream, open_sink, order_tables, constraint_name, index_defs,
+                         partition_plan, partition_fingerprint, partition_table_defs, iter_table_rows,
+                         INDEX_MODES)
+from .sql_common import iter_table_defs as common_table_defs
+from .sql_migrations import diff_table_defs, write_migration, BACKFILL_BATCH_SIZE
+from .profiling import phase
+from .records import iter_records, WriterPool
+
+OUTPUT_PATH = 'create_database_mysql.sql'
+INDEX_OUTPUT_PATH = 'create_indexes_mysql.sql'
+PARTITION_OUTPUT_PATH = 'partitions_mysql.sql'
+LOAD_DATA_DIR = 'mysql_load'
+MIGRATION_DIR = 'migrations_mysql'
+
+# Function to get SQL data type from column type name
+def get_sql_type(column_type_name):
+    type_mapping = {
+        'VARCHAR(255)': 'VARCHAR(255)',
+        'INT': 'INT',
+        'FLOAT': 'FLOAT',
+        'BOOLEAN': 'TINYINT(1)',  # MySQL uses TINYINT(1) for BOOLEAN
+        'DATE': 'DATE',
+        'DATETIME': 'DATETIME',
+        'BLOB': 'BLOB',
+    }
+    return type_mapping.get(column_type_name, 'VARCHAR(255)')
+
+def quote(name):
+    return f'`{name}`'
+
+def iter_table_defs(schema):
+    return common_table_defs(schema, get_sql_type, quote)
+
+def render_create_table(table_def, deferred, deferred_constraints):
+    table_name = table_def['name']
+
+    # InnoDB supports no foreign keys to or from a partitioned table
+    unenforced = table_def.get('unenforced_keys', ())
+    create_table_sql = ''.join(
+        f'-- `{table_name}`(`{column_name}`) references `{related_table_name}`(`{related_column_name}`), '
+        f'not enforced: partitioned table\n'
+        for column_name, related_table_name, related_column_name in unenforced
+    )
+
+    # Create the CREATE TABLE statement
+    create_table_sql += f'CREATE TABLE `{table_name}` (\n' + ",\n".join(table_def['columns'])
+
+    # Add primary key constraint
+    if table_def['primary_keys']:
+        pk = ", ".join([f'`{pk}`' for pk in table_def['primary_keys']])
+        create_table_sql += f',\n    PRIMARY KEY ({pk})'
+
+    # Add foreign key constraints; the ones closing a cycle are added with
+    # ALTER TABLE once every table exists
+    foreign_keys = []
+    for foreign_key in table_def['foreign_keys']:
+        column_name, related_table_name, related_column_name = foreign_key
+        if foreign_key in unenforced:
+            continue
+        if related_table_name in deferred:
+            name = constraint_name('fk', table_name, column_name, max_length=64)
+            deferred_constraints.append(
+                f'ALTER TABLE `{table_name}` ADD CONSTRAINT `{name}` '
+                f'FOREIGN KEY (`{column_name}`) REFERENCES `{related_table_name}`(`{related_column_name}`);'
             )
         else:
-            # If no foreign table, include the column as VARCHAR(255)
-            columns.append(f'    `{foreign_column}` VARCHAR(255) NOT NULL')
-
-        # Create the CREATE TABLE statement
-        create_table_sql = f'CREATE TABLE `{table_name}` (\n' + ",\n".join(columns)
-        
-        if constraints:
-            create_table_sql += ',\n' + ",\n".join(constraints)
-        
-        create_table_sql += '\n) ENGINE=InnoDB;\n'
-        
-        sql_statements.append(create_table_sql)
-        
-    # Create a list of table creation statement segments using regex
-    table_creation_segments = []
-    table_names = []
-    dependency_graph = defaultdict(set)
-    pattern = r'CREATE TABLE\s+`(\w+)`\s*\((.*?)\) ENGINE=InnoDB;'
-
-    for stmt in sql_statements:
-        matches = re.findall(pattern, stmt, re.DOTALL)
-        for match in matches:
-            table_name, table_content = match
-            table_names.append(table_name)
-            table_creation_segments.append(f'CREATE TABLE `{table_name}` ({table_content}) ENGINE=InnoDB;')
-            
-            # Find foreign key dependencies
-            fk_pattern = r'FOREIGN KEY\s*\(`(\w+)`\)\s*REFERENCES\s*`(\w+)`'
-            fk_matches = re.findall(fk_pattern, table_content)
-            for _, referenced_table in fk_matches:
-                dependency_graph[table_name].add(referenced_table)
-
-    # Topological sort function
-    def topological_sort(graph):
-        visited = set()
-        stack = []
-
-        def dfs(node):
-            if node in visited:
+            foreign_keys.append(
+                f'    FOREIGN KEY (`{column_name}`) REFERENCES '
+                f'`{related_table_name}`(`{related_column_name}`)'
+            )
+    if foreign_keys:
+        create_table_sql += ',\n' + ",\n".join(foreign_keys)
+
+    # Close the CREATE TABLE statement
+    create_table_sql += '\n) ENGINE=InnoDB'  # Use InnoDB for foreign key support
+
+    # Initial partitions of a partitioned table; cds_create_partitions() adds
+    # the following ones
+    partition = table_def.get('partition')
+    if partition is not None:
+        column_name, _, bounds = partition
+        create_table_sql += f'\nPARTITION BY RANGE COLUMNS(`{column_name}`) (\n' + ',\n'.join(
+            f"    PARTITION `p{suffix}` VALUES LESS THAN ('{upper.isoformat()}')"
+            for suffix, _, upper in bounds
+        ) + '\n)'
+
+    return create_table_sql + ';'
+
+def render_create_indexes(table_def):
+    statements = []
+    for name, columns, unique in index_defs(table_def, max_length=64, skip_types=('BLOB',)):
+        column_list = ', '.join(f'`{column}`' for column in columns)
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        statements.append(f'CREATE {kind} `{name}` ON `{table_def["name"]}` ({column_list});')
+    return statements
+
+def render_partition_script(plan):
+    # cds_create_partitions(ahead) adds the partitions up to the end of the
+    # `ahead` periods following the current one to every partitioned table.
+    # RANGE partitions can only be added above the highest one, so a table
+    # whose partitions fell behind gets its gap folded into the current
+    # period's partition. Run it ahead of time, e.g. daily from cron:
+    #   mysql -e 'CALL cds_create_partitions(3)'
+    calls = ''.join(
+        f"    CALL cds_add_partitions('{table_name}', {'TRUE' if interval == 'monthly' else 'FALSE'}, ahead);\n"
+        for table_name, (_, interval, _) in plan.items()
+    )
+    return (
+        'DROP PROCEDURE IF EXISTS cds_add_partitions;\n'
+        'DROP PROCEDURE IF EXISTS cds_create_partitions;\n'
+        'DELIMITER //\n'
+        'CREATE PROCEDURE cds_add_partitions(IN tbl VARCHAR(64), IN monthly BOOLEAN, IN ahead INT)\n'
+        'BEGIN\n'
+        '    DECLARE i INT DEFAULT 0;\n'
+        '    DECLARE lower_bound DATE;\n'
+        '    DECLARE upper_bound DATE;\n'
+        '    DECLARE highest VARCHAR(255);\n'
+        '    WHILE i <= ahead DO\n'
+        '        IF monthly THEN\n'
+        "            SET lower_bound = DATE_ADD(DATE_FORMAT(CURDATE(), '%Y-%m-01'), INTERVAL i MONTH);\n"
+        '            SET upper_bound = DATE_ADD(lower_bound, INTERVAL 1 MONTH);\n'
+        '        ELSE\n'
+        '            SET lower_bound = DATE_ADD(CURDATE(), INTERVAL i DAY);\n'
+        '            SET upper_bound = DATE_ADD(lower_bound, INTERVAL 1 DAY);\n'
+        '        END IF;\n'
+        '        SELECT MAX(PARTITION_DESCRIPTION) INTO highest FROM information_schema.PARTITIONS\n'
+        '            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = tbl;\n'
+        "        IF highest < CONCAT('''', upper_bound, '''') THEN\n"
+        "            SET @cds_partition_sql = CONCAT('ALTER TABLE `', tbl, '` ADD PARTITION (PARTITION `p',\n"
+        "                DATE_FORMAT(lower_bound, IF(monthly, '%Y%m', '%Y%m%d')),\n"
+        "                '` VALUES LESS THAN (''', upper_bound, '''))');\n"
+        '            PREPARE cds_partition_stmt FROM @cds_partition_sql;\n'
+        '            EXECUTE cds_partition_stmt;\n'
+        '            DEALLOCATE PREPARE cds_partition_stmt;\n'
+        '        END IF;\n'
+        '        SET i = i + 1;\n'
+        '    END WHILE;\n'
+        'END //\n'
+        'CREATE PROCEDURE cds_create_partitions(IN ahead INT)\n'
+        'BEGIN\n'
+        f'{calls}'
+        'END //\n'
+        'DELIMITER ;\n'
+        'CALL cds_create_partitions(3);\n'
+    )
+
+def write_ddl(schema, out, index_out=None, plan=None):
+    # Each statement is written as soon as every table it references has been
+    # written, so memory is bounded by the tables still waiting on a dependency.
+    # Index statements follow each table on index_out (same sink when inline).
+    # Tables in the partition plan are created partitioned.
+    deferred_constraints = []
+
+    def emit(table_def, deferred):
+        with phase('render', light=True):
+            sql = render_create_table(table_def, deferred, deferred_constraints)
+            index_statements = render_create_indexes(table_def) if index_out is not None else ()
+        with phase('write', light=True):
+            out.write(sql + '\n')
+            for stmt in index_statements:
+                index_out.write(stmt + '\n')
+
+    # Phases: 'build' (table definitions), 'order' (dependency sorting, which
+    # calls emit() and so contains 'render' and 'write')
+    stream = StatementStream(emit, {table.name for table in schema.tables})
+    table_defs = iter_table_defs(schema)
+    if plan:
+        table_defs = partition_table_defs(table_defs, plan, referenced_keys=False, partitioned_keys=False)
+    while True:
+        with phase('build', light=True):
+            table_def = next(table_defs, None)
+        if table_def is None:
+            break
+        with phase('order', light=True):
+            stream.add(table_def)
+    with phase('order', light=True):
+        stream.close()
+
+    with phase('write', light=True):
+        for stmt in deferred_constraints:
+            out.write(stmt + '\n')
+
+def generate(schema, cache=None, output=None, indexes='inline', partitions=None, partition_start=None,
+             partition_periods=None):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # Tables partitioned by range on a date column, from their 'partition'
+    # column property or the partitions mapping (table -> (column, interval))
+    plan = partition_plan(schema, partitions, partition_start, partition_periods)
+
+    # Output goes to create_database_mysql.sql unless another path or a
+    # file-like sink (e.g. sys.stdout) is given
+    if output is None:
+        output = OUTPUT_PATH
+
+    # Indexes follow their table in the DDL ('inline'), go to a post-load
+    # script so bulk loads run without them ('separate'), or are skipped
+    if indexes not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode '{indexes}' (expected one of: {', '.join(INDEX_MODES)})")
+    paths = [output]
+    if indexes == 'separate':
+        paths.append(INDEX_OUTPUT_PATH)
+    if plan:
+        paths.append(PARTITION_OUTPUT_PATH)
+
+    with ExitStack() as stack:
+        # Skip the whole run when no table changed since the cached run
+        if cache is not None and isinstance(output, str):
+            target = cache.target('mysql', __file__)
+            fingerprint = f'{cache.schema_fingerprint(schema)}:{indexes}'
+            if plan:
+                fingerprint += f':{partition_fingerprint(plan, partition_start)}'
+            if all(target.is_fresh(path, fingerprint, path) for path in paths):
                 return
-            visited.add(node)
-            for neighbor in graph.get(node, []):
-                dfs(neighbor)
-            stack.append(node)
-
-        for node in graph:
-            dfs(node)
-
-        return stack[::-1]
-
-    # Sort tables based on dependencies
-    sorted_tables = topological_sort(dependency_graph)
-
-    # Reorder table_creation_segments based on sorted_tables
-    sorted_segments = []
-    for table in sorted_tables:
-        for segment in table_creation_segments:
-            if segment.startswith(f'CREATE TABLE `{table}`'):
-                sorted_segments.append(segment)
-                break
-
-    # Reverse the order of the table creation segments
-    sorted_segments.reverse()
-
-    # Write the SQL statements to a file
-    with open('create_database_mysql.sql', 'w') as f:
-        for stmt in sorted_segments:
-            f.write(stmt + '\n')
+            sinks = [stack.enter_context(target.stream(path, fingerprint, path)) for path in paths]
+        else:
+            sinks = [stack.enter_context(open_sink(path)) for path in paths]
+
+        # Write the SQL statements as they are produced
+        out = sinks[0]
+        index_out = {'inline': out, 'separate': sinks[1] if len(sinks) > 1 else None, 'none': None}[indexes]
+        write_ddl(schema, out, index_out, plan)
+        if plan:
+            with phase('write', light=True):
+                sinks[-1].write(render_partition_script(plan))
+
+# Values the backfill step puts in NULLs of a column becoming NOT NULL
+BACKFILL_VALUES = {
+    'VARCHAR(255)': "''",
+    'INT': '0',
+    'FLOAT': '0',
+    'TINYINT(1)': '0',
+    'DATE': "'1970-01-01'",
+    'DATETIME': "'1970-01-01 00:00:00'",
+    'BLOB': "''",
+}
+
+# Runs a LIMITed UPDATE until it changes no more rows; with autocommit every
+# batch commits on its own
+BACKFILL_PROCEDURE = (
+    'DROP PROCEDURE IF EXISTS cds_backfill;\n'
+    'DELIMITER //\n'
+    'CREATE PROCEDURE cds_backfill(IN update_sql TEXT)\n'
+    'BEGIN\n'
+    '    SET @cds_backfill_sql = update_sql;\n'
+    '    PREPARE cds_backfill_stmt FROM @cds_backfill_sql;\n'
+    '    REPEAT\n'
+    '        EXECUTE cds_backfill_stmt;\n'
+    '    UNTIL ROW_COUNT() = 0 END REPEAT;\n'
+    '    DEALLOCATE PREPARE cds_backfill_stmt;\n'
+    'END //\n'
+    'DELIMITER ;'
+)
+
+def render_drop_foreign_key(table_name, column_name, related_table_name):
+    # Foreign keys declared in CREATE TABLE carry generated names, so the
+    # name is looked up; DO 0 stands in when there is nothing to drop
+    return (
+        "SET @cds_migration_sql = COALESCE((SELECT CONCAT('ALTER TABLE `" + table_name + "` DROP FOREIGN KEY `', "
+        "CONSTRAINT_NAME, '`')\n"
+        '    FROM information_schema.KEY_COLUMN_USAGE\n'
+        f"    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '{table_name}' AND COLUMN_NAME = '{column_name}'\n"
+        f"        AND REFERENCED_TABLE_NAME = '{related_table_name}' LIMIT 1), 'DO 0');\n"
+        'PREPARE cds_migration_stmt FROM @cds_migration_sql;\n'
+        'EXECUTE cds_migration_stmt;\n'
+        'DEALLOCATE PREPARE cds_migration_stmt;'
+    )
+
+def render_migration(operations):
+    # Statements of each migration step for the operations of
+    # diff_table_defs(). MySQL commits every DDL statement on its own, so no
+    # step runs as a transaction. Index builds run online (INPLACE, no lock);
+    # MODIFY COLUMN rebuilds the table, so every column change, relaxing NOT
+    # NULL included, waits for the enforce step.
+    steps = {}
+
+    def add(step, *statements):
+        steps.setdefault(step, []).extend(statements)
+
+    for operation in operations:
+        kind = operation[0]
+        if kind == 'drop_foreign_key':
+            add('expand', render_drop_foreign_key(*operation[1:]))
+        elif kind == 'rename_table':
+            add('expand', f'RENAME TABLE `{operation[1]}` TO `{operation[2]}`;')
+        elif kind == 'rename_column':
+            add('expand', f'ALTER TABLE `{operation[1]}` RENAME COLUMN `{operation[2]}` TO `{operation[3]}`;')
+        elif kind == 'rename_index':
+            add('expand', f'ALTER TABLE `{operation[1]}` RENAME INDEX `{operation[2]}` TO `{operation[3]}`;')
+        elif kind == 'create_table':
+            add('expand', render_create_table(operation[1], frozenset(), []))
+        elif kind == 'add_column':
+            # Appended nullable columns are added instantly (MySQL 8.0.29+)
+            add('expand', f'ALTER TABLE `{operation[1]}` ADD COLUMN {operation[2]};')
+        elif kind == 'alter_column':
+            _, table_name, _, _, _, _, new_required, column_sql = operation
+            not_null = ' NOT NULL' if new_required else ''
+            add('enforce', f'ALTER TABLE `{table_name}` MODIFY COLUMN {column_sql}{not_null};')
+        elif kind == 'backfill':
+            _, table_name, column_name, sql_type = operation
+            value = BACKFILL_VALUES.get(sql_type, "''")
+            update = (f'UPDATE `{table_name}` SET `{column_name}` = {value} '
+                      f'WHERE `{column_name}` IS NULL LIMIT {BACKFILL_BATCH_SIZE}')
+            add('backfill', "CALL cds_backfill('" + update.replace("'", "''") + "');")
+        elif kind == 'set_primary_key':
+            _, table_name, old_columns, new_columns = operation
+            changes = []
+            if old_columns:
+                changes.append('DROP PRIMARY KEY')
+            if new_columns:
+                pk = ', '.join(f'`{column}`' for column in new_columns)
+                changes.append(f'ADD PRIMARY KEY ({pk})')
+            add('enforce', f'ALTER TABLE `{table_name}` {", ".join(changes)};')
+        elif kind == 'add_foreign_key':
+            _, table_name, column_name, related_table_name, related_column_name = operation
+            name = constraint_name('fk', table_name, column_name, max_length=64)
+            add('enforce', f'ALTER TABLE `{table_name}` ADD CONSTRAINT `{name}` FOREIGN KEY (`{column_name}`) '
+                           f'REFERENCES `{related_table_name}`(`{related_column_name}`);')
+        elif kind == 'create_index':
+            _, table_name, name, columns, unique = operation
+            column_list = ', '.join(f'`{column}`' for column in columns)
+            index_kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            add('indexes', f'CREATE {index_kind} `{name}` ON `{table_name}` ({column_list}) ALGORITHM=INPLACE LOCK=NONE;')
+        elif kind == 'drop_index':
+            _, table_name, name, early = operation
+            add('expand' if early else 'contract', f'DROP INDEX `{name}` ON `{table_name}`;')
+        elif kind == 'drop_column':
+            _, table_name, column_name, early = operation
+            add('expand' if early else 'contract', f'ALTER TABLE `{table_name}` DROP COLUMN `{column_name}`;')
+        elif kind == 'drop_table':
+            _, table_name, early = operation
+            add('expand' if early else 'contract', f'DROP TABLE `{table_name}`;')
+
+    if 'backfill' in steps:
+        steps['backfill'] = [BACKFILL_PROCEDURE] + steps['backfill'] + ['DROP PROCEDURE cds_backfill;']
+    return steps
+
+def generate_migration(old_schema, schema, output_dir=MIGRATION_DIR):
+    # Writes the migration from old_schema to schema as one script per step
+    # (see sql_migrations) and returns their paths; none when nothing changed
+    old_schema = compile_schema(old_schema)
+    schema = compile_schema(schema)
+    with phase('diff'):
+        operations = diff_table_defs(iter_table_defs(old_schema), iter_table_defs(schema),
+                                     {'max_length': 64, 'skip_types': ('BLOB',)})
+    with phase('render'):
+        steps = render_migration(operations)
+    with phase('write'):
+        return write_migration(output_dir, steps)
+
+# LOAD DATA default escaping (FIELDS ESCAPED BY '\\'), \N for NULL
+_TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+def load_data_value(value, sql_type):
+    if value is None:
+        return '\\N'
+    if sql_type == 'TINYINT(1)':
+        if isinstance(value, str):
+            return '1' if value.strip().lower() in ('t', 'true', '1', 'yes', 'y') else '0'
+        return '1' if value else '0'
+    if sql_type == 'BLOB':
+        # Loaded through a user variable and UNHEX() so any bytes survive
+        data = value.encode('utf-8') if isinstance(value, str) else bytes(value)
+        return data.hex()
+    if sql_type == 'DATETIME' and isinstance(value, str):
+        # MySQL has no time zone suffix in DATETIME literals: normalize to UTC
+        try:
+            moment = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value.translate(_TSV_ESCAPES)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return moment.isoformat(sep=' ')
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return str(value).translate(_TSV_ESCAPES)
+
+def render_load_data(table_def, file_name):
+    # Columns and SET clause for one LOAD DATA LOCAL INFILE statement
+    targets = []
+    assignments = []
+    for position, (column_name, sql_type) in enumerate(table_def['data_columns']):
+        if sql_type == 'BLOB':
+            variable = f'@blob_{position}'
+            targets.append(variable)
+            assignments.append(f'`{column_name}` = UNHEX({variable})')
+        else:
+            targets.append(f'`{column_name}`')
+
+    stmt = (
+        f"LOAD DATA LOCAL INFILE '{file_name}' INTO TABLE `{table_def['name']}`\n"
+        f"    CHARACTER SET utf8mb4\n"
+        f"    FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'\n"
+        f"    LINES TERMINATED BY '\\n'\n"
+        f"    ({', '.join(targets)})"
+    )
+    if assignments:
+        stmt += f"\n    SET {', '.join(assignments)}"
+    return stmt + ';'
+
+def export_load_data(schema, data_path, output_dir=LOAD_DATA_DIR, max_open=256):
+    # Converts a CDS data file into one tab-separated file per table, escaped
+    # the way LOAD DATA expects, plus a script that loads them in the same
+    # InnoDB table order as the DDL with foreign key and unique checks off
+    schema = compile_schema(schema)
+    ordered_defs, _ = order_tables(list(iter_table_defs(schema)))
+    os.makedirs(output_dir, exist_ok=True)
+
+    file_names = {
+        table_def['name']: f'{position:04d}_{table_def["name"]}.tsv'
+        for position, table_def in enumerate(ordered_defs, 1)
+    }
+    sql_types = {
+        table_def['name']: [sql_type for _, sql_type in table_def['data_columns']]
+        for table_def in ordered_defs
+    }
+
+    def open_file(table_name, new):
+        return open(os.path.join(output_dir, file_names[table_name]), 'w' if new else 'a',
+                    encoding='utf-8', newline='')
+
+    pool = WriterPool(open_file, max_open=max_open)
+    counts = {}
+    skipped = 0
+
+    def write_row(table_name, values):
+        line = '\t'.join(load_data_value(value, sql_type) for value, sql_type in zip(values, sql_types[table_name]))
+        pool.get(table_name).write(line + '\n')
+        counts[table_name] = counts.get(table_name, 0) + 1
+
+    try:
+        for table_name, values in iter_table_rows(iter_records(data_path), ordered_defs):
+            if values is None:
+                skipped += 1
+                continue
+            write_row(table_name, values)
+    finally:
+        pool.close_all()
+
+    # Loader script, run with: mysql --local-infile=1 db < load_mysql.sql
+    with open(os.path.join(output_dir, 'load_mysql.sql'), 'w') as f:
+        f.write('SET foreign_key_checks = 0;\n')
+        f.write('SET unique_checks = 0;\n')
+        f.write('SET autocommit = 0;\n\n')
+        for table_def in ordered_defs:
+            if table_def['name'] in counts:
+                f.write(render_load_data(table_def, file_names[table_def['name']]) + '\n\n')
+        f.write('COMMIT;\n')
+        f.write('SET unique_checks = 1;\n')
+        f.write('SET foreign_key_checks = 1;\n')
+
+    return {'rows': counts, 'skipped': skipped}
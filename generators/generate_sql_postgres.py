@@ -1,225 +1,533 @@
+import datetime
 import json
+import os
+import struct
+from contextlib import ExitStack
+from .schema_model import compile_schema
+from .sql_common import (StatementStream, open_sink, order_tables, constraint_name, index_defs,
+                         partition_plan, partition_fingerprint, partition_table_defs, iter_table_rows,
+                         INDEX_MODES)
+from .sql_common import iter_table_defs as common_table_defs
+from .sql_migrations import diff_table_defs, write_migration, BACKFILL_BATCH_SIZE
+from .profiling import phase
+from .records import iter_records, WriterPool
 
-def generate(schema):
-
-    # Create mappings from UUIDs to names
-    column_type_map = {ct['uuid']: ct['name'] for ct in schema['column_types']}
-    relationship_type_map = {rt['uuid']: rt['name'] for rt in schema['relationship_types']}
-    property_type_map = {pt['uuid']: pt['name'] for pt in schema['property_types']}
-
-    # Function to get SQL data type from column type name
-    def get_sql_type(column_type_name):
-        type_mapping = {
-            'VARCHAR(255)': 'VARCHAR(255)',
-            'INT': 'INTEGER',
-            'FLOAT': 'REAL',
-            'BOOLEAN': 'BOOLEAN',
-            'DATE': 'DATE',
-            'DATETIME': 'TIMESTAMP',
-            'BLOB': 'BYTEA',
-        }
-        return type_mapping.get(column_type_name, 'VARCHAR(255)')
-
-    # Collect SQL statements
-    sql_statements = []
-
-    # Keep track of intermediary tables for Array types
-    intermediary_tables = []
-
-    # Iterate over each table
-    for table in schema['tables']:
-        table_name = table['name']
-        columns_sql = []
-        primary_keys = []
-        foreign_keys = []
-        
-        # Iterate over columns
-        for column in table['columns']:
-            column_name = column['name']
-            column_type_uuid = column['type']
-            column_type_name = column_type_map.get(column_type_uuid)
-            
-            # Special handling for Array(VARCHAR(255))
-            if column_type_name == 'Array(VARCHAR(255))':
-                # Create intermediary table instead of column
-                if column['relationship'] and len(column['relationship']) > 0:
-                    relationship = column['relationship'][0]
-                    intermediary_table_name = relationship['name']
-                    
-                    related_table_uuid = relationship['table_uuid']
-                    related_column_uuid = relationship['column_uuid']
-                    
-                    # Get the related table name and column name
-                    related_table = next((t for t in schema['tables'] if t['uuid'] == related_table_uuid), None)
-                    if related_table:
-                        related_table_name = related_table['name']
-                        related_column = next((col for col in related_table['columns'] if col['uuid'] == related_column_uuid), None)
-                        if related_column:
-                            related_column_name = related_column['name']
-                        else:
-                            related_column_name = 'UUID'  # Default to 'UUID' if not found
-                    else:
-                        related_table_name = None
-                        related_column_name = 'UUID'
-                else:
-                    # No relationship info
-                    intermediary_table_name = f"{table_name}_{column_name}"
-                    related_table_name = None
-                    related_column_name = column_name
-
-                intermediary_tables.append({
-                    'name': intermediary_table_name,
-                    'primary_table': table_name,
-                    'primary_column': 'UUID',  # Assuming 'UUID' is the primary key
-                    'foreign_table': related_table_name,
-                    'foreign_column': related_column_name,
-                    'column_name': column_name
-                })
-                continue  # Skip adding this column to the main table
-            else:
-                sql_type = get_sql_type(column_type_name)
-            
-            column_def = f'    "{column_name}" {sql_type}'
-            
-            # Handle properties (e.g., nullable, primary key)
-            if column['properties']:
-                for prop in column['properties']:
-                    prop_name = property_type_map.get(prop['type'])
-                    prop_value = prop['value']
-                    
-                    if prop_name == 'nullable' and not prop_value:
-                        column_def += ' NOT NULL'
-                    if prop_name == 'PrimaryKey' and prop_value == 'true':
-                        primary_keys.append(column_name)
-            
-            columns_sql.append(column_def)
-            
-            # Handle relationships for non-array types (if needed)
-            if column['relationship']:
-                for rel in column['relationship']:
-                    related_table_uuid = rel['table_uuid']
-                    related_column_uuid = rel['column_uuid']
-                    related_table_name = next((t['name'] for t in schema['tables'] if t['uuid'] == related_table_uuid), None)
-                    related_column_name = next((col['name'] for t in schema['tables'] if t['uuid'] == related_table_uuid for col in t['columns'] if col['uuid'] == related_column_uuid), None)
-                    if related_table_name and related_column_name:
-                        foreign_keys.append(f'    FOREIGN KEY ("{column_name}") REFERENCES "{related_table_name}"("{related_column_name}")')
-        
-        # Create the CREATE TABLE statement
-        create_table_sql = f'CREATE TABLE "{table_name}" (\n' + ",\n".join(columns_sql)
-        
-        # Add primary key constraint
-        if primary_keys:
-            pk = ", ".join([f'"{pk}"' for pk in primary_keys])
-            create_table_sql += f',\n    PRIMARY KEY ({pk})'
-        
-        # Add foreign key constraints
-        if foreign_keys:
-            create_table_sql += ',\n' + ",\n".join(foreign_keys)
-        
-        # Close the CREATE TABLE statement
-        create_table_sql += '\n);\n'
-        
-        sql_statements.append(create_table_sql)
-
-    # Create intermediary tables for Array types
-    for inter_table in intermediary_tables:
-        table_name = inter_table['name']
-        primary_table = inter_table['primary_table']
-        primary_column = inter_table['primary_column']
-        foreign_table = inter_table['foreign_table']
-        foreign_column = inter_table['foreign_column']
-        column_name = inter_table['column_name']
-
-        columns = []
-        constraints = []
-
-        # Primary table foreign key
-        columns.append(f'    "{primary_table}_ID" VARCHAR(255) NOT NULL')
-        constraints.append(f'    FOREIGN KEY ("{primary_table}_ID") REFERENCES "{primary_table}"("{primary_column}")')
-
-        if foreign_table:
-            # Foreign table foreign key
-            columns.append(f'    "{column_name}_ID" VARCHAR(255) NOT NULL')
-            constraints.append(f'    FOREIGN KEY ("{column_name}_ID") REFERENCES "{foreign_table}"("{foreign_column}")')
+OUTPUT_PATH = 'create_database_postgres.sql'
+INDEX_OUTPUT_PATH = 'create_indexes_postgres.sql'
+PARTITION_OUTPUT_PATH = 'partitions_postgres.sql'
+COPY_DIR = 'postgres_copy'
+MIGRATION_DIR = 'migrations_postgres'
+
+# COPY formats: file extension and the WITH options of the load script
+COPY_FORMATS = {
+    'text': ('dat', ''),
+    'csv': ('csv', ' WITH (FORMAT csv)'),
+    'binary': ('bin', ' WITH (FORMAT binary)'),
+}
+
+# Function to get SQL data type from column type name
+def get_sql_type(column_type_name):
+    type_mapping = {
+        'VARCHAR(255)': 'VARCHAR(255)',
+        'INT': 'INTEGER',
+        'FLOAT': 'REAL',
+        'BOOLEAN': 'BOOLEAN',
+        'DATE': 'DATE',
+        'DATETIME': 'TIMESTAMP',
+        'BLOB': 'BYTEA',
+    }
+    return type_mapping.get(column_type_name, 'VARCHAR(255)')
+
+def quote(name):
+    return f'"{name}"'
+
+def iter_table_defs(schema):
+    return common_table_defs(schema, get_sql_type, quote)
+
+def partition_name(table_name, suffix):
+    # Same truncation as cds_create_partitions() so both name a period alike
+    return f'{table_name[:61 - len(suffix)]}_p{suffix}'
+
+def render_create_table(table_def, deferred, deferred_constraints):
+    table_name = table_def['name']
+
+    # Foreign keys referencing a partitioned table cannot be declared: its
+    # primary key also holds the partition column
+    unenforced = table_def.get('unenforced_keys', ())
+    create_table_sql = ''.join(
+        f'-- "{table_name}"("{column_name}") references "{related_table_name}"("{related_column_name}"), '
+        f'not enforced: "{related_table_name}" is partitioned\n'
+        for column_name, related_table_name, related_column_name in unenforced
+    )
+
+    # Create the CREATE TABLE statement
+    create_table_sql += f'CREATE TABLE "{table_name}" (\n' + ",\n".join(table_def['columns'])
+
+    # Add primary key constraint
+    if table_def['primary_keys']:
+        pk = ", ".join([f'"{pk}"' for pk in table_def['primary_keys']])
+        create_table_sql += f',\n    PRIMARY KEY ({pk})'
+
+    # Add foreign key constraints; the ones closing a cycle are added with
+    # ALTER TABLE once every table exists
+    foreign_keys = []
+    for foreign_key in table_def['foreign_keys']:
+        column_name, related_table_name, related_column_name = foreign_key
+        if foreign_key in unenforced:
+            continue
+        if related_table_name in deferred:
+            name = constraint_name('fk', table_name, column_name)
+            deferred_constraints.append(
+                f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{name}" '
+                f'FOREIGN KEY ("{column_name}") REFERENCES "{related_table_name}"("{related_column_name}");'
+            )
+        else:
+            foreign_keys.append(f'    FOREIGN KEY ("{column_name}") REFERENCES "{related_table_name}"("{related_column_name}")')
+    if foreign_keys:
+        create_table_sql += ',\n' + ",\n".join(foreign_keys)
+
+    # Close the CREATE TABLE statement; a partitioned table is followed by
+    # its initial partitions
+    partition = table_def.get('partition')
+    if partition is None:
+        create_table_sql += '\n);'
+    else:
+        column_name, _, bounds = partition
+        create_table_sql += f'\n) PARTITION BY RANGE ("{column_name}");'
+        for suffix, lower, upper in bounds:
+            create_table_sql += (
+                f'\nCREATE TABLE "{partition_name(table_name, suffix)}" PARTITION OF "{table_name}" '
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}');"
+            )
+
+    return create_table_sql
+
+def render_create_indexes(table_def):
+    statements = []
+    for name, columns, unique in index_defs(table_def):
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        statements.append(f'CREATE {kind} "{name}" ON "{table_def["name"]}" ({column_list});')
+    return statements
+
+def render_partition_script(plan):
+    # cds_create_partitions(ahead) creates the partitions of the current
+    # period and the `ahead` following ones for every partitioned table,
+    # skipping the ones that exist. Run it ahead of time, e.g. daily from cron:
+    #   psql -c 'SELECT cds_create_partitions(3)'
+    tables = ',\n'.join(
+        f"        ('{table_name}', '{'month' if interval == 'monthly' else 'day'}', "
+        f"'{'YYYYMM' if interval == 'monthly' else 'YYYYMMDD'}')"
+        for table_name, (_, interval, _) in plan.items()
+    )
+    return (
+        'CREATE OR REPLACE FUNCTION cds_create_partitions(ahead integer DEFAULT 3) RETURNS void AS $$\n'
+        'DECLARE\n'
+        '    part record;\n'
+        '    lower_bound date;\n'
+        '    upper_bound date;\n'
+        'BEGIN\n'
+        '    FOR part IN SELECT * FROM (VALUES\n'
+        f'{tables}\n'
+        '    ) AS partitioned(table_name, unit, suffix) LOOP\n'
+        '        FOR i IN 0..ahead LOOP\n'
+        "            lower_bound := (date_trunc(part.unit, current_date::timestamp)\n"
+        "                            + i * ('1 ' || part.unit)::interval)::date;\n"
+        "            upper_bound := (lower_bound + ('1 ' || part.unit)::interval)::date;\n"
+        "            EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',\n"
+        "                           left(part.table_name, 61 - length(part.suffix)) || '_p'\n"
+        "                           || to_char(lower_bound, part.suffix),\n"
+        '                           part.table_name, lower_bound, upper_bound);\n'
+        '        END LOOP;\n'
+        '    END LOOP;\n'
+        'END;\n'
+        '$$ LANGUAGE plpgsql;\n'
+        'SELECT cds_create_partitions(3);\n'
+    )
+
+def write_ddl(schema, out, index_out=None, plan=None):
+    # Each statement is written as soon as every table it references has been
+    # written, so memory is bounded by the tables still waiting on a dependency.
+    # Index statements follow each table on index_out (same sink when inline).
+    # Tables in the partition plan are created partitioned.
+    deferred_constraints = []
+
+    def emit(table_def, deferred):
+        with phase('render', light=True):
+            sql = render_create_table(table_def, deferred, deferred_constraints)
+            index_statements = render_create_indexes(table_def) if index_out is not None else ()
+        with phase('write', light=True):
+            out.write(sql + '\n')
+            for stmt in index_statements:
+                index_out.write(stmt + '\n')
+
+    # Phases: 'build' (table definitions), 'order' (dependency sorting, which
+    # calls emit() and so contains 'render' and 'write')
+    stream = StatementStream(emit, {table.name for table in schema.tables})
+    table_defs = iter_table_defs(schema)
+    if plan:
+        table_defs = partition_table_defs(table_defs, plan, referenced_keys=False)
+    while True:
+        with phase('build', light=True):
+            table_def = next(table_defs, None)
+        if table_def is None:
+            break
+        with phase('order', light=True):
+            stream.add(table_def)
+    with phase('order', light=True):
+        stream.close()
+
+    with phase('write', light=True):
+        for stmt in deferred_constraints:
+            out.write(stmt + '\n')
+
+def generate(schema, cache=None, output=None, indexes='inline', partitions=None, partition_start=None,
+             partition_periods=None):
+
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # Tables partitioned by range on a date column, from their 'partition'
+    # column property or the partitions mapping (table -> (column, interval))
+    plan = partition_plan(schema, partitions, partition_start, partition_periods)
+
+    # Output goes to create_database_postgres.sql unless another path or a
+    # file-like sink (e.g. sys.stdout) is given
+    if output is None:
+        output = OUTPUT_PATH
+
+    # Indexes follow their table in the DDL ('inline'), go to a post-load
+    # script so bulk loads run without them ('separate'), or are skipped
+    if indexes not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode '{indexes}' (expected one of: {', '.join(INDEX_MODES)})")
+    paths = [output]
+    if indexes == 'separate':
+        paths.append(INDEX_OUTPUT_PATH)
+    if plan:
+        paths.append(PARTITION_OUTPUT_PATH)
+
+    with ExitStack() as stack:
+        # Skip the whole run when no table changed since the cached run
+        if cache is not None and isinstance(output, str):
+            target = cache.target('postgres', __file__)
+            fingerprint = f'{cache.schema_fingerprint(schema)}:{indexes}'
+            if plan:
+                fingerprint += f':{partition_fingerprint(plan, partition_start)}'
+            if all(target.is_fresh(path, fingerprint, path) for path in paths):
+                return
+            sinks = [stack.enter_context(target.stream(path, fingerprint, path)) for path in paths]
         else:
-            # If no foreign table, include the column as VARCHAR(255)
-            columns.append(f'    "{foreign_column}" VARCHAR(255) NOT NULL')
-
-        # Create the CREATE TABLE statement
-        create_table_sql = f'CREATE TABLE "{table_name}" (\n' + ",\n".join(columns)
-        
-        if constraints:
-            create_table_sql += ',\n' + ",\n".join(constraints)
-        
-        create_table_sql += '\n);\n'
-        
-        sql_statements.append(create_table_sql)
-        
-        
-        
-    # Create a list of table creation statement segments using regex
-    import re
-
-    import re
-    from collections import defaultdict
-
-    table_creation_segments = []
-    table_names = []
-    dependency_graph = defaultdict(set)
-    pattern = r'CREATE TABLE\s+"(\w+)"\s*\((.*?)\);'
-
-    for stmt in sql_statements:
-        matches = re.findall(pattern, stmt, re.DOTALL)
-        for match in matches:
-            table_name, table_content = match
-            table_names.append(table_name)
-            table_creation_segments.append(f'CREATE TABLE "{table_name}" ({table_content});')
-            
-            # Find foreign key dependencies
-            fk_pattern = r'FOREIGN KEY\s*\("(\w+)"\)\s*REFERENCES\s*"(\w+)"'
-            fk_matches = re.findall(fk_pattern, table_content)
-            for _, referenced_table in fk_matches:
-                dependency_graph[table_name].add(referenced_table)
-
-    # Topological sort function
-    def topological_sort(graph):
-        visited = set()
-        stack = []
-
-        def dfs(node):
-            visited.add(node)
-            for neighbor in list(graph[node]):  # Create a copy of the neighbors
-                if neighbor not in visited:
-                    dfs(neighbor)
-            stack.append(node)
-
-        for node in list(graph.keys()):  # Create a copy of the graph keys
-            if node not in visited:
-                dfs(node)
-
-        return stack[::-1]
-
-    # Sort tables based on dependencies
-    sorted_tables = topological_sort(dependency_graph)
-
-    # Reorder table_creation_segments based on sorted_tables
-    sorted_segments = []
-    for table in sorted_tables:
-        for segment in table_creation_segments:
-            if segment.startswith(f'CREATE TABLE "{table}"'):
-                sorted_segments.append(segment)
-                break
-
-    table_creation_segments = sorted_segments
-
-
-    # Reverse the order of the table creation segments
-    table_creation_segments.reverse()
-        
-        
-
-
-    # Write the SQL statements to a file
-    with open('create_database_postgres.sql', 'w') as f:
-        for stmt in table_creation_segments:
-            f.write(stmt + '\n')
+            sinks = [stack.enter_context(open_sink(path)) for path in paths]
+
+        # Write the SQL statements as they are produced
+        out = sinks[0]
+        index_out = {'inline': out, 'separate': sinks[1] if len(sinks) > 1 else None, 'none': None}[indexes]
+        write_ddl(schema, out, index_out, plan)
+        if plan:
+            with phase('write', light=True):
+                sinks[-1].write(render_partition_script(plan))
+
+# Values the backfill step puts in NULLs of a column becoming NOT NULL
+BACKFILL_VALUES = {
+    'VARCHAR(255)': "''",
+    'INTEGER': '0',
+    'REAL': '0',
+    'BOOLEAN': 'false',
+    'DATE': "'1970-01-01'",
+    'TIMESTAMP': "'1970-01-01 00:00:00'",
+    'BYTEA': "''::bytea",
+}
+
+def render_drop_constraint(table_name, kind, column_name=None, related_table_name=None):
+    # Constraints declared inline in CREATE TABLE carry generated names, so
+    # the name is looked up: kind is 'p' (primary key) or 'f' (the foreign
+    # key of column_name referencing related_table_name)
+    condition = f"conrelid = '\"{table_name}\"'::regclass AND contype = '{kind}'"
+    if column_name is not None:
+        condition += (
+            f"\n        AND confrelid = '\"{related_table_name}\"'::regclass"
+            f"\n        AND conkey = ARRAY[(SELECT attnum FROM pg_attribute"
+            f" WHERE attrelid = '\"{table_name}\"'::regclass AND attname = '{column_name}')]"
+        )
+    return (
+        'DO $$\n'
+        'DECLARE\n'
+        '    constraint_name text;\n'
+        'BEGIN\n'
+        f'    SELECT conname INTO constraint_name FROM pg_constraint\n'
+        f'        WHERE {condition};\n'
+        '    IF constraint_name IS NOT NULL THEN\n'
+        f"        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', '{table_name}', constraint_name);\n"
+        '    END IF;\n'
+        'END $$;'
+    )
+
+def render_migration(operations):
+    # Statements of each migration step for the operations of
+    # diff_table_defs(). DDL is transactional, so the expand step runs as one
+    # transaction; the other steps run statement by statement, as CREATE INDEX
+    # CONCURRENTLY and the committing backfill loops require.
+    steps = {}
+
+    def add(step, *statements):
+        steps.setdefault(step, []).extend(statements)
+
+    for operation in operations:
+        kind = operation[0]
+        if kind == 'drop_foreign_key':
+            _, table_name, column_name, related_table_name = operation
+            add('expand', render_drop_constraint(table_name, 'f', column_name, related_table_name))
+        elif kind == 'rename_table':
+            add('expand', f'ALTER TABLE "{operation[1]}" RENAME TO "{operation[2]}";')
+        elif kind == 'rename_column':
+            add('expand', f'ALTER TABLE "{operation[1]}" RENAME COLUMN "{operation[2]}" TO "{operation[3]}";')
+        elif kind == 'rename_index':
+            add('expand', f'ALTER INDEX "{operation[2]}" RENAME TO "{operation[3]}";')
+        elif kind == 'create_table':
+            add('expand', render_create_table(operation[1], frozenset(), []))
+        elif kind == 'add_column':
+            # Nullable without a default: a catalog change only
+            add('expand', f'ALTER TABLE "{operation[1]}" ADD COLUMN {operation[2]};')
+        elif kind == 'alter_column':
+            _, table_name, column_name, old_type, new_type, old_required, new_required, _ = operation
+            if old_required and not new_required:
+                add('expand', f'ALTER TABLE "{table_name}" ALTER COLUMN "{column_name}" DROP NOT NULL;')
+            if old_type != new_type:
+                add('enforce', f'ALTER TABLE "{table_name}" ALTER COLUMN "{column_name}" '
+                               f'TYPE {new_type} USING "{column_name}"::{new_type};')
+            if new_required and not old_required:
+                # A validated CHECK lets SET NOT NULL skip its own full scan,
+                # and validating only takes a lock that lets writes through
+                name = constraint_name('nn', table_name, column_name)
+                add('enforce',
+                    f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{name}" CHECK ("{column_name}" IS NOT NULL) NOT VALID;',
+                    f'ALTER TABLE "{table_name}" VALIDATE CONSTRAINT "{name}";',
+                    f'ALTER TABLE "{table_name}" ALTER COLUMN "{column_name}" SET NOT NULL;',
+                    f'ALTER TABLE "{table_name}" DROP CONSTRAINT "{name}";')
+        elif kind == 'backfill':
+            # Each batch commits, so row locks are only held for one batch
+            _, table_name, column_name, sql_type = operation
+            value = BACKFILL_VALUES.get(sql_type, "''")
+            add('backfill',
+                'DO $$\n'
+                'BEGIN\n'
+                '    LOOP\n'
+                f'        UPDATE "{table_name}" SET "{column_name}" = {value}\n'
+                f'            WHERE ctid IN (SELECT ctid FROM "{table_name}" WHERE "{column_name}" IS NULL '
+                f'LIMIT {BACKFILL_BATCH_SIZE});\n'
+                '        EXIT WHEN NOT FOUND;\n'
+                '        COMMIT;\n'
+                '    END LOOP;\n'
+                'END $$;')
+        elif kind == 'set_primary_key':
+            _, table_name, old_columns, new_columns = operation
+            if old_columns:
+                add('enforce', render_drop_constraint(table_name, 'p'))
+            if new_columns:
+                pk = ', '.join(f'"{column}"' for column in new_columns)
+                add('enforce', f'ALTER TABLE "{table_name}" ADD PRIMARY KEY ({pk});')
+        elif kind == 'add_foreign_key':
+            # Added without checking existing rows, then validated under a
+            # lock that lets writes through
+            _, table_name, column_name, related_table_name, related_column_name = operation
+            name = constraint_name('fk', table_name, column_name)
+            add('enforce',
+                f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{name}" FOREIGN KEY ("{column_name}") '
+                f'REFERENCES "{related_table_name}"("{related_column_name}") NOT VALID;',
+                f'ALTER TABLE "{table_name}" VALIDATE CONSTRAINT "{name}";')
+        elif kind == 'create_index':
+            _, table_name, name, columns, unique = operation
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            index_kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            add('indexes', f'CREATE {index_kind} CONCURRENTLY IF NOT EXISTS "{name}" ON "{table_name}" ({column_list});')
+        elif kind == 'drop_index':
+            _, _, name, early = operation
+            if early:
+                add('expand', f'DROP INDEX IF EXISTS "{name}";')
+            else:
+                add('contract', f'DROP INDEX CONCURRENTLY IF EXISTS "{name}";')
+        elif kind == 'drop_column':
+            _, table_name, column_name, early = operation
+            add('expand' if early else 'contract', f'ALTER TABLE "{table_name}" DROP COLUMN "{column_name}";')
+        elif kind == 'drop_table':
+            _, table_name, early = operation
+            add('expand' if early else 'contract', f'DROP TABLE "{table_name}";')
+
+    if 'expand' in steps:
+        steps['expand'] = ['BEGIN;'] + steps['expand'] + ['COMMIT;']
+    return steps
+
+def generate_migration(old_schema, schema, output_dir=MIGRATION_DIR):
+    # Writes the migration from old_schema to schema as one script per step
+    # (see sql_migrations) and returns their paths; none when nothing changed
+    old_schema = compile_schema(old_schema)
+    schema = compile_schema(schema)
+    with phase('diff'):
+        operations = diff_table_defs(iter_table_defs(old_schema), iter_table_defs(schema))
+    with phase('render'):
+        steps = render_migration(operations)
+    with phase('write'):
+        return write_migration(output_dir, steps)
+
+# COPY text format: backslash escapes, \N for NULL
+_TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t'})
+
+# Binary COPY framing and the epoch PostgreSQL counts dates from
+_BINARY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+_BINARY_TRAILER = struct.pack('>h', -1)
+_PG_EPOCH_DATE = datetime.date(2000, 1, 1)
+_PG_EPOCH = datetime.datetime(2000, 1, 1)
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('t', 'true', '1', 'yes', 'y')
+    return bool(value)
+
+def _as_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+def _as_text(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+def copy_text_value(value, sql_type):
+    if value is None:
+        return '\\N'
+    if sql_type == 'BOOLEAN':
+        return 't' if _as_bool(value) else 'f'
+    if sql_type == 'BYTEA':
+        # bytea hex input; the backslash itself is escaped in text format
+        return '\\\\x' + _as_bytes(value).hex()
+    return _as_text(value).translate(_TEXT_ESCAPES)
+
+def copy_csv_value(value, sql_type):
+    # Unquoted empty field is NULL, so empty strings are always quoted
+    if value is None:
+        return ''
+    if sql_type == 'BOOLEAN':
+        return 't' if _as_bool(value) else 'f'
+    if sql_type == 'BYTEA':
+        return '\\x' + _as_bytes(value).hex()
+    text = _as_text(value)
+    if text == '' or any(c in text for c in ',"\n\r\\') or text == '\\.':
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+def copy_binary_value(value, sql_type):
+    # Field length followed by the value in PostgreSQL's binary send format
+    if value is None:
+        return struct.pack('>i', -1)
+    if sql_type == 'INTEGER':
+        data = struct.pack('>i', int(value))
+    elif sql_type == 'REAL':
+        data = struct.pack('>f', float(value))
+    elif sql_type == 'BOOLEAN':
+        data = b'\x01' if _as_bool(value) else b'\x00'
+    elif sql_type == 'DATE':
+        day = datetime.date.fromisoformat(str(value)[:10])
+        data = struct.pack('>i', (day - _PG_EPOCH_DATE).days)
+    elif sql_type == 'TIMESTAMP':
+        moment = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        data = struct.pack('>q', (moment - _PG_EPOCH) // datetime.timedelta(microseconds=1))
+    elif sql_type == 'BYTEA':
+        data = _as_bytes(value)
+    else:
+        data = _as_text(value).encode('utf-8')
+    return struct.pack('>i', len(data)) + data
+
+def encode_copy_row(values, sql_types, copy_format):
+    if copy_format == 'binary':
+        return struct.pack('>h', len(values)) + b''.join(
+            copy_binary_value(value, sql_type) for value, sql_type in zip(values, sql_types)
+        )
+    if copy_format == 'csv':
+        line = ','.join(copy_csv_value(value, sql_type) for value, sql_type in zip(values, sql_types))
+    else:
+        line = '\t'.join(copy_text_value(value, sql_type) for value, sql_type in zip(values, sql_types))
+    return (line + '\n').encode('utf-8')
+
+def export_copy(schema, data_path, output_dir=COPY_DIR, copy_format='text', max_open=256):
+    # Converts a CDS data file into one COPY data file per table plus a psql
+    # script that loads them in foreign key order. Array columns are split out
+    # into rows of their intermediary tables.
+    if copy_format not in COPY_FORMATS:
+        raise ValueError(f"Unknown COPY format '{copy_format}' (expected one of: {', '.join(COPY_FORMATS)})")
+    extension, with_options = COPY_FORMATS[copy_format]
+
+    schema = compile_schema(schema)
+    ordered_defs, deferred = order_tables(list(iter_table_defs(schema)))
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Files are numbered in foreign key order so a directory listing is also
+    # a valid load order
+    file_names = {
+        table_def['name']: f'{position:04d}_{table_def["name"]}.{extension}'
+        for position, table_def in enumerate(ordered_defs, 1)
+    }
+    sql_types = {
+        table_def['name']: [sql_type for _, sql_type in table_def['data_columns']]
+        for table_def in ordered_defs
+    }
+
+    def open_file(table_name, new):
+        f = open(os.path.join(output_dir, file_names[table_name]), 'wb' if new else 'ab')
+        if new and copy_format == 'binary':
+            f.write(_BINARY_SIGNATURE)
+        return f
+
+    pool = WriterPool(open_file, max_open=max_open)
+    counts = {}
+    skipped = 0
+
+    def write_row(table_name, values):
+        pool.get(table_name).write(encode_copy_row(values, sql_types[table_name], copy_format))
+        counts[table_name] = counts.get(table_name, 0) + 1
+
+    try:
+        for table_name, values in iter_table_rows(iter_records(data_path), ordered_defs):
+            if values is None:
+                skipped += 1
+                continue
+            write_row(table_name, values)
+    finally:
+        pool.close_all()
+
+    if copy_format == 'binary':
+        for table_name in counts:
+            with open(os.path.join(output_dir, file_names[table_name]), 'ab') as f:
+                f.write(_BINARY_TRAILER)
+
+    # Foreign keys closing a cycle cannot hold while the tables are loaded
+    # one by one: they are dropped for the load and added back, which checks
+    # them, before the transaction commits
+    cycle_keys = [
+        (table_def['name'], column_name, related_table_name, related_column_name)
+        for table_def in ordered_defs
+        for column_name, related_table_name, related_column_name in table_def['foreign_keys']
+        if (table_def['name'], related_table_name) in deferred
+    ]
+
+    # psql script loading every non-empty table in foreign key order. The
+    # \copy file names resolve against psql's working directory, so the
+    # script runs from output_dir
+    with open(os.path.join(output_dir, 'load_postgres.sql'), 'w') as f:
+        f.write("-- Run from this directory: psql <database> -f load_postgres.sql\n")
+        f.write('BEGIN;\n')
+        for table_name, column_name, related_table_name, _ in cycle_keys:
+            f.write(render_drop_constraint(table_name, 'f', column_name, related_table_name) + '\n')
+        for table_def in ordered_defs:
+            table_name = table_def['name']
+            if table_name not in counts:
+                continue
+            column_list = ', '.join(f'"{name}"' for name, _ in table_def['data_columns'])
+            f.write(f"\\copy \"{table_name}\" ({column_list}) FROM '{file_names[table_name]}'{with_options}\n")
+        for table_name, column_name, related_table_name, related_column_name in cycle_keys:
+            name = constraint_name('fk', table_name, column_name)
+            f.write(f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{name}" FOREIGN KEY ("{column_name}") '
+                    f'REFERENCES "{related_table_name}"("{related_column_name}");\n')
+        f.write('COMMIT;\n')
+
+    return {'rows': counts, 'skipped': skipped}
@@ -1,162 +1,242 @@
 import json
+import sqlite3
+from contextlib import ExitStack
+from .schema_model import compile_schema
+from .sql_common import StatementStream, open_sink, index_defs, iter_table_rows, INDEX_MODES
+from .sql_common import iter_table_defs as common_table_defs
+from .profiling import phase
+from .records import iter_records
 
-def generate(schema):
-    # Create mappings from UUIDs to names
-    column_type_map = {ct['uuid']: ct['name'] for ct in schema['column_types']}
-    relationship_type_map = {rt['uuid']: rt['name'] for rt in schema['relationship_types']}
-    property_type_map = {pt['uuid']: pt['name'] for pt in schema['property_types']}
-
-    # Function to get SQL data type from column type name
-    def get_sql_type(column_type_name):
-        type_mapping = {
-            'VARCHAR(255)': 'TEXT',
-            'INT': 'INTEGER',
-            'FLOAT': 'REAL',
-            'BOOLEAN': 'INTEGER',  # SQLite uses INTEGER for booleans (0 or 1)
-            'DATE': 'TEXT',        # SQLite stores dates as TEXT or INTEGER
-            'DATETIME': 'TEXT',
-            'BLOB': 'BLOB',
-        }
-        return type_mapping.get(column_type_name, 'TEXT')
-
-    # Collect SQL statements
-    sql_statements = []
-
-    # Keep track of intermediary tables for Array types
-    intermediary_tables = []
+OUTPUT_PATH = 'create_database_sqlite.sql'
+INDEX_OUTPUT_PATH = 'create_indexes_sqlite.sql'
+DATABASE_PATH = 'cds.sqlite'
 
+# Bulk-load defaults: WAL journal, no fsync per transaction and a 256 MB page
+# cache. Any of them can be overridden, e.g. {'synchronous': 'NORMAL'}.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'OFF',
+    'cache_size': -262144,
+    'temp_store': 'MEMORY',
+}
+
+# Function to get SQL data type from column type name
+def get_sql_type(column_type_name):
+    type_mapping = {
+        'VARCHAR(255)': 'TEXT',
+        'INT': 'INTEGER',
+        'FLOAT': 'REAL',
+        'BOOLEAN': 'INTEGER',  # SQLite uses INTEGER for booleans (0 or 1)
+        'DATE': 'TEXT',        # SQLite stores dates as TEXT or INTEGER
+        'DATETIME': 'TEXT',
+        'BLOB': 'BLOB',
+    }
+    return type_mapping.get(column_type_name, 'TEXT')
+
+def quote(name):
+    return f'"{name}"'
+
+def iter_table_defs(schema):
+    # Intermediary tables name their value column after the Array column
+    return common_table_defs(schema, get_sql_type, quote, value_suffix='')
+
+def render_create_table(table_def):
+    table_name = table_def['name']
+
+    # Create the CREATE TABLE statement
+    create_table_sql = f'CREATE TABLE "{table_name}" (\n' + ',\n'.join(table_def['columns'])
+
+    # Add primary key constraint
+    if table_def['primary_keys']:
+        pk = ", ".join([f'"{pk}"' for pk in table_def['primary_keys']])
+        create_table_sql += f',\n    PRIMARY KEY ({pk})'
+
+    # Add foreign key constraints. SQLite only checks foreign keys on writes,
+    # so the ones closing a cycle can stay inline.
+    foreign_keys = [
+        f'    FOREIGN KEY ("{column_name}") REFERENCES "{related_table_name}"("{related_column_name}")'
+        for column_name, related_table_name, related_column_name in table_def['foreign_keys']
+    ]
+    if foreign_keys:
+        create_table_sql += ',\n' + ',\n'.join(foreign_keys)
+
+    # Close the CREATE TABLE statement
+    create_table_sql += '\n);\n'
+
+    return create_table_sql
+
+def render_create_indexes(table_def):
+    statements = []
+    for name, columns, unique in index_defs(table_def):
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        statements.append(f'CREATE {kind} IF NOT EXISTS "{name}" ON "{table_def["name"]}" ({column_list});')
+    return statements
+
+def write_ddl(schema, out, index_out=None):
     # Enable foreign key support
-    sql_statements.append('PRAGMA foreign_keys = ON;\n')
-
-    # Iterate over each table
-    for table in schema['tables']:
-        table_name = table['name']
-        columns_sql = []
-        primary_keys = []
-        foreign_keys = []
-        
-        # Iterate over columns
-        for column in table['columns']:
-            column_name = column['name']
-            column_type_uuid = column['type']
-            column_type_name = column_type_map.get(column_type_uuid)
-            
-            # Special handling for Array(VARCHAR(255))
-            if column_type_name == 'Array(VARCHAR(255))':
-                # Create intermediary table instead of column
-                if column['relationship'] and len(column['relationship']) > 0:
-                    relationship = column['relationship'][0]
-                    intermediary_table_name = relationship['name']
-                    
-                    related_table_uuid = relationship['table_uuid']
-                    related_column_uuid = relationship['column_uuid']
-                    
-                    # Get the related table name and column name
-                    related_table = next((t for t in schema['tables'] if t['uuid'] == related_table_uuid), None)
-                    if related_table:
-                        related_table_name = related_table['name']
-                        related_column = next((col for col in related_table['columns'] if col['uuid'] == related_column_uuid), None)
-                        if related_column:
-                            related_column_name = related_column['name']
-                        else:
-                            related_column_name = 'UUID'  # Default to 'UUID' if not found
-                    else:
-                        related_table_name = None
-                        related_column_name = 'UUID'
-                else:
-                    # No relationship info
-                    intermediary_table_name = f"{table_name}_{column_name}"
-                    related_table_name = None
-                    related_column_name = column_name
-
-                intermediary_tables.append({
-                    'name': intermediary_table_name,
-                    'column_name': column_name,
-                    'primary_table': table_name,
-                    'primary_column': 'UUID',  # Assuming 'UUID' is the primary key
-                    'foreign_table': related_table_name,
-                    'foreign_column': related_column_name
-                })
-                continue  # Skip adding this column to the main table
-            else:
-                sql_type = get_sql_type(column_type_name)
-            
-            column_def = f'"{column_name}" {sql_type}'
-            
-            # Handle properties (e.g., nullable, primary key)
-            if column['properties']:
-                for prop in column['properties']:
-                    prop_name = property_type_map.get(prop['type'])
-                    prop_value = prop['value']
-                    
-                    if prop_name == 'nullable' and not prop_value:
-                        column_def += ' NOT NULL'
-                    if prop_name == 'PrimaryKey' and prop_value == 'true':
-                        primary_keys.append(column_name)
-            
-            columns_sql.append(column_def)
-            
-            # Handle relationships for non-array types (if needed)
-            if column['relationship']:
-                for rel in column['relationship']:
-                    related_table_uuid = rel['table_uuid']
-                    related_column_uuid = rel['column_uuid']
-                    related_table_name = next((t['name'] for t in schema['tables'] if t['uuid'] == related_table_uuid), None)
-                    related_column_name = next((col['name'] for t in schema['tables'] if t['uuid'] == related_table_uuid for col in t['columns'] if col['uuid'] == related_column_uuid), None)
-                    if related_table_name and related_column_name:
-                        foreign_keys.append(f'    FOREIGN KEY ("{column_name}") REFERENCES "{related_table_name}"("{related_column_name}")')
-        
-        # Create the CREATE TABLE statement
-        create_table_sql = f'CREATE TABLE "{table_name}" (\n    ' + ',\n    '.join(columns_sql)
-        
-        # Add primary key constraint
-        if primary_keys:
-            pk = ", ".join([f'"{pk}"' for pk in primary_keys])
-            create_table_sql += f',\n    PRIMARY KEY ({pk})'
-        
-        # Add foreign key constraints
-        if foreign_keys:
-            create_table_sql += ',\n' + ',\n'.join(foreign_keys)
-        
-        # Close the CREATE TABLE statement
-        create_table_sql += '\n);\n'
-        
-        sql_statements.append(create_table_sql)
-
-    # Create intermediary tables for Array types
-    for inter_table in intermediary_tables:
-        table_name = inter_table['name']
-        primary_table = inter_table['primary_table']
-        primary_column = inter_table['primary_column']
-        foreign_table = inter_table['foreign_table']
-        foreign_column = inter_table['foreign_column']
-        column_name = inter_table['column_name']
-        columns = []
-        constraints = []
-
-        # Primary table foreign key
-        columns.append(f'"{primary_table}_ID" TEXT NOT NULL')
-        constraints.append(f'    FOREIGN KEY ("{primary_table}_ID") REFERENCES "{primary_table}"("{primary_column}")')
-
-        if foreign_table:
-            # Foreign table foreign key
-            columns.append(f'"{column_name}" TEXT NOT NULL')
-            constraints.append(f'    FOREIGN KEY ("{column_name}") REFERENCES "{foreign_table}"("{foreign_column}")')
+    out.write('PRAGMA foreign_keys = ON;\n' + '\n')
+
+    # Each statement is written as soon as every table it references has been
+    # written, so memory is bounded by the tables still waiting on a dependency.
+    # Index statements follow each table on index_out (same sink when inline).
+    def emit(table_def, deferred):
+        with phase('render', light=True):
+            sql = render_create_table(table_def)
+            index_statements = render_create_indexes(table_def) if index_out is not None else ()
+        with phase('write', light=True):
+            out.write(sql + '\n')
+            for stmt in index_statements:
+                index_out.write(stmt + '\n')
+
+    # Phases: 'build' (table definitions), 'order' (dependency sorting, which
+    # calls emit() and so contains 'render' and 'write')
+    stream = StatementStream(emit, {table.name for table in schema.tables})
+    table_defs = iter_table_defs(schema)
+    while True:
+        with phase('build', light=True):
+            table_def = next(table_defs, None)
+        if table_def is None:
+            break
+        with phase('order', light=True):
+            stream.add(table_def)
+    with phase('order', light=True):
+        stream.close()
+
+def generate(schema, cache=None, output=None, indexes='inline'):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # Output goes to create_database_sqlite.sql unless another path or a
+    # file-like sink (e.g. sys.stdout) is given
+    if output is None:
+        output = OUTPUT_PATH
+
+    # Indexes follow their table in the DDL ('inline'), go to a post-load
+    # script so bulk loads run without them ('separate'), or are skipped
+    if indexes not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode '{indexes}' (expected one of: {', '.join(INDEX_MODES)})")
+    paths = [output]
+    if indexes == 'separate':
+        paths.append(INDEX_OUTPUT_PATH)
+
+    with ExitStack() as stack:
+        # Skip the whole run when no table changed since the cached run
+        if cache is not None and isinstance(output, str):
+            target = cache.target('sqlite', __file__)
+            fingerprint = f'{cache.schema_fingerprint(schema)}:{indexes}'
+            if all(target.is_fresh(path, fingerprint, path) for path in paths):
+                return
+            sinks = [stack.enter_context(target.stream(path, fingerprint, path)) for path in paths]
         else:
-            # If no foreign table, include the column as TEXT
-            columns.append(f'"{foreign_column}" TEXT NOT NULL')
-
-        # Create the CREATE TABLE statement
-        create_table_sql = f'CREATE TABLE "{table_name}" (\n    ' + ',\n    '.join(columns)
-        
-        if constraints:
-            create_table_sql += ',\n' + ',\n'.join(constraints)
-        
-        create_table_sql += '\n);\n'
-        
-        sql_statements.append(create_table_sql)
-
-    # Write the SQL statements to a file
-    with open('create_database_sqlite.sql', 'w') as f:
-        for stmt in sql_statements:
-            f.write(stmt + '\n')
+            sinks = [stack.enter_context(open_sink(path)) for path in paths]
+
+        # Write the SQL statements as they are produced
+        out = sinks[0]
+        index_out = {'inline': out, 'separate': sinks[-1], 'none': None}[indexes]
+        write_ddl(schema, out, index_out)
+
+def convert_value(value, sql_type):
+    # JSON values to what sqlite3 binds for the column's storage class
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if sql_type == 'BLOB' and isinstance(value, str):
+        return value.encode('utf-8')
+    return value
+
+def load(schema, data_path, database=DATABASE_PATH, batch_size=50000, commit_every=1000000,
+         pragmas=None, check_foreign_keys=True):
+    # Creates the database from the generated DDL and bulk-loads a CDS data
+    # file into it. Records are streamed and inserted with executemany in
+    # batches, inside large transactions; foreign keys are only checked, and
+    # lookup indexes only built, once everything is loaded.
+    schema = compile_schema(schema)
+    table_defs = list(iter_table_defs(schema))
+
+    settings = dict(DEFAULT_PRAGMAS)
+    settings.update(pragmas or {})
+
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        for name, value in settings.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        # Foreign key enforcement stays off for the load
+        conn.execute('PRAGMA foreign_keys = OFF')
+
+        # Create the tables that do not exist yet
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table_def in table_defs:
+            if table_def['name'] not in existing:
+                conn.execute(render_create_table(table_def))
+
+        # One INSERT per table, intermediary tables included
+        insert_sql = {}
+        sql_types = {}
+        for table_def in table_defs:
+            table_name = table_def['name']
+            names = [name for name, _ in table_def['data_columns']]
+            column_list = ', '.join(f'"{name}"' for name in names)
+            placeholders = ', '.join('?' for _ in names)
+            insert_sql[table_name] = f'INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders})'
+            sql_types[table_name] = [sql_type for _, sql_type in table_def['data_columns']]
+
+        buffers = {}
+        counts = {}
+        skipped = 0
+        uncommitted = 0
+
+        def add_row(table_name, row):
+            buffer = buffers.setdefault(table_name, [])
+            buffer.append(row)
+            counts[table_name] = counts.get(table_name, 0) + 1
+            if len(buffer) >= batch_size:
+                conn.executemany(insert_sql[table_name], buffer)
+                buffer.clear()
+
+        def flush_all():
+            for table_name, buffer in buffers.items():
+                if buffer:
+                    conn.executemany(insert_sql[table_name], buffer)
+                    buffer.clear()
+
+        with phase('insert'):
+            conn.execute('BEGIN')
+            # Array columns come out as rows of their intermediary tables
+            for table_name, values in iter_table_rows(iter_records(data_path), table_defs):
+                if values is None:
+                    skipped += 1
+                    continue
+
+                add_row(table_name, tuple(convert_value(value, sql_type)
+                                          for value, sql_type in zip(values, sql_types[table_name])))
+                uncommitted += 1
+
+                if uncommitted >= commit_every:
+                    flush_all()
+                    conn.execute('COMMIT')
+                    conn.execute('BEGIN')
+                    uncommitted = 0
+
+            flush_all()
+            conn.execute('COMMIT')
+
+        # Deferred work: indexes, then the foreign key check
+        with phase('index'):
+            conn.execute('BEGIN')
+            for table_def in table_defs:
+                for stmt in render_create_indexes(table_def):
+                    conn.execute(stmt)
+            conn.execute('COMMIT')
+
+        violations = 0
+        if check_foreign_keys:
+            with phase('foreign key check'):
+                violations = sum(1 for _ in conn.execute('PRAGMA foreign_key_check'))
+    finally:
+        conn.close()
+
+    return {'rows': counts, 'skipped': skipped, 'foreign_key_violations': violations}
@@ -1,22 +1,223 @@
+import datetime
 import json
 import xlsxwriter
+from .schema_model import compile_schema
+from .profiling import phase
+from .records import iter_records
+
+def generate(schema, cache=None):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
+
+    # Skip the whole run when no table changed since the cached run
+    output_path = 'output.xlsx'
+    if cache is not None:
+        target = cache.target('xlsx', __file__)
+        fingerprint = cache.schema_fingerprint(schema)
+        if target.is_fresh(output_path, fingerprint, output_path):
+            return
 
-def generate(schema):
     # Create a new Excel file and add a workbook
-    workbook = xlsxwriter.Workbook('output.xlsx')
+    workbook = xlsxwriter.Workbook(output_path)
 
     # Iterate over each table in the schema
-    for table in schema['tables']:
-        table_name = table['name']
-        worksheet = workbook.add_worksheet(table_name)
+    used_names = set()
+    for table in schema.tables:
+        table_name = table.name
+        worksheet = workbook.add_worksheet(sheet_name(table_name, 1, used_names))
 
         # Extract column names
-        column_names = [column['name'] for column in table['columns']]
+        column_names = [column.name for column in table.columns]
 
         # Write column headers
         for col_num, column_name in enumerate(column_names):
             worksheet.write(0, col_num, column_name)
 
-    # Close the workbook
-    workbook.close()
+    # Close the workbook; xlsxwriter assembles and writes the file here
+    with phase('write'):
+        workbook.close()
+
+    if cache is not None:
+        target.record_file(output_path, fingerprint, output_path)
+
+
+
+# Excel's hard limit on rows per sheet, header included
+MAX_SHEET_ROWS = 1048576
+MAX_SHEET_NAME = 31
+
+WORKBOOK_OPTIONS = {
+    # Rows are flushed to a temporary file as soon as the next row starts,
+    # so memory does not grow with the sheet
+    'constant_memory': True,
+    # Values are written with typed writers; never reinterpret strings
+    'strings_to_numbers': False,
+    'strings_to_formulas': False,
+    'strings_to_urls': False,
+    'nan_inf_to_errors': True,
+    'remove_timezone': True,
+}
+
+
+def sheet_name(table_name, part, used):
+    # '<table>', then '<table>_2', '<table>_3', ... within Excel's 31
+    # characters. Excel wants names unique regardless of case: a name already
+    # in used (lowercased, shared by the whole workbook), e.g. from truncation
+    # or a table named '<table>_2', gets a '~N' suffix instead
+    if part == 1:
+        base = table_name[:MAX_SHEET_NAME]
+    else:
+        suffix = f'_{part}'
+        base = table_name[:MAX_SHEET_NAME - len(suffix)] + suffix
+    name = base
+    attempt = 1
+    while name.lower() in used:
+        attempt += 1
+        tag = f'~{attempt}'
+        name = base[:MAX_SHEET_NAME - len(tag)] + tag
+    used.add(name.lower())
+    return name
+
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return value
+    return float(value)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', '1')
+
+
+def _date(value):
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    raise TypeError(value)
+
+
+def _datetime(value):
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    raise TypeError(value)
+
+
+def _text(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+# CDS column type -> (converter, worksheet writer, cell format key)
+CELL_WRITERS = {
+    'INT': (_number, 'write_number', None),
+    'FLOAT': (_number, 'write_number', None),
+    'BOOLEAN': (_boolean, 'write_boolean', None),
+    'DATE': (_date, 'write_datetime', 'date'),
+    'DATETIME': (_datetime, 'write_datetime', 'datetime'),
+}
+TEXT_WRITER = (_text, 'write_string', None)
+
+
+class _TableSheets:
+    # The sheets of one table: the first is added with the table's first
+    # record, and a new '<table>_N' sheet is started whenever the current one
+    # reaches Excel's row limit
+
+    def __init__(self, workbook, table, formats, used_names):
+        self.workbook = workbook
+        self.used_names = used_names
+        self.table_name = table.name
+        self.column_names = [column.name for column in table.columns]
+        self.column_writers = [CELL_WRITERS.get(column.type_name, TEXT_WRITER) for column in table.columns]
+        self.formats = formats
+        self.part = 0
+        self.rows = 0
+        self.worksheet = None
+
+    def _add_sheet(self):
+        if self.worksheet is not None:
+            self._close_sheet()
+        self.part += 1
+        self.worksheet = self.workbook.add_worksheet(sheet_name(self.table_name, self.part, self.used_names))
+        self.worksheet.write_row(0, 0, self.column_names)
+        self.row = 1
+        # Writers bound to the current sheet, one per column
+        self.writers = [
+            (convert, getattr(self.worksheet, writer), self.formats.get(format_key))
+            for convert, writer, format_key in self.column_writers
+        ]
+
+    def _close_sheet(self):
+        # A finished sheet's temporary file is not needed until the workbook
+        # is assembled, which reopens it (as Workbook.close() itself does)
+        self.worksheet._opt_close()
+
+    def write(self, record):
+        if self.worksheet is None or self.row >= MAX_SHEET_ROWS:
+            self._add_sheet()
+
+        row = self.row
+        write_string = self.worksheet.write_string
+        for col, (name, (convert, write, cell_format)) in enumerate(zip(self.column_names, self.writers)):
+            value = record.get(name)
+            if value is None:
+                continue
+            try:
+                converted = convert(value)
+            except (TypeError, ValueError):
+                # Values that do not match the column type are kept as text
+                write_string(row, col, _text(value))
+                continue
+            if cell_format is None:
+                write(row, col, converted)
+            else:
+                write(row, col, converted, cell_format)
+
+        self.row += 1
+        self.rows += 1
+
+    def close(self):
+        # Tables without records still get a header-only sheet
+        if self.worksheet is None:
+            self._add_sheet()
+        self._close_sheet()
+
+
+def export_xlsx(schema, data_path, output_path='output.xlsx'):
+    # Streams a CDS data file into the workbook, one sheet per table, in
+    # xlsxwriter's constant_memory mode. Records of each table must arrive in
+    # the order they should appear; tables may interleave freely.
+    #
+    # constant_memory keeps a temporary file open for every worksheet being
+    # written, so sheets are only added when their table's first record
+    # arrives and closed once full: the open files are bounded by the tables
+    # that have data, not the tables in the schema. Those still have to fit
+    # under the process's file descriptor limit (ulimit -n). Sheets come in
+    # the order their tables first appear in the data; tables without records
+    # get a header-only sheet at the end.
+    schema = compile_schema(schema)
+
+    workbook = xlsxwriter.Workbook(output_path, WORKBOOK_OPTIONS)
+    formats = {
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+        'datetime': workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'}),
+    }
+
+    used_names = set()
+    sheets = {table.name: _TableSheets(workbook, table, formats, used_names) for table in schema.tables}
+    skipped = 0
+    try:
+        for table_name, record in iter_records(data_path):
+            table_sheets = sheets.get(table_name)
+            if table_sheets is None:
+                skipped += 1
+                continue
+            table_sheets.write(record)
+        for table_sheets in sheets.values():
+            table_sheets.close()
+    finally:
+        workbook.close()
 
+    return {'rows': {name: table_sheets.rows for name, table_sheets in sheets.items()}, 'skipped': skipped}
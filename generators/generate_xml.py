@@ -1,37 +1,247 @@
 import json
 import os
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import re
+from contextlib import contextmanager
+from xml.sax.saxutils import escape, quoteattr
+from .schema_model import compile_schema
+from .records import iter_records, WriterPool
+from .file_output import atomic_open, map_tables, write_manifest
+from .profiling import phase
+
+OUTPUT_DIR = 'xml_output'
+DATA_DIR = 'xml_data'
+
+# Same indentation minidom's toprettyxml() used to produce
+DEFAULT_INDENT = '   '
+
+# Characters XML 1.0 does not allow, even escaped
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+XSD_TYPES = {
+    'VARCHAR(255)': 'xs:string',
+    'INT': 'xs:long',
+    'FLOAT': 'xs:double',
+    'BOOLEAN': 'xs:boolean',
+    'DATE': 'xs:date',
+    'DATETIME': 'xs:dateTime',
+    'BLOB': 'xs:string',
+}
+
+
+class XMLWriter:
+    # Incremental XML writer: elements go straight to the output as they are
+    # started and ended, so nothing is built up in memory. indent=None writes
+    # compact XML; level is the nesting depth of the first element written,
+    # for callers that resume a document.
+
+    def __init__(self, out, indent=DEFAULT_INDENT, level=0):
+        self.out = out
+        self.indent = indent
+        self.stack = []
+        self.level = level
+
+    def _line(self, text):
+        if self.indent is None:
+            self.out.write(text)
+        else:
+            self.out.write(self.indent * (self.level + len(self.stack)) + text + '\n')
+
+    def declaration(self):
+        self._line('<?xml version="1.0" ?>')
+
+    def start(self, tag, attrs=None):
+        self._line(f'<{tag}{_attributes(attrs)}>')
+        self.stack.append(tag)
+
+    def end(self, tag=None):
+        # tag closes an element started by an earlier writer (resumed document)
+        if tag is None:
+            tag = self.stack.pop()
+        self._line(f'</{tag}>')
+
+    def empty(self, tag, attrs=None):
+        self._line(f'<{tag}{_attributes(attrs)}/>')
+
+    def element(self, tag, text, attrs=None):
+        text = escape(_INVALID_XML_CHARS.sub('', text))
+        self._line(f'<{tag}{_attributes(attrs)}>{text}</{tag}>')
+
+    def close(self):
+        while self.stack:
+            self.end()
+
+
+def _attributes(attrs):
+    if not attrs:
+        return ''
+    return ''.join(f' {name}={quoteattr(str(value))}' for name, value in attrs.items())
+
+
+def write_template(table, out, indent=DEFAULT_INDENT):
+    # Since there's no data, the template is a single empty row with one
+    # element per column
+    writer = XMLWriter(out, indent)
+    writer.declaration()
+    writer.start(table.name)
+    writer.start('Row')
+    for column in table.columns:
+        writer.empty(column.name)
+    writer.close()
+
+
+def write_xsd(table, out, indent=DEFAULT_INDENT):
+    # XML Schema for the documents written for this table: a root element
+    # named after the table holding any number of <Row> elements
+    writer = XMLWriter(out, indent)
+    writer.declaration()
+    writer.start('xs:schema', {'xmlns:xs': 'http://www.w3.org/2001/XMLSchema'})
+    writer.start('xs:element', {'name': table.name})
+    writer.start('xs:complexType')
+    writer.start('xs:sequence')
+    writer.start('xs:element', {'name': 'Row', 'minOccurs': 0, 'maxOccurs': 'unbounded'})
+    writer.start('xs:complexType')
+    writer.start('xs:sequence')
+
+    for column in table.columns:
+        attrs = {'name': column.name}
+        if not any(prop.name == 'nullable' and not prop.value for prop in column.properties):
+            attrs['minOccurs'] = 0
+
+        if column.type_name == 'Array(VARCHAR(255))':
+            # Arrays hold one <Item> per element
+            writer.start('xs:element', attrs)
+            writer.start('xs:complexType')
+            writer.start('xs:sequence')
+            writer.empty('xs:element', {'name': 'Item', 'type': 'xs:string', 'minOccurs': 0, 'maxOccurs': 'unbounded'})
+            writer.end()
+            writer.end()
+            writer.end()
+        else:
+            attrs['type'] = XSD_TYPES.get(column.type_name, 'xs:string')
+            writer.empty('xs:element', attrs)
+
+    writer.close()
+
+
+@contextmanager
+def _open_output(cache, target, name, fingerprint, file_path):
+    if cache is not None:
+        with target.stream(name, fingerprint, file_path) as f:
+            yield f
+    else:
+        with atomic_open(file_path) as f:
+            yield f
+
+
+def generate(schema, cache=None, indent=DEFAULT_INDENT, xsd=False, jobs=None, manifest=False):
+    # Compile the schema once (no-op when main.py already did)
+    schema = compile_schema(schema)
 
-def generate(schema):
     # Create a directory to store XML files
-    output_dir = 'xml_output'
+    output_dir = OUTPUT_DIR
     os.makedirs(output_dir, exist_ok=True)
 
-    # Iterate over each table in the schema
-    for table in schema['tables']:
-        table_name = table['name']
-        columns = table['columns']
+    # Per-table cache: only tables whose definition changed are rewritten
+    if cache is not None:
+        target = cache.target('xml', __file__)
+        fingerprints = cache.fingerprints(schema)
+    else:
+        target = None
+
+    def write_table(table):
+        table_name = table.name
+        outputs = [(table_name, os.path.join(output_dir, f'{table_name}.xml'), write_template)]
+        if xsd:
+            outputs.append((f'{table_name}.xsd', os.path.join(output_dir, f'{table_name}.xsd'), write_xsd))
+
+        for name, file_path, write in outputs:
+            # The indentation changes the output, so it is part of the fingerprint
+            fingerprint = f'{fingerprints[table_name]}:{indent!r}' if cache is not None else None
+            if cache is not None and target.is_fresh(name, fingerprint, file_path):
+                continue
+
+            # Stream the document straight to the file
+            with phase('write', light=True):
+                with _open_output(cache, target, name, fingerprint, file_path) as f:
+                    write(table, f, indent)
+
+        return [(table_name, file_path) for _, file_path, _ in outputs]
+
+    # Tables are written concurrently, at most `jobs` at a time
+    written = map_tables(write_table, schema.tables, jobs)
+    if manifest:
+        write_manifest(output_dir, [entry for entries in written for entry in entries])
+
+    if cache is not None:
+        target.prune()
+
+
+def _write_value(writer, tag, value):
+    if value is None:
+        return
+    if isinstance(value, list):
+        writer.start(tag)
+        for item in value:
+            if item is not None:
+                _write_value(writer, 'Item', item)
+        writer.end()
+    elif isinstance(value, bool):
+        writer.element(tag, 'true' if value else 'false')
+    elif isinstance(value, dict):
+        writer.element(tag, json.dumps(value))
+    else:
+        writer.element(tag, str(value))
+
+
+def export_xml(schema, data_path, output_dir=DATA_DIR, indent=None, max_open=256):
+    # Streams a CDS data file into one XML document per table with a <Row>
+    # element per record. Each row is written as soon as it is read, so memory
+    # stays constant however many rows there are.
+    schema = compile_schema(schema)
+    os.makedirs(output_dir, exist_ok=True)
 
-        # Create the root element for the table
-        root = ET.Element(table_name)
+    columns = {table.name: [column.name for column in table.columns] for table in schema.tables}
+    counts = {}
+    skipped = 0
 
-        # Since there's no data, we'll just create a template with column names
-        # Add a single empty row element with column sub-elements
-        row_element = ET.SubElement(root, 'Row')
+    def open_file(table_name, new):
+        path = os.path.join(output_dir, f'{table_name}.xml')
+        f = open(path, 'w' if new else 'a', encoding='utf-8')
+        if new:
+            writer = XMLWriter(f, indent)
+            writer.declaration()
+            writer.start(table_name)
+        return f
 
-        for column in columns:
-            column_name = column['name']
-            column_element = ET.SubElement(row_element, column_name)
-            # You can add attributes or text to column_element if needed
+    pool = WriterPool(open_file, max_open)
+    try:
+        for table_name, record in iter_records(data_path):
+            column_names = columns.get(table_name)
+            if column_names is None:
+                skipped += 1
+                continue
 
-        # Create an ElementTree object
-        tree = ET.ElementTree(root)
+            # Rows sit one level below the table's root element
+            writer = XMLWriter(pool.get(table_name), indent, level=1)
+            writer.start('Row')
+            for name in column_names:
+                _write_value(writer, name, record.get(name))
+            writer.end()
+            counts[table_name] = counts.get(table_name, 0) + 1
+    finally:
+        pool.close_all()
 
-        # Generate a pretty-printed XML string
-        xml_str = minidom.parseString(ET.tostring(root)).toprettyxml(indent="   ")
+    # Close the root element of every document; tables without records still
+    # get an empty, well-formed document
+    for table_name in columns:
+        path = os.path.join(output_dir, f'{table_name}.xml')
+        with open(path, 'a' if table_name in pool.opened else 'w', encoding='utf-8') as f:
+            writer = XMLWriter(f, indent)
+            if table_name not in pool.opened:
+                writer.declaration()
+                writer.empty(table_name)
+            else:
+                writer.end(table_name)
+        counts.setdefault(table_name, 0)
 
-        # Write the XML string to a file
-        file_path = os.path.join(output_dir, f'{table_name}.xml')
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(xml_str)
+    return {'rows': counts, 'skipped': skipped}
@@ -0,0 +1,206 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Per-phase timing for --timings / --profile.
+#
+# Code marks its phases with `with phase('name'):`. Phases nest; each one is
+# recorded under its path (e.g. 'PostgreSQL/order') and aggregated over all
+# its calls: wall and CPU time (total and self, i.e. minus nested phases),
+# peak traced memory and bytes written by the process. While profiling is
+# off, phase() returns a shared no-op context, so the hooks cost next to
+# nothing.
+#
+# Phases entered once per table or per record should pass light=True: they
+# only measure time, which keeps the profiling overhead to a few microseconds
+# per call.
+#
+# Peak memory is the tracemalloc peak of Python allocations. Bytes written come
+# from /proc/self/io where available and cover the whole process, so with
+# several generators running at once those two figures overlap between them.
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+_NULL = contextlib.nullcontext()
+# Kept open: rereading it with pread is a single cheap syscall
+_io_fd = None
+
+
+def enable(trace_memory=True):
+    global _enabled, _io_fd
+    with _lock:
+        _stats.clear()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if _io_fd is None:
+        try:
+            _io_fd = os.open('/proc/self/io', os.O_RDONLY)
+        except OSError:
+            _io_fd = None
+    _enabled = True
+
+
+def disable():
+    global _enabled, _io_fd
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    if _io_fd is not None:
+        os.close(_io_fd)
+        _io_fd = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def _bytes_written():
+    if _io_fd is None:
+        return None
+    data = os.pread(_io_fd, 4096, 0)
+    start = data.find(b'wchar:')
+    if start < 0:
+        return None
+    return int(data[start + 6:data.index(b'\n', start)])
+
+
+def phase(name, light=False):
+    if not _enabled:
+        return _NULL
+    return _Phase(name, light)
+
+
+class _Phase:
+    __slots__ = ('name', 'light', 'parent', 'path', 'child_wall', 'child_cpu', 'peak', 'written', 'wall', 'cpu')
+
+    def __init__(self, name, light):
+        self.name = name
+        self.light = light
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        parent = self.parent = stack[-1] if stack else None
+        self.path = f'{parent.path}/{self.name}' if parent is not None else self.name
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.peak = 0
+        self.written = None
+
+        if not self.light:
+            # The parent keeps the peak reached so far; this phase measures
+            # its own
+            if tracemalloc.is_tracing():
+                if parent is not None:
+                    parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            self.written = _bytes_written()
+
+        stack.append(self)
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        _local.stack.pop()
+
+        written = None
+        peak = None
+        if not self.light:
+            if self.written is not None:
+                end = _bytes_written()
+                written = end - self.written if end is not None else None
+            peak = self.peak
+            if tracemalloc.is_tracing():
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+
+        parent = self.parent
+        if parent is not None:
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+            if peak is not None:
+                parent.peak = max(parent.peak, peak)
+
+        with _lock:
+            entry = _stats.get(self.path)
+            if entry is None:
+                entry = _stats[self.path] = {
+                    'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'self_wall_s': 0.0, 'self_cpu_s': 0.0,
+                    'peak_bytes': peak, 'bytes_written': written,
+                }
+            else:
+                if peak is not None:
+                    entry['peak_bytes'] = max(entry['peak_bytes'] or 0, peak)
+                if written is not None:
+                    entry['bytes_written'] = (entry['bytes_written'] or 0) + written
+            entry['calls'] += 1
+            entry['wall_s'] += wall
+            entry['cpu_s'] += cpu
+            entry['self_wall_s'] += wall - self.child_wall
+            entry['self_cpu_s'] += cpu - self.child_cpu
+        return False
+
+
+class _Context:
+    # Stands in for a phase of another thread, so that phases entered by a
+    # worker thread are recorded under the phase that started the work
+    __slots__ = ('path', 'child_wall', 'child_cpu', 'peak')
+
+    def __init__(self, path):
+        self.path = path
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.peak = 0
+
+
+def propagate(func):
+    # Wraps func for a worker thread so its phases nest under the current one
+    stack = getattr(_local, 'stack', None)
+    if not _enabled or not stack:
+        return func
+    path = stack[-1].path
+
+    def run(*args, **kwargs):
+        worker_stack = getattr(_local, 'stack', None)
+        if worker_stack is None:
+            worker_stack = _local.stack = []
+        worker_stack.append(_Context(path))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            worker_stack.pop()
+
+    return run
+
+
+def results():
+    # Phases in the order they were first entered
+    with _lock:
+        return [dict(entry, phase=path) for path, entry in _stats.items()]
+
+
+def format_report(entries):
+    lines = [f"{'phase':<40} {'calls':>7} {'wall s':>9} {'self s':>9} {'cpu s':>9} {'peak MB':>9} {'written MB':>11}"]
+    for entry in entries:
+        peak = entry['peak_bytes']
+        peak = f'{peak / 1e6:9.2f}' if peak is not None else f"{'-':>9}"
+        written = entry['bytes_written']
+        written = f'{written / 1e6:11.2f}' if written is not None else f"{'-':>11}"
+        lines.append(
+            f"{entry['phase']:<40} {entry['calls']:>7} {entry['wall_s']:9.4f} {entry['self_wall_s']:9.4f} "
+            f"{entry['cpu_s']:9.4f} {peak} {written}"
+        )
+    return '\n'.join(lines)
+
+
+def write_json(path, entries):
+    with open(path, 'w') as f:
+        json.dump({'pid': os.getpid(), 'phases': entries}, f, indent=2)
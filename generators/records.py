@@ -0,0 +1,264 @@
+import gzip
+import io
+import json
+import os
+
+# zstandard is optional: only .zst data files need it
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Streaming readers and per-table writers for CDS data files.
+#
+# Three input shapes are supported, all yielding (table_name, record) pairs:
+#   - the document generate_json_sample describes, {"<table>": [{...}, ...]},
+#     parsed incrementally so the file never has to fit in memory
+#   - JSON Lines (.jsonl/.ndjson), one {"table": "<table>", "record": {...}}
+#     object per line
+#   - a directory of per-table JSON Lines files, <table>.jsonl, one bare
+#     record per line
+# Any file may be gzip (.gz) or zstd (.zst) compressed.
+
+CHUNK_SIZE = 1 << 20
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+JSONL_SUFFIXES = ('.jsonl', '.ndjson')
+
+_WHITESPACE = ' \t\n\r'
+
+
+def _compression(path):
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return None
+
+
+def _strip_compression(path):
+    return path[:len(path) - len(COMPRESSION_SUFFIXES[_compression(path)])]
+
+
+def open_text(path, mode='r'):
+    # Text file, transparently gzip or zstd compressed depending on the suffix.
+    # Writing and appending use mtime=0 so gzip output is reproducible;
+    # appending adds a gzip member / zstd frame, which readers concatenate.
+    compression = _compression(path)
+    if compression == 'gzip':
+        if mode == 'r':
+            return gzip.open(path, 'rt', encoding='utf-8')
+        return io.TextIOWrapper(gzip.GzipFile(path, mode + 'b', mtime=0), encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError(f"Reading or writing '{path}' requires the zstandard package (pip install zstandard)")
+        return zstandard.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def iter_records(path):
+    if os.path.isdir(path):
+        return _iter_table_files(path)
+    if _strip_compression(path).endswith(JSONL_SUFFIXES):
+        return _iter_jsonl(path)
+    return _iter_json_document(path)
+
+
+def _iter_lines(path):
+    with open_text(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e.msg})") from None
+
+
+def _iter_jsonl(path):
+    for entry in _iter_lines(path):
+        yield entry['table'], entry['record']
+
+
+def _iter_table_files(directory):
+    # Per-table files in name order; the table is the file name without its
+    # suffixes
+    for file_name in sorted(os.listdir(directory)):
+        base = _strip_compression(file_name)
+        if not base.endswith(JSONL_SUFFIXES):
+            continue
+        table_name = os.path.splitext(base)[0]
+        for record in _iter_lines(os.path.join(directory, file_name)):
+            yield table_name, record
+
+
+class _Buffer:
+    # Sliding window over a text file for incremental parsing
+
+    def __init__(self, f):
+        self.f = f
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, or '' at end of file
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in CDS data file")
+        self.pos += 1
+
+    def decode(self, decoder):
+        # Decode one JSON value, reading more of the file until it is complete
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self.fill():
+                    raise
+                continue
+            # A number at the very end of the window may still be cut short
+            if end == len(self.text) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_json_document(path):
+    decoder = json.JSONDecoder()
+    with open_text(path) as f:
+        buffer = _Buffer(f)
+        buffer.expect('{')
+        if buffer.peek() == '}':
+            return
+
+        while True:
+            table_name = buffer.decode(decoder)
+            buffer.expect(':')
+            buffer.expect('[')
+            if buffer.peek() != ']':
+                while True:
+                    yield table_name, buffer.decode(decoder)
+                    if buffer.peek() == ',':
+                        buffer.pos += 1
+                        continue
+                    break
+            buffer.expect(']')
+
+            if buffer.peek() == ',':
+                buffer.pos += 1
+                continue
+            buffer.expect('}')
+            return
+
+
+class WriterPool:
+    # Per-table output files for a record stream that interleaves tables.
+    # At most max_open files are kept open; the least recently used one is
+    # closed and later reopened in append mode, so schemas with tens of
+    # thousands of tables do not run out of file descriptors.
+
+    def __init__(self, open_file, max_open=256):
+        # open_file(table_name, new) returns a file object; new is True the
+        # first time a table is opened, so the caller can write a header
+        self.open_file = open_file
+        self.max_open = max_open
+        self.files = {}
+        self.opened = set()
+
+    def get(self, table_name):
+        f = self.files.pop(table_name, None)
+        if f is None:
+            if len(self.files) >= self.max_open:
+                # Dicts keep insertion order: the first entry is the least
+                # recently used one
+                oldest = next(iter(self.files))
+                self.files.pop(oldest).close()
+            f = self.open_file(table_name, table_name not in self.opened)
+            self.opened.add(table_name)
+        self.files[table_name] = f
+        return f
+
+    def release(self, table_name):
+        # Closes the table's file for good: the next get() opens it as new
+        f = self.files.pop(table_name, None)
+        if f is not None:
+            f.close()
+        self.opened.discard(table_name)
+
+    def close_all(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+
+
+class NDJSONWriter:
+    # Writes records as JSON Lines, one record at a time. layout='tagged'
+    # writes a single stream of {"table": ..., "record": ...} lines to path;
+    # layout='per-table' writes bare records to path/<table>.jsonl. Either
+    # output reads back with iter_records().
+
+    LAYOUTS = ('tagged', 'per-table')
+
+    def __init__(self, path, layout='tagged', compression=None, max_open=256):
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"Unknown NDJSON layout '{layout}' (expected one of: {', '.join(self.LAYOUTS)})")
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression '{compression}' (expected gzip or zstd)")
+        self.layout = layout
+        self.suffix = '.jsonl' + COMPRESSION_SUFFIXES[compression]
+        self.counts = {}
+
+        if layout == 'tagged':
+            self.stream = open_text(path + self.suffix, 'w')
+            self.pool = None
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.stream = None
+            self.pool = WriterPool(
+                lambda table_name, new: open_text(os.path.join(path, table_name + self.suffix), 'w' if new else 'a'),
+                max_open,
+            )
+
+    def open_table(self, table_name):
+        # Makes sure the table appears in the output even without records
+        self.counts.setdefault(table_name, 0)
+        if self.pool is not None:
+            self.pool.get(table_name)
+
+    def write(self, table_name, record):
+        self.counts[table_name] = self.counts.get(table_name, 0) + 1
+        if self.pool is None:
+            self.stream.write(json.dumps({'table': table_name, 'record': record}) + '\n')
+        else:
+            self.pool.get(table_name).write(json.dumps(record) + '\n')
+
+    def close(self):
+        if self.pool is None:
+            self.stream.close()
+        else:
+            self.pool.close_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
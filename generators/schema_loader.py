@@ -0,0 +1,180 @@
+import gc
+import hashlib
+import json
+import mmap
+import os
+import pickle
+from contextlib import contextmanager
+from typing import Any, List, Optional
+from .schema_model import compile_schema
+
+# Pluggable schema loading.
+#
+# Backends, fastest first: msgspec decodes straight into typed structs (and
+# skips any part of the document the structs do not name, such as embedded
+# enumerations), orjson decodes into dicts much faster than json, and json is
+# the always-available fallback. The file can be memory-mapped so the raw
+# bytes are never copied into a Python object.
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ('msgspec', 'orjson', 'json')
+
+# Compiled schemas are cached in this file between runs, keyed by the hash of
+# the schema file and of the code that builds the model
+SCHEMA_CACHE_PATH = '.cds_schema_cache.pickle'
+SCHEMA_CACHE_VERSION = 1
+
+
+if msgspec is not None:
+    class _RawStruct(msgspec.Struct):
+        # compile_schema() reads the raw schema with item access; structs
+        # answer it with their attributes
+
+        def __getitem__(self, key):
+            return getattr(self, key)
+
+        def get(self, key, default=None):
+            value = getattr(self, key, default)
+            return default if value is None else value
+
+    class RawProperty(_RawStruct):
+        type: str
+        value: Any = None
+
+    class RawRelationship(_RawStruct):
+        name: Optional[str] = None
+        table_uuid: Optional[str] = None
+        column_uuid: Optional[str] = None
+        relationship_type_uuid: Optional[str] = None
+
+    class RawColumn(_RawStruct):
+        uuid: str
+        name: str
+        type: Optional[str] = None
+        properties: Optional[List[RawProperty]] = None
+        relationship: Optional[List[RawRelationship]] = None
+
+    class RawTable(_RawStruct):
+        uuid: str
+        name: str
+        columns: List[RawColumn] = []
+
+    class RawLookup(_RawStruct):
+        uuid: str
+        name: str
+
+    class RawSchema(_RawStruct):
+        tables: List[RawTable] = []
+        column_types: List[RawLookup] = []
+        property_types: List[RawLookup] = []
+        relationship_types: List[RawLookup] = []
+
+    _decoder = msgspec.json.Decoder(RawSchema)
+
+
+def available_backends():
+    modules = {'msgspec': msgspec, 'orjson': orjson, 'json': json}
+    return [name for name in BACKENDS if modules[name] is not None]
+
+
+def _decode(data, backend):
+    if backend == 'msgspec':
+        return _decoder.decode(data)
+    if backend == 'orjson':
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+def load_raw(path, backend=None, use_mmap=True):
+    # Raw (uncompiled) schema from a file: dicts, or structs with msgspec.
+    # backend=None picks the fastest one installed.
+    if backend is None:
+        backend = available_backends()[0]
+    elif backend not in available_backends():
+        raise ImportError(f"Schema backend '{backend}' is not installed")
+
+    with open(path, 'rb') as f:
+        # Empty files cannot be mapped; they fail to decode either way
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    return _decode(view, backend)
+        return _decode(f.read(), backend)
+
+
+def load_schema(path, backend=None, use_mmap=True):
+    # Compiled schema, ready for the generators. Invalid documents raise
+    # ValueError whatever the backend.
+    return compile_schema(load_raw(path, backend, use_mmap))
+
+
+def _file_hash(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _tool_version():
+    # Changing how the model is built invalidates every cached schema
+    hasher = hashlib.sha256(str(SCHEMA_CACHE_VERSION).encode('utf-8'))
+    for module_file in (__file__, os.path.join(os.path.dirname(__file__), 'schema_model.py')):
+        with open(module_file, 'rb') as f:
+            hasher.update(f.read())
+    return hasher.hexdigest()
+
+
+@contextmanager
+def _gc_paused():
+    # Unpickling creates hundreds of thousands of objects and nothing else;
+    # the cyclic collector would rescan them over and over meanwhile
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def load_schema_cached(path, cache_path=SCHEMA_CACHE_PATH, backend=None, use_mmap=True):
+    # Compiled schema, from the cache file when it was built from the same
+    # schema file by the same code, otherwise loaded and cached again. The
+    # key is pickled ahead of the schema so a stale cache is rejected
+    # without unpickling the model.
+    key = {'schema': _file_hash(path), 'tool': _tool_version()}
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                if pickle.load(f) == key:
+                    with _gc_paused():
+                        return pickle.load(f)
+        except Exception:
+            # Unreadable or incompatible cache: rebuild it
+            pass
+
+    schema = load_schema(path, backend, use_mmap)
+
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(schema, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Caching is best effort, e.g. on a read-only working directory
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return schema
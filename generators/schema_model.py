@@ -0,0 +1,148 @@
+# Compiled, UUID-indexed view of a CDS schema.
+#
+# The raw schema is a dict of lists that reference each other by UUID. Every
+# generator used to resolve those references with linear scans, which is
+# quadratic on large schemas. compile_schema() resolves everything once so
+# generators can follow plain attribute references instead.
+
+
+class Property:
+    __slots__ = ('type_uuid', 'name', 'value')
+
+    def __init__(self, type_uuid, name, value):
+        self.type_uuid = type_uuid
+        self.name = name
+        self.value = value
+
+    def __reduce__(self):
+        return (Property, (self.type_uuid, self.name, self.value))
+
+
+class Relationship:
+    __slots__ = ('name', 'table_uuid', 'column_uuid', 'type_uuid', 'type_name', 'table', 'column')
+
+    def __init__(self, name, table_uuid, column_uuid, type_uuid):
+        self.name = name
+        self.table_uuid = table_uuid
+        self.column_uuid = column_uuid
+        self.type_uuid = type_uuid
+        # Resolved by compile_schema(); None when the reference is dangling
+        self.type_name = None
+        self.table = None
+        self.column = None
+
+    # Pickled without the resolved references, so pickling never recurses
+    # from table to table along relationships; Schema re-resolves them
+    def __reduce__(self):
+        return (Relationship, (self.name, self.table_uuid, self.column_uuid, self.type_uuid))
+
+
+class Column:
+    __slots__ = ('uuid', 'name', 'type_uuid', 'type_name', 'properties', 'relationships', 'table')
+
+    def __init__(self, uuid, name, type_uuid, type_name, properties, relationships, table):
+        self.uuid = uuid
+        self.name = name
+        self.type_uuid = type_uuid
+        self.type_name = type_name
+        self.properties = properties
+        self.relationships = relationships
+        self.table = table
+
+    def __reduce__(self):
+        return (Column, (self.uuid, self.name, self.type_uuid, self.type_name,
+                         self.properties, self.relationships, self.table))
+
+
+class Table:
+    __slots__ = ('uuid', 'name', 'columns', 'columns_by_uuid')
+
+    def __init__(self, uuid, name):
+        self.uuid = uuid
+        self.name = name
+        self.columns = []
+        self.columns_by_uuid = {}
+
+    # Pickles stay flat: constructor arguments plus the column list, with the
+    # UUID index rebuilt on load
+    def __reduce__(self):
+        return (Table, (self.uuid, self.name), self.columns)
+
+    def __setstate__(self, columns):
+        self.columns = columns
+        self.columns_by_uuid = {column.uuid: column for column in columns}
+
+
+class Schema:
+    __slots__ = ('tables', 'tables_by_uuid', 'column_types', 'property_types', 'relationship_types')
+
+    def __init__(self, column_types, property_types, relationship_types):
+        self.tables = []
+        self.tables_by_uuid = {}
+        # UUID -> name mappings for the lookup tables
+        self.column_types = column_types
+        self.property_types = property_types
+        self.relationship_types = relationship_types
+
+    def __reduce__(self):
+        return (Schema, (self.column_types, self.property_types, self.relationship_types), self.tables)
+
+    def __setstate__(self, tables):
+        self.tables = tables
+        self.tables_by_uuid = {table.uuid: table for table in tables}
+        resolve_relationships(self)
+
+
+def compile_schema(raw):
+    # Already compiled, nothing to do
+    if isinstance(raw, Schema):
+        return raw
+
+    schema = Schema(
+        {ct['uuid']: ct['name'] for ct in raw.get('column_types', [])},
+        {pt['uuid']: pt['name'] for pt in raw.get('property_types', [])},
+        {rt['uuid']: rt['name'] for rt in raw.get('relationship_types', [])},
+    )
+
+    # First pass: build tables and columns, keyed by UUID
+    for raw_table in raw.get('tables', []):
+        table = Table(raw_table['uuid'], raw_table['name'])
+
+        for raw_column in raw_table['columns']:
+            properties = [
+                Property(prop['type'], schema.property_types.get(prop['type']), prop['value'])
+                for prop in raw_column.get('properties') or []
+            ]
+            relationships = [
+                Relationship(rel.get('name'), rel.get('table_uuid'), rel.get('column_uuid'), rel.get('relationship_type_uuid'))
+                for rel in raw_column.get('relationship') or []
+            ]
+            column = Column(
+                raw_column['uuid'],
+                raw_column['name'],
+                raw_column['type'],
+                schema.column_types.get(raw_column['type']),
+                properties,
+                relationships,
+                table,
+            )
+            table.columns.append(column)
+            table.columns_by_uuid[column.uuid] = column
+
+        schema.tables.append(table)
+        schema.tables_by_uuid[table.uuid] = table
+
+    # Second pass: resolve relationship references now that every table exists
+    resolve_relationships(schema)
+
+    return schema
+
+
+def resolve_relationships(schema):
+    for table in schema.tables:
+        for column in table.columns:
+            for rel in column.relationships:
+                rel.type_name = schema.relationship_types.get(rel.type_uuid)
+                rel.table = schema.tables_by_uuid.get(rel.table_uuid)
+                if rel.table is not None:
+                    rel.column = rel.table.columns_by_uuid.get(rel.column_uuid)
@@ -0,0 +1,489 @@
+import datetime
+import hashlib
+from collections import deque
+from contextlib import contextmanager
+
+# Helpers shared by the SQL generators.
+#
+# Every generator describes its tables as dicts with at least a 'name' and a
+# 'foreign_keys' list of (column, referenced_table, referenced_column) tuples,
+# and renders them in its own dialect. Ordering works on that description,
+# not on the rendered DDL.
+
+# Where CREATE INDEX statements go: after each table, a separate post-load
+# script, or nowhere
+INDEX_MODES = ('inline', 'separate', 'none')
+
+# Range partitioning on a DATE/DATETIME column, one partition per day or
+# month, and the number of partitions created up front by default
+PARTITION_INTERVALS = ('daily', 'monthly')
+PARTITION_PERIODS = {'daily': 30, 'monthly': 12}
+PARTITION_TYPES = ('DATE', 'DATETIME')
+
+
+def order_tables(tables):
+    # Kahn's algorithm over the foreign key graph. Tables come out with every
+    # referenced table before the tables that reference it; ties keep schema
+    # order. Returns the ordered tables and the set of (table, referenced_table)
+    # edges that had to be deferred to break foreign key cycles.
+
+    # Tables sharing a name are kept together and ordered as one node
+    index = {}
+    for table in tables:
+        index.setdefault(table['name'], []).append(table)
+
+    # remaining[name] holds the referenced tables not yet emitted
+    remaining = {name: set() for name in index}
+    dependents = {name: [] for name in index}
+    for table in tables:
+        name = table['name']
+        for _, referenced_table, _ in table['foreign_keys']:
+            # Self references and references outside the schema never block
+            if referenced_table != name and referenced_table in index:
+                if referenced_table not in remaining[name]:
+                    remaining[name].add(referenced_table)
+                    dependents[referenced_table].append(name)
+
+    ready = deque(name for name in index if not remaining[name])
+    emitted = set()
+    ordered = []
+    deferred = set()
+    next_unemitted = 0
+    names = list(index)
+
+    while len(emitted) < len(index):
+        if not ready:
+            # Only cycles are left: find one and break it by deferring the
+            # edge that closes it
+            while names[next_unemitted] in emitted:
+                next_unemitted += 1
+            table, referenced = _find_cycle_edge(names[next_unemitted], remaining)
+            remaining[table].discard(referenced)
+            deferred.add((table, referenced))
+            if not remaining[table]:
+                ready.append(table)
+            continue
+
+        name = ready.popleft()
+        emitted.add(name)
+        ordered.extend(index[name])
+        for dependent in dependents[name]:
+            if name in remaining[dependent]:
+                remaining[dependent].discard(name)
+                if not remaining[dependent]:
+                    ready.append(dependent)
+
+    return ordered, deferred
+
+
+class StatementStream:
+    # Streaming counterpart of order_tables(). Table definitions are added one
+    # at a time and handed to emit(table_def, deferred_references) as soon as
+    # every table they reference has been emitted, so only the tables still
+    # waiting on a dependency are held in memory. Whatever is left when the
+    # stream is closed waits on a cycle and is ordered by order_tables().
+
+    def __init__(self, emit, known_tables):
+        self.emit = emit
+        # Names of every table that will be added; references to anything
+        # else never block
+        self.known_tables = known_tables
+        self.emitted = set()
+        self.waiting = {}
+        self.pending = {}
+
+    def add(self, table_def):
+        name = table_def['name']
+        unmet = {
+            referenced_table
+            for _, referenced_table, _ in table_def['foreign_keys']
+            if referenced_table != name
+            and referenced_table in self.known_tables
+            and referenced_table not in self.emitted
+        }
+        if not unmet:
+            self._emit_ready(table_def)
+            return
+
+        entry = (table_def, unmet)
+        self.pending[id(table_def)] = entry
+        for referenced_table in unmet:
+            self.waiting.setdefault(referenced_table, []).append(entry)
+
+    def _emit_ready(self, table_def):
+        ready = deque([table_def])
+        while ready:
+            table_def = ready.popleft()
+            self.emit(table_def, frozenset())
+            name = table_def['name']
+            self.emitted.add(name)
+
+            # Release the tables that were only waiting on this one
+            for waiting_def, unmet in self.waiting.pop(name, []):
+                unmet.discard(name)
+                if not unmet and id(waiting_def) in self.pending:
+                    del self.pending[id(waiting_def)]
+                    ready.append(waiting_def)
+
+    def close(self):
+        leftovers = [table_def for table_def, _ in self.pending.values()]
+        self.pending.clear()
+        self.waiting.clear()
+
+        ordered, deferred = order_tables(leftovers)
+        deferred_by_table = {}
+        for table, referenced_table in deferred:
+            deferred_by_table.setdefault(table, set()).add(referenced_table)
+
+        for table_def in ordered:
+            self.emit(table_def, frozenset(deferred_by_table.get(table_def['name'], ())))
+            self.emitted.add(table_def['name'])
+
+
+@contextmanager
+def open_sink(output):
+    # Output can be a path or any object with a write() method (e.g. sys.stdout);
+    # file-like sinks are left open for the caller
+    if hasattr(output, 'write'):
+        yield output
+    else:
+        with open(output, 'w') as f:
+            yield f
+
+
+def _find_cycle_edge(start, remaining):
+    # Walk unmet dependencies until a table repeats; the step that reaches the
+    # repeated table closes a cycle
+    seen = set()
+    node = start
+    while True:
+        seen.add(node)
+        referenced = min(remaining[node])
+        if referenced in seen:
+            return node, referenced
+        node = referenced
+
+
+def is_true(value):
+    # Schema property values come as booleans or as 'true'/'false' strings
+    return value is True or (isinstance(value, str) and value.strip().lower() == 'true')
+
+
+def index_defs(table_def, max_length=63, skip_types=()):
+    # Indexes for one table as (name, columns, unique) tuples:
+    #   - one per column marked 'indexed' or 'unique' in the schema
+    #   - a composite (owner, value) index on intermediary tables
+    #   - one per foreign key column not already leading another index
+    # Columns whose type is in skip_types (e.g. MySQL BLOB) are not indexed.
+    # Unique indexes of a partitioned table also cover the partition column.
+    table_name = table_def['name']
+    column_types = dict(table_def.get('data_columns', ()))
+    partition_column = table_def['partition'][0] if 'partition' in table_def else None
+    indexes = []
+    covered = set()
+
+    def add(columns, unique=False):
+        if any(column_types.get(column) in skip_types for column in columns):
+            return
+        if unique and partition_column is not None and partition_column not in columns:
+            columns = columns + [partition_column]
+        if tuple(columns) in covered:
+            return
+        covered.add(tuple(columns))
+        covered.add((columns[0],))
+        prefix = 'uq' if unique else 'idx'
+        indexes.append((constraint_name(prefix, table_name, '_'.join(columns), max_length), columns, unique))
+
+    for column_name, unique in table_def.get('lookup_columns', ()):
+        add([column_name], unique)
+
+    if 'array_source' in table_def:
+        add([name for name, _ in table_def['data_columns']])
+
+    # A single-column primary key is already indexed
+    if len(table_def['primary_keys']) == 1:
+        covered.add((table_def['primary_keys'][0],))
+    for column_name, _, _ in table_def['foreign_keys']:
+        if (column_name,) not in covered:
+            add([column_name])
+
+    return indexes
+
+
+def constraint_name(prefix, table, column, max_length=63):
+    # Deterministic constraint/index name that fits the identifier limit
+    # (63 for PostgreSQL, 64 for MySQL)
+    name = f'{prefix}_{table}_{column}'
+    if len(name) <= max_length:
+        return name
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+    return f'{name[:max_length - 9]}_{digest}'
+
+
+def partition_plan(schema, partitions=None, start=None, periods=None):
+    # {table name: (column name, interval, bounds)} for the tables to
+    # partition. A column opts in with a 'partition' property ('daily',
+    # 'monthly', or true for monthly); the partitions mapping (table name ->
+    # (column name, interval)) adds tables or overrides the schema. bounds
+    # lists the initial partitions from the period containing start (default:
+    # today). Raises ValueError for anything that cannot be partitioned.
+    requested = {}
+    for table in schema.tables:
+        for column in table.columns:
+            for prop in column.properties:
+                if prop.name != 'partition' or prop.value in (None, False):
+                    continue
+                if is_true(prop.value):
+                    requested[table.name] = (column.name, 'monthly')
+                elif str(prop.value).strip().lower() != 'false':
+                    requested[table.name] = (column.name, str(prop.value).strip().lower())
+    requested.update(partitions or {})
+
+    tables = {table.name: table for table in schema.tables}
+    start = start or datetime.date.today()
+    plan = {}
+    for table_name, (column_name, interval) in requested.items():
+        table = tables.get(table_name)
+        if table is None:
+            raise ValueError(f"Cannot partition '{table_name}': no such table")
+        column = next((column for column in table.columns if column.name == column_name), None)
+        if column is None or column.type_name not in PARTITION_TYPES:
+            raise ValueError(f"Cannot partition '{table_name}' on '{column_name}': "
+                             f"not a {' or '.join(PARTITION_TYPES)} column")
+        if interval not in PARTITION_INTERVALS:
+            raise ValueError(f"Unknown partition interval '{interval}' "
+                             f"(expected one of: {', '.join(PARTITION_INTERVALS)})")
+        count = periods or PARTITION_PERIODS[interval]
+        plan[table_name] = (column_name, interval, partition_bounds(interval, start, count))
+    return plan
+
+
+def partition_fingerprint(plan, start=None):
+    # The part of a partition plan that identifies the generated DDL for the
+    # incremental cache: tables, columns, intervals and partition counts, and
+    # the start date only when it was given. The default start moves with the
+    # calendar and would otherwise invalidate the cached DDL every day; an
+    # --incremental run keeps the partitions of the run that wrote it.
+    key = sorted((table_name, column_name, interval, len(bounds))
+                 for table_name, (column_name, interval, bounds) in plan.items())
+    if start is not None:
+        key.append(start.isoformat())
+    return repr(key)
+
+
+def partition_bounds(interval, start, periods):
+    # (suffix, lower, upper) for periods consecutive partitions; lower is
+    # inclusive, upper exclusive. Suffixes are YYYYMMDD (daily) or YYYYMM.
+    lower = start.replace(day=1) if interval == 'monthly' else start
+    bounds = []
+    for _ in range(periods):
+        if interval == 'monthly':
+            upper = (lower.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+            suffix = lower.strftime('%Y%m')
+        else:
+            upper = lower + datetime.timedelta(days=1)
+            suffix = lower.strftime('%Y%m%d')
+        bounds.append((suffix, lower, upper))
+        lower = upper
+    return bounds
+
+
+def partition_table_defs(table_defs, plan, referenced_keys=True, partitioned_keys=True):
+    # Adapts table definitions to the partition plan: a partitioned table
+    # gets its 'partition' entry and the partition column added to its primary
+    # key, as both dialects require. Foreign keys the dialect cannot enforce
+    # are listed in 'unenforced_keys': with referenced_keys=False the ones
+    # referencing a partitioned table, with partitioned_keys=False the ones of
+    # a partitioned table. They still order the tables and get their index.
+    for table_def in table_defs:
+        partition = plan.get(table_def['name'])
+        if partition is not None:
+            table_def = dict(table_def, partition=partition)
+            if table_def['primary_keys'] and partition[0] not in table_def['primary_keys']:
+                table_def['primary_keys'] = table_def['primary_keys'] + [partition[0]]
+        unenforced = [
+            foreign_key for foreign_key in table_def['foreign_keys']
+            if (not referenced_keys and foreign_key[1] in plan)
+            or (not partitioned_keys and partition is not None)
+        ]
+        if unenforced:
+            table_def = dict(table_def, unenforced_keys=unenforced)
+        yield table_def
+
+
+def iter_table_defs(schema, get_sql_type, quote, value_suffix='_ID'):
+    # Yields one definition per table, each followed by the intermediary
+    # tables for its Array columns. Column definitions are rendered with the
+    # dialect's get_sql_type() and quote(); value_suffix is appended to the
+    # value column of intermediary tables that reference another table.
+    for table in schema.tables:
+        table_name = table.name
+        columns_sql = []
+        data_columns = []
+        column_uuids = []
+        lookup_columns = []
+        primary_keys = []
+        foreign_keys = []
+
+        # Keep track of intermediary tables for Array types
+        intermediary_tables = []
+
+        # Iterate over columns
+        for column in table.columns:
+            column_name = column.name
+            column_type_name = column.type_name
+
+            # Special handling for Array(VARCHAR(255))
+            if column_type_name == 'Array(VARCHAR(255))':
+                # Create intermediary table instead of column
+                if column.relationships:
+                    relationship = column.relationships[0]
+                    intermediary_table_name = relationship.name
+
+                    # Get the related table name and column name
+                    related_table = relationship.table
+                    if related_table:
+                        related_table_name = related_table.name
+                        related_column = relationship.column
+                        if related_column:
+                            related_column_name = related_column.name
+                        else:
+                            related_column_name = 'UUID'  # Default to 'UUID' if not found
+                    else:
+                        related_table_name = None
+                        related_column_name = 'UUID'
+                else:
+                    # No relationship info
+                    intermediary_table_name = f"{table_name}_{column_name}"
+                    related_table_name = None
+                    related_column_name = column_name
+
+                intermediary_tables.append({
+                    'name': intermediary_table_name,
+                    'primary_table': table_name,
+                    'primary_column': 'UUID',  # Assuming 'UUID' is the primary key
+                    'foreign_table': related_table_name,
+                    'foreign_column': related_column_name,
+                    'column_name': column_name,
+                    'column_uuid': column.uuid,
+                })
+                continue  # Skip adding this column to the main table
+            else:
+                sql_type = get_sql_type(column_type_name)
+
+            column_def = f'    {quote(column_name)} {sql_type}'
+
+            # Handle properties (e.g., nullable, primary key)
+            if column.properties:
+                for prop in column.properties:
+                    prop_name = prop.name
+                    prop_value = prop.value
+
+                    if prop_name == 'nullable' and not prop_value:
+                        column_def += ' NOT NULL'
+                    if prop_name == 'PrimaryKey' and prop_value == 'true':
+                        primary_keys.append(column_name)
+                    if prop_name in ('indexed', 'unique') and is_true(prop_value):
+                        lookup_columns.append((column_name, prop_name == 'unique'))
+
+            columns_sql.append(column_def)
+            data_columns.append((column_name, sql_type))
+            column_uuids.append(column.uuid)
+
+            # Handle relationships for non-array types (if needed)
+            if column.relationships:
+                for rel in column.relationships:
+                    related_table_name = rel.table.name if rel.table else None
+                    related_column_name = rel.column.name if rel.column else None
+                    if related_table_name and related_column_name:
+                        foreign_keys.append((column_name, related_table_name, related_column_name))
+
+        yield {
+            'name': table_name,
+            'columns': columns_sql,
+            'primary_keys': primary_keys,
+            'foreign_keys': foreign_keys,
+            # Plain column names and SQL types, used by the data exports
+            'data_columns': data_columns,
+            # Columns marked 'indexed' or 'unique' in the schema
+            'lookup_columns': lookup_columns,
+            # Schema UUIDs of the table and of each data column, which the
+            # migration diff matches on
+            'uuid': table.uuid,
+            'column_uuids': column_uuids,
+        }
+
+        # Create intermediary tables for Array types
+        for inter_table in intermediary_tables:
+            yield intermediary_table_def(inter_table, get_sql_type('VARCHAR(255)'), quote, value_suffix)
+
+
+def intermediary_table_def(inter_table, id_type, quote, value_suffix='_ID'):
+    table_name = inter_table['name']
+    primary_table = inter_table['primary_table']
+    primary_column = inter_table['primary_column']
+    foreign_table = inter_table['foreign_table']
+    foreign_column = inter_table['foreign_column']
+    column_name = inter_table['column_name']
+
+    columns = []
+    foreign_keys = []
+
+    # Primary table foreign key
+    columns.append(f'    {quote(f"{primary_table}_ID")} {id_type} NOT NULL')
+    foreign_keys.append((f'{primary_table}_ID', primary_table, primary_column))
+
+    value_column = f'{column_name}{value_suffix}' if foreign_table else foreign_column
+    if foreign_table:
+        # Foreign table foreign key
+        foreign_keys.append((value_column, foreign_table, foreign_column))
+    # Without a foreign table the values themselves are stored
+    columns.append(f'    {quote(value_column)} {id_type} NOT NULL')
+
+    return {
+        'name': table_name,
+        'columns': columns,
+        'primary_keys': [],
+        'foreign_keys': foreign_keys,
+        # One row per element of the Array column it replaces
+        'data_columns': [(f'{primary_table}_ID', id_type), (value_column, id_type)],
+        'array_source': (primary_table, column_name),
+        # Keyed on the Array column, so renaming either table keeps its identity
+        'uuid': inter_table['column_uuid'],
+        'column_uuids': [f"{inter_table['column_uuid']}:owner", f"{inter_table['column_uuid']}:value"],
+    }
+
+
+def iter_table_rows(records, table_defs):
+    # Splits (table_name, record) pairs into the rows of the data exports:
+    # (table_name, values) in data_columns order, followed by one
+    # (intermediary table, [owner, value]) row per element of each Array
+    # column. Records of tables not in table_defs come out as
+    # (table_name, None).
+    data_columns = {
+        table_def['name']: [name for name, _ in table_def['data_columns']]
+        for table_def in table_defs
+        if 'array_source' not in table_def
+    }
+    array_plans = {}
+    for table_def in table_defs:
+        if 'array_source' in table_def:
+            primary_table, column_name = table_def['array_source']
+            array_plans.setdefault(primary_table, []).append((column_name, table_def['name']))
+
+    for table_name, record in records:
+        columns = data_columns.get(table_name)
+        if columns is None:
+            yield table_name, None
+            continue
+        yield table_name, [record.get(name) for name in columns]
+
+        for column_name, inter_name in array_plans.get(table_name, ()):
+            values = record.get(column_name)
+            if not values:
+                continue
+            if not isinstance(values, list):
+                values = [values]
+            owner = record.get('UUID')
+            for value in values:
+                yield inter_name, [owner, value]
@@ -0,0 +1,236 @@
+import os
+from .sql_common import index_defs, order_tables
+
+# Schema migrations for the SQL generators.
+#
+# diff_table_defs() compares the table definitions of two versions of a
+# schema. Tables and columns are matched on their UUIDs, so a renamed table
+# or column is renamed in place instead of being dropped and reloaded. The
+# changes come out as operation tuples that each dialect renders into the
+# step they belong to, so cheap metadata changes never wait on the expensive
+# ones and each step can be scheduled on its own:
+#   expand    dropped foreign keys, renames, new tables and nullable columns
+#   indexes   index builds, online where the database supports it
+#   backfill  NULLs of the columns becoming NOT NULL, in batches
+#   enforce   NOT NULL, type changes, primary and foreign keys
+#   contract  dropped indexes, columns and tables, once nothing uses them
+#
+# Operations:
+#   ('drop_foreign_key', table, column, referenced_table)
+#   ('rename_table', old_name, new_name)
+#   ('rename_column', table, old_name, new_name)
+#   ('rename_index', table, old_name, new_name)
+#   ('create_table', table_def)          without its foreign keys or indexes
+#   ('add_column', table, column_sql)    always nullable
+#   ('alter_column', table, column, old_type, new_type, old_required, new_required, column_sql)
+#   ('backfill', table, column, sql_type)
+#   ('set_primary_key', table, old_columns, new_columns)
+#   ('add_foreign_key', table, column, referenced_table, referenced_column)
+#   ('create_index', table, name, columns, unique)
+#   ('drop_index', table, name, early)
+#   ('drop_column', table, column, early)
+#   ('drop_table', table, early)
+# Drops are early when a new table, column or index takes the dropped name:
+# they then run in the expand step, before the object replacing them.
+
+MIGRATION_STEPS = ('expand', 'indexes', 'backfill', 'enforce', 'contract')
+
+# What each step script does, written at its top
+STEP_NOTES = {
+    'expand': 'Metadata-only changes; safe to run while the application is live.',
+    'indexes': 'Index builds; long-running on large tables but non-blocking where supported.',
+    'backfill': 'Fills NULLs of the columns becoming NOT NULL in batches; review the fill values first.',
+    'enforce': 'NOT NULL, type, primary and foreign key changes; these scan or rewrite tables.',
+    'contract': 'Drops; run once nothing reads the dropped indexes, columns and tables.',
+}
+
+# Rows updated per backfill statement
+BACKFILL_BATCH_SIZE = 10000
+
+NOT_NULL = ' NOT NULL'
+
+
+def column_specs(table_def):
+    # {column uuid: (name, sql_type, column_sql, required)}, column_sql being
+    # the rendered column definition without NOT NULL
+    specs = {}
+    for uuid, (name, sql_type), column_sql in zip(table_def['column_uuids'], table_def['data_columns'],
+                                                  table_def['columns']):
+        column_sql = column_sql.strip()
+        required = column_sql.endswith(NOT_NULL)
+        if required:
+            column_sql = column_sql[:-len(NOT_NULL)]
+        specs[uuid] = (name, sql_type, column_sql, required)
+    return specs
+
+
+def foreign_key_specs(table_def, defs_by_name):
+    # {(column uuid, referenced table uuid, referenced column uuid): foreign
+    # key}; references outside the schema are keyed on their names
+    uuids = dict(zip((name for name, _ in table_def['data_columns']), table_def['column_uuids']))
+    specs = {}
+    for foreign_key in table_def['foreign_keys']:
+        column_name, referenced_table, referenced_column = foreign_key
+        referenced_def = defs_by_name.get(referenced_table)
+        if referenced_def is None:
+            referenced = (referenced_table, referenced_column)
+        else:
+            referenced_uuids = dict(zip((name for name, _ in referenced_def['data_columns']),
+                                        referenced_def['column_uuids']))
+            referenced = (referenced_def['uuid'], referenced_uuids.get(referenced_column, referenced_column))
+        specs[(uuids.get(column_name, column_name),) + referenced] = foreign_key
+    return specs
+
+
+def index_specs(table_def, index_kwargs):
+    # {(column uuids, unique): (name, columns)}
+    uuids = dict(zip((name for name, _ in table_def['data_columns']), table_def['column_uuids']))
+    return {
+        (tuple(uuids.get(column, column) for column in columns), unique): (name, columns)
+        for name, columns, unique in index_defs(table_def, **index_kwargs)
+    }
+
+
+def primary_key_uuids(table_def):
+    uuids = dict(zip((name for name, _ in table_def['data_columns']), table_def['column_uuids']))
+    return [uuids.get(column, column) for column in table_def['primary_keys']]
+
+
+def diff_table_defs(old_defs, new_defs, index_kwargs=None):
+    # Operations turning the tables of old_defs into those of new_defs, in the
+    # order they run within each step
+    index_kwargs = index_kwargs or {}
+    old_defs = list(old_defs)
+    new_defs = list(new_defs)
+    old_by_uuid = {table_def['uuid']: table_def for table_def in old_defs}
+    new_by_uuid = {table_def['uuid']: table_def for table_def in new_defs}
+    old_by_name = {table_def['name']: table_def for table_def in old_defs}
+    new_by_name = {table_def['name']: table_def for table_def in new_defs}
+
+    kept = [(old_by_uuid[table_def['uuid']], table_def) for table_def in new_defs
+            if table_def['uuid'] in old_by_uuid]
+    created = [table_def for table_def in new_defs if table_def['uuid'] not in old_by_uuid]
+    dropped = [table_def for table_def in old_defs if table_def['uuid'] not in new_by_uuid]
+
+    drop_foreign_keys = []
+    early_drops = []
+    renames = []
+    additions = []
+    enforcement = []
+    foreign_keys = []
+    indexes = []
+    dropped_indexes = []
+    dropped_columns = []
+    dropped_tables = []
+
+    # Tables: a dropped table whose name is taken by a new or renamed table
+    # goes early
+    taken_names = {table_def['name'] for table_def in new_defs}
+    for old_def, new_def in kept:
+        if old_def['name'] != new_def['name']:
+            renames.append(('rename_table', old_def['name'], new_def['name']))
+    for table_def in created:
+        additions.append(('create_table', dict(table_def, foreign_keys=[])))
+        for column_name, referenced_table, referenced_column in table_def['foreign_keys']:
+            foreign_keys.append(('add_foreign_key', table_def['name'], column_name, referenced_table, referenced_column))
+        for (_, unique), (name, columns) in index_specs(table_def, index_kwargs).items():
+            indexes.append(('create_index', table_def['name'], name, columns, unique))
+    # Referencing tables are dropped before the tables they reference
+    for table_def in reversed(order_tables(dropped)[0]):
+        early = table_def['name'] in taken_names
+        (early_drops if early else dropped_tables).append(('drop_table', table_def['name'], early))
+
+    for old_def, new_def in kept:
+        old_table = old_def['name']
+        table = new_def['name']
+
+        # Foreign keys that go away are dropped first, under the old names
+        old_foreign_keys = foreign_key_specs(old_def, old_by_name)
+        new_foreign_keys = foreign_key_specs(new_def, new_by_name)
+        for key, (column_name, referenced_table, _) in old_foreign_keys.items():
+            if key not in new_foreign_keys:
+                drop_foreign_keys.append(('drop_foreign_key', old_table, column_name, referenced_table))
+
+        # Columns
+        old_columns = column_specs(old_def)
+        new_columns = column_specs(new_def)
+        taken_columns = {name for name, _, _, _ in new_columns.values()}
+        for uuid, (old_name, _, _, _) in old_columns.items():
+            if uuid in new_columns:
+                continue
+            if old_name in taken_columns:
+                early_drops.append(('drop_column', old_table, old_name, True))
+            else:
+                dropped_columns.append(('drop_column', table, old_name, False))
+        for uuid, (name, sql_type, column_sql, required) in new_columns.items():
+            if uuid not in old_columns:
+                # Added nullable, then filled and constrained in later steps
+                additions.append(('add_column', table, column_sql))
+                if required:
+                    enforcement.append(('backfill', table, name, sql_type))
+                    enforcement.append(('alter_column', table, name, sql_type, sql_type, False, True, column_sql))
+                continue
+            old_name, old_type, _, old_required = old_columns[uuid]
+            if old_name != name:
+                renames.append(('rename_column', table, old_name, name))
+            if old_type != sql_type or old_required != required:
+                if required and not old_required:
+                    enforcement.append(('backfill', table, name, old_type))
+                enforcement.append(('alter_column', table, name, old_type, sql_type, old_required, required,
+                                    column_sql))
+
+        # Primary key
+        if primary_key_uuids(old_def) != primary_key_uuids(new_def):
+            enforcement.append(('set_primary_key', table, old_def['primary_keys'], new_def['primary_keys']))
+
+        # Foreign keys added to a kept table
+        for key, (column_name, referenced_table, referenced_column) in new_foreign_keys.items():
+            if key not in old_foreign_keys:
+                foreign_keys.append(('add_foreign_key', table, column_name, referenced_table, referenced_column))
+
+        # Indexes are matched on their columns, so the ones whose generated
+        # name changed with a rename are renamed rather than rebuilt
+        old_indexes = index_specs(old_def, index_kwargs)
+        new_indexes = index_specs(new_def, index_kwargs)
+        taken_indexes = {name for name, _ in new_indexes.values()}
+        for key, (name, columns) in new_indexes.items():
+            if key not in old_indexes:
+                indexes.append(('create_index', table, name, columns, key[1]))
+            elif old_indexes[key][0] != name:
+                renames.append(('rename_index', table, old_indexes[key][0], name))
+        for key, (name, _) in old_indexes.items():
+            if key in new_indexes:
+                continue
+            # Dropping its columns drops the index with them; a separate
+            # DROP INDEX would then fail on MySQL
+            if all(uuid in old_columns and uuid not in new_columns for uuid in key[0]):
+                continue
+            if name in taken_indexes:
+                early_drops.append(('drop_index', old_table, name, True))
+            else:
+                dropped_indexes.append(('drop_index', table, name, False))
+
+    # Within the expand step, early drops run before the renames and
+    # additions that reuse their names
+    return (drop_foreign_keys + early_drops + renames + additions + enforcement + foreign_keys
+            + indexes + dropped_indexes + dropped_columns + dropped_tables)
+
+
+def write_migration(output_dir, steps):
+    # One script per non-empty step, numbered in run order; scripts of steps
+    # that are now empty are removed so a rerun never leaves stale ones
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for position, step in enumerate(MIGRATION_STEPS, 1):
+        path = os.path.join(output_dir, f'{position}_{step}.sql')
+        statements = steps.get(step)
+        if not statements:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        with open(path, 'w') as f:
+            f.write(f'-- Step {position}/{len(MIGRATION_STEPS)}, {step}: {STEP_NOTES[step]}\n')
+            for statement in statements:
+                f.write(statement + '\n')
+        paths.append(path)
+    return paths
@@ -1,74 +1,486 @@
 import sys
-import json
-from generators import generate_mongodb, generate_sql_mysql, generate_sql_postgres, generate_sql_sqlite, generate_xlsx, generate_django_models, generate_csvs, generate_json_clean, generate_json_sample, generate_xml
+import time
+import datetime
+import argparse
+import importlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from generators import profiling
+from generators.profiling import phase
+from generators.schema_model import compile_schema
+from generators.cache import GenerationCache, MANIFEST_PATH
+from generators.schema_loader import load_raw, load_schema_cached, BACKENDS, SCHEMA_CACHE_PATH
 from config import HELP_TEXT
 
+# Generator modules are imported on first use, so a run only pays for the
+# modules (and third-party libraries such as xlsxwriter or pyarrow) of the
+# targets it asks for
+GENERATORS = {
+    1: ("MySQL", "generators.generate_sql_mysql"),
+    2: ("PostgreSQL", "generators.generate_sql_postgres"),
+    3: ("SQLite", "generators.generate_sql_sqlite"),
+    4: ("Excel", "generators.generate_xlsx"),
+    5: ("CSV", "generators.generate_csvs"),
+    6: ("JSON", "generators.generate_json_clean"),
+    7: ("JSON", "generators.generate_json_sample"),
+    8: ("Django", "generators.generate_django_models"),
+    9: ("XML", "generators.generate_xml"),
+    10: ("MongoDB", "generators.generate_mongodb"),
+    11: ("Parquet", "generators.generate_parquet")
+}
+
+# Generators that stream DDL and accept an output path or file-like sink
+SQL_OPTIONS = (1, 2, 3)
+
+# Generators that write ALTER TABLE migrations with --migrate-from
+MIGRATION_OPTIONS = (1, 2)
+
+# cProfile stats written by a bare --profile
+PROFILE_PATH = 'cds_profile.pstats'
+
+# Functions listed from the cProfile stats after a --profile run
+PROFILE_TOP = 25
+
+def load_generator(option):
+    # The generator's module; importlib caches it after the first call
+    return importlib.import_module(GENERATORS[option][1])
+
+def get_generator(option):
+    return load_generator(option).generate
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        usage="python main.py <schema_file_path> [generator_type]",
+        description=HELP_TEXT,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('schema_path')
+    parser.add_argument('option', nargs='?',
+                        help="Generator number, or a comma-separated list of numbers")
+    parser.add_argument('--schema-backend', choices=BACKENDS, default=None,
+                        help="JSON backend for the schema file (default: fastest installed of msgspec, orjson, json)")
+    parser.add_argument('--no-mmap', action='store_true',
+                        help="Read the schema file instead of memory-mapping it")
+    parser.add_argument('--schema-cache', default=SCHEMA_CACHE_PATH,
+                        help=f"Compiled schema cache file (default: {SCHEMA_CACHE_PATH})")
+    parser.add_argument('--no-schema-cache', action='store_true',
+                        help="Always parse and compile the schema file")
+    parser.add_argument('--all', action='store_true',
+                        help="Run every generator in one pass")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Number of generators to run concurrently (default: one per target)")
+    parser.add_argument('--table-jobs', type=int, default=None,
+                        help="Files written concurrently by the per-table generators (CSV, XML, MongoDB)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only regenerate tables whose definition or dependencies changed")
+    parser.add_argument('--cache-file', default=MANIFEST_PATH,
+                        help=f"Cache manifest used by --incremental (default: {MANIFEST_PATH})")
+    parser.add_argument('--output', '-o', default=None,
+                        help="Write the DDL of a single SQL target (1-3) to this path, or '-' for stdout")
+    parser.add_argument('--indexes', choices=['inline', 'separate', 'none'], default='inline',
+                        help="SQL targets: write indexes after each table, to a separate post-load script, or not at all (default: inline)")
+    parser.add_argument('--partition', action='append', default=[], metavar='TABLE=COLUMN[:INTERVAL]',
+                        help="MySQL/PostgreSQL: partition TABLE by range on its DATE/DATETIME COLUMN, daily or monthly (default), e.g. Event=Time:daily (repeatable)")
+    parser.add_argument('--partition-start', type=datetime.date.fromisoformat, default=None, metavar='YYYY-MM-DD',
+                        help="First day covered by the initial partitions (default: today)")
+    parser.add_argument('--partition-periods', type=int, default=None,
+                        help="Initial partitions per partitioned table (default: 12 monthly, 30 daily)")
+    parser.add_argument('--migrate-from', default=None, metavar='OLD_SCHEMA',
+                        help="MySQL/PostgreSQL: write ALTER TABLE migrations from this older schema version instead of the full DDL")
+    parser.add_argument('--manifest', action='store_true',
+                        help="CSV, XML and MongoDB targets: also write a manifest.json listing the files written")
+    parser.add_argument('--xsd', action='store_true',
+                        help="XML target: also write an XSD schema for every table")
+    parser.add_argument('--data', default=None,
+                        help="CDS data (.json, .jsonl, optionally .gz/.zst, or a directory of per-table .jsonl files) to load or export")
+    parser.add_argument('--database', default=None,
+                        help="Database file created by the SQLite loader (default: cds.sqlite)")
+    parser.add_argument('--batch-size', type=int, default=50000,
+                        help="Rows per executemany batch, or per Parquet row group, in data mode (default: 50000)")
+    parser.add_argument('--ingest-format', choices=['ejson', 'bson'], default='ejson',
+                        help="MongoDB data export: insertMany batches as Extended JSON arrays or BSON (default: ejson)")
+    parser.add_argument('--embed', action='append', default=[], metavar='TYPE=MODE',
+                        help="MongoDB: store relationships of this type as references or embedded documents, e.g. ManyToMany=embed (repeatable)")
+    parser.add_argument('--copy-format', choices=['text', 'csv', 'binary'], default='text',
+                        help="COPY data format for the PostgreSQL data export (default: text)")
+    parser.add_argument('--split-rows', type=int, default=None,
+                        help="CSV data export: start a new shard after this many rows")
+    parser.add_argument('--split-bytes', type=int, default=None,
+                        help="CSV data export: start a new shard after this many uncompressed bytes")
+    parser.add_argument('--compression', choices=['none', 'gzip', 'zstd'], default='none',
+                        help="Compress CSV data shards or NDJSON output (zstd requires zstandard)")
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json',
+                        help="JSON targets (6, 7): one JSON document, or JSON Lines written record by record")
+    parser.add_argument('--layout', choices=['tagged', 'per-table'], default='tagged',
+                        help="NDJSON output: one tagged stream, or one file per table (default: tagged)")
+    parser.add_argument('--pragma', action='append', default=[], metavar='NAME=VALUE',
+                        help="SQLite pragma for the loader, e.g. synchronous=NORMAL (repeatable)")
+    parser.add_argument('--timings', action='store_true',
+                        help="Report wall/CPU time, peak memory and bytes written for every phase")
+    parser.add_argument('--timings-json', default=None, metavar='PATH',
+                        help="Also write the phase report as JSON to this path")
+    parser.add_argument('--profile', nargs='?', const=PROFILE_PATH, default=None, metavar='PATH',
+                        help=f"Record phase timings and dump cProfile stats of the main thread (default: {PROFILE_PATH})")
+    return parser.parse_args(argv)
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python main.py <schema_file_path> [generator_type]")
         return
 
-    schema_path = sys.argv[1]
+    args = parse_args(sys.argv[1:])
+
+    # Keep stdout clean for the DDL when streaming it there
+    status = sys.stderr if args.output == '-' else sys.stdout
+
+    if not (args.timings or args.timings_json or args.profile):
+        run(args, status)
+        return
+
+    profiling.enable()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run(args, status)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        entries = profiling.results()
+        profiling.disable()
+        report_profile(args, entries, profiler, status)
+
+def report_profile(args, entries, profiler, status):
+    print("\nPhase timings:", file=status)
+    print(profiling.format_report(entries), file=status)
+    if args.timings_json:
+        profiling.write_json(args.timings_json, entries)
+        print(f"Phase timings written to '{args.timings_json}'", file=status)
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        import pstats
+        print(f"\ncProfile stats written to '{args.profile}' (top {PROFILE_TOP} by cumulative time):", file=status)
+        pstats.Stats(profiler, stream=status).sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+def run(args, status):
+    schema_path = args.schema_path
 
     try:
-        with open(schema_path, 'r') as file:
-            schema = json.load(file)
-        print(f"Successfully loaded schema from '{schema_path}'")
+        with phase('load schema'):
+            if args.no_schema_cache:
+                schema = load_raw(schema_path, backend=args.schema_backend, use_mmap=not args.no_mmap)
+            else:
+                schema = load_schema_cached(schema_path, args.schema_cache, backend=args.schema_backend,
+                                            use_mmap=not args.no_mmap)
+        print(f"Successfully loaded schema from '{schema_path}'", file=status)
     except FileNotFoundError:
-        print(f"Error: File '{schema_path}' not found.")
+        print(f"Error: File '{schema_path}' not found.", file=status)
         return
-    except json.JSONDecodeError:
-        print(f"Error: '{schema_path}' is not a valid JSON file.")
+    except ValueError:
+        # Every backend reports invalid documents as a ValueError
+        print(f"Error: '{schema_path}' is not a valid JSON file.", file=status)
         return
 
-    if len(sys.argv) == 3:
+    # Resolve UUID references once; every generator works on the compiled model
+    with phase('compile schema'):
+        schema = compile_schema(schema)
+
+    cache = GenerationCache(args.cache_file) if args.incremental else None
+
+    # Extra keyword arguments for the generators that take options
+    generator_options = {option: {'indexes': args.indexes} for option in SQL_OPTIONS}
+    partition_options = {
+        'partitions': parse_partitions(args.partition),
+        'partition_start': args.partition_start,
+        'partition_periods': args.partition_periods,
+    }
+    generator_options[1].update(partition_options)
+    generator_options[2].update(partition_options)
+    generator_options[5] = {'jobs': args.table_jobs, 'manifest': args.manifest}
+    json_options = {
+        'format': args.format,
+        'layout': args.layout,
+        'compression': None if args.compression == 'none' else args.compression,
+    }
+    generator_options[6] = json_options
+    generator_options[7] = json_options
+    generator_options[9] = {'xsd': args.xsd, 'jobs': args.table_jobs, 'manifest': args.manifest}
+    generator_options[10] = {'jobs': args.table_jobs, 'embed': parse_embed(args.embed), 'manifest': args.manifest}
+
+    if args.all:
+        failed = run_generators(list(GENERATORS), schema, status, jobs=args.jobs, cache=cache, generator_options=generator_options)
+        save_cache(cache)
+        if failed:
+            sys.exit(1)
+    elif args.option is not None:
         try:
-            option = int(sys.argv[2])
-            run_generator(option, schema)
+            options = [int(part) for part in args.option.split(',')]
         except ValueError:
-            print("Error: Generator type must be an integer.")
+            print("Error: Generator type must be an integer.", file=status)
+            return
+
+        if args.data is not None:
+            if len(options) != 1:
+                print("Error: --data requires a single generator.", file=status)
+                return
+            with phase('data'):
+                run_data_mode(options[0], schema, args, status)
+        elif args.migrate_from is not None:
+            with phase('migrate'):
+                run_migration_mode(options, schema, args, status)
+        elif args.output is not None:
+            if len(options) != 1 or options[0] not in SQL_OPTIONS:
+                print("Error: --output requires a single SQL generator (1, 2 or 3).", file=status)
+                return
+            output = sys.stdout if args.output == '-' else args.output
+            name = GENERATORS[options[0]][0]
+            generator = get_generator(options[0])
+            with phase(f'{options[0]} {name}'):
+                generator(schema, cache=cache, output=output, **generator_options[options[0]])
+            save_cache(cache)
+        elif len(options) == 1:
+            run_generator(options[0], schema, status, cache=cache, generator_options=generator_options)
+            save_cache(cache)
+        else:
+            failed = run_generators(options, schema, status, jobs=args.jobs, cache=cache, generator_options=generator_options)
+            save_cache(cache)
+            if failed:
+                sys.exit(1)
     else:
-        interactive_mode(schema)
-
-def run_generator(option, schema):
-    generators = {
-        1: ("MySQL", generate_sql_mysql.generate),
-        2: ("PostgreSQL", generate_sql_postgres.generate),
-        3: ("SQLite", generate_sql_sqlite.generate),
-        4: ("Excel", generate_xlsx.generate),
-        5: ("CSV", generate_csvs.generate),
-        6: ("JSON", generate_json_clean.generate),
-        7: ("JSON", generate_json_sample.generate),
-        8: ("Django", generate_django_models.generate),
-        9: ("XML", generate_xml.generate),
-        10: ("MongoDB", generate_mongodb.generate)
-    }
+        interactive_mode(schema, status, cache=cache, generator_options=generator_options)
+
+# Data mode handlers: each starts its export and returns the stats with a
+# summary of where the data went
+def export_mysql_data(module, schema, args, status):
+    print(f"Exporting '{args.data}' as MySQL LOAD DATA files...", file=status)
+    stats = module.export_load_data(schema, args.data)
+    return stats, f"LOAD DATA export to '{module.LOAD_DATA_DIR}'"
+
+def export_postgres_data(module, schema, args, status):
+    print(f"Exporting '{args.data}' as PostgreSQL COPY {args.copy_format} files...", file=status)
+    stats = module.export_copy(schema, args.data, copy_format=args.copy_format)
+    return stats, f"COPY export to '{module.COPY_DIR}'"
+
+def load_sqlite_data(module, schema, args, status):
+    pragmas = {}
+    for pragma in args.pragma:
+        name, _, value = pragma.partition('=')
+        pragmas[name.strip()] = value.strip()
+
+    database = args.database or module.DATABASE_PATH
+    print(f"Loading '{args.data}' into SQLite database '{database}'...", file=status)
+    stats = module.load(schema, args.data, database=database, batch_size=args.batch_size, pragmas=pragmas)
+    return stats, "SQLite load"
+
+def export_xlsx_data(module, schema, args, status):
+    print(f"Exporting '{args.data}' to Excel...", file=status)
+    stats = module.export_xlsx(schema, args.data)
+    return stats, "Excel export to 'output.xlsx'"
+
+def export_csv_data(module, schema, args, status):
+    compression = None if args.compression == 'none' else args.compression
+    print(f"Exporting '{args.data}' as CSV files...", file=status)
+    stats = module.export_csv(schema, args.data, batch_size=args.batch_size,
+                              max_rows=args.split_rows, max_bytes=args.split_bytes,
+                              compression=compression)
+    return stats, f"CSV export of {stats['files']} files to '{module.DATA_DIR}'"
 
-    if option in generators:
-        name, generator = generators[option]
-        if generator:
-            print(f"Generating {name} SQL...")
-            generator(schema)
-            print(f"{name} SQL generation complete.")
+def export_ndjson_data(module, schema, args, status):
+    compression = None if args.compression == 'none' else args.compression
+    print(f"Converting '{args.data}' to NDJSON...", file=status)
+    stats = module.export_ndjson(schema, args.data, layout=args.layout, compression=compression)
+    return stats, "NDJSON export to 'cds_data'"
+
+def export_xml_data(module, schema, args, status):
+    print(f"Exporting '{args.data}' as XML documents...", file=status)
+    stats = module.export_xml(schema, args.data)
+    return stats, f"XML export to '{module.DATA_DIR}'"
+
+def export_mongodb_data(module, schema, args, status):
+    print(f"Exporting '{args.data}' as MongoDB insertMany batches ({args.ingest_format})...", file=status)
+    stats = module.export_insert_many(schema, args.data, format=args.ingest_format,
+                                      embed=parse_embed(args.embed))
+    return stats, f"Export of {stats['batches']} batches to '{module.INGEST_DIR}'"
+
+def export_parquet_data(module, schema, args, status):
+    print(f"Exporting '{args.data}' as Parquet files...", file=status)
+    stats = module.export_parquet(schema, args.data, row_group_size=args.batch_size)
+    return stats, f"Parquet export to '{module.PARQUET_DIR}'"
+
+# Generators with a --data mode
+DATA_MODES = {
+    1: export_mysql_data,
+    2: export_postgres_data,
+    3: load_sqlite_data,
+    4: export_xlsx_data,
+    5: export_csv_data,
+    7: export_ndjson_data,
+    9: export_xml_data,
+    10: export_mongodb_data,
+    11: export_parquet_data,
+}
+
+def run_data_mode(option, schema, args, status):
+    handler = DATA_MODES.get(option)
+    if handler is None:
+        print(f"Data mode is not available for option {option}.", file=status)
+        return
+    module = load_generator(option)
+
+    start = time.perf_counter()
+    stats, summary = handler(module, schema, args, status)
+    elapsed = time.perf_counter() - start
+
+    print_data_stats(stats, status)
+    print(f"{summary} complete in {elapsed:.3f}s.", file=status)
+
+def parse_embed(items):
+    # TYPE=MODE pairs; a bare TYPE embeds
+    embed = {}
+    for item in items:
+        type_name, _, mode = item.partition('=')
+        embed[type_name.strip()] = mode.strip() or 'embed'
+    return embed
+
+def run_migration_mode(options, schema, args, status):
+    if any(option not in MIGRATION_OPTIONS for option in options):
+        print("Error: --migrate-from requires the MySQL (1) or PostgreSQL (2) generator.", file=status)
+        return
+    try:
+        with phase('load old schema'):
+            old_schema = compile_schema(load_raw(args.migrate_from, backend=args.schema_backend,
+                                                 use_mmap=not args.no_mmap))
+    except FileNotFoundError:
+        print(f"Error: File '{args.migrate_from}' not found.", file=status)
+        return
+    except ValueError:
+        print(f"Error: '{args.migrate_from}' is not a valid JSON file.", file=status)
+        return
+
+    for option in options:
+        name = GENERATORS[option][0]
+        module = load_generator(option)
+        with phase(f'{option} {name}'):
+            paths = module.generate_migration(old_schema, schema)
+        if paths:
+            print(f"{name} migration written to '{module.MIGRATION_DIR}':", file=status)
+            for path in paths:
+                print(f"  {path}", file=status)
+        else:
+            print(f"{name}: no changes from '{args.migrate_from}'.", file=status)
+
+def parse_partitions(items):
+    # TABLE=COLUMN[:INTERVAL] items; the interval defaults to monthly
+    partitions = {}
+    for item in items:
+        table_name, _, column = item.partition('=')
+        column_name, _, interval = column.partition(':')
+        partitions[table_name.strip()] = (column_name.strip(), interval.strip() or 'monthly')
+    return partitions
+
+def print_data_stats(stats, status):
+    for table_name, count in stats['rows'].items():
+        print(f"  {table_name:<30} {count:>12} rows", file=status)
+    if stats['skipped']:
+        print(f"  Skipped {stats['skipped']} records for tables not in the schema.", file=status)
+    if stats.get('invalid'):
+        print(f"  Stored {stats['invalid']} values that do not fit their column type as null.", file=status)
+    if stats.get('foreign_key_violations'):
+        print(f"  Warning: {stats['foreign_key_violations']} foreign key violations.", file=status)
+    if stats.get('unresolved'):
+        print(f"  Warning: {stats['unresolved']} embedded references did not resolve.", file=status)
+
+def save_cache(cache):
+    if cache is not None:
+        cache.save()
+
+def generator_kwargs(option, cache, generator_options):
+    return dict((generator_options or {}).get(option, {}), cache=cache)
+
+def run_generator(option, schema, status, cache=None, generator_options=None):
+    if option in GENERATORS:
+        name, module_path = GENERATORS[option]
+        if module_path:
+            generator = get_generator(option)
+            print(f"Generating {name} output...", file=status)
+            with phase(f'{option} {name}'):
+                generator(schema, **generator_kwargs(option, cache, generator_options))
+            print(f"{name} generation complete.", file=status)
         else:
-            print(f"{name} file generation not implemented yet.")
+            print(f"{name} file generation not implemented yet.", file=status)
     else:
-        print(f"Invalid option: {option}")
+        print(f"Invalid option: {option}", file=status)
+
+def run_generators(options, schema, status, jobs=None, cache=None, generator_options=None):
+    # Run several targets against the same compiled schema concurrently.
+    # Every generator writes its own output files, so they can share the pool.
+    # A failing target is reported and does not stop the others.
+    targets = []
+    for option in options:
+        if option not in GENERATORS or not GENERATORS[option][1]:
+            print(f"Invalid option: {option}", file=status)
+            continue
+        if option not in targets:
+            targets.append(option)
+
+    def timed(option):
+        name = GENERATORS[option][0]
+        start = time.perf_counter()
+        with phase(f'{option} {name}'):
+            generator = get_generator(option)
+            generator(schema, **generator_kwargs(option, cache, generator_options))
+        return time.perf_counter() - start
+
+    results = {}
+    start = time.perf_counter()
+    if jobs == 1:
+        # Serially in this thread, where --profile's cProfile can see them
+        for option in targets:
+            try:
+                results[option] = (timed(option), None)
+            except Exception as e:
+                results[option] = (None, e)
+    else:
+        with ThreadPoolExecutor(max_workers=jobs or max(len(targets), 1)) as pool:
+            futures = {pool.submit(profiling.propagate(timed), option): option for option in targets}
+            for future in as_completed(futures):
+                option = futures[future]
+                try:
+                    results[option] = (future.result(), None)
+                except Exception as e:
+                    results[option] = (None, e)
+    total = time.perf_counter() - start
+
+    # Report in option order so the output is stable between runs
+    failed = []
+    for option in targets:
+        name = GENERATORS[option][0]
+        elapsed, error = results[option]
+        if error is None:
+            print(f"  [ok]     {option:>2} {name:<10} {elapsed:8.3f}s", file=status)
+        else:
+            failed.append(option)
+            print(f"  [failed] {option:>2} {name:<10} {type(error).__name__}: {error}", file=status)
+    print(f"Generated {len(targets) - len(failed)}/{len(targets)} targets in {total:.3f}s.", file=status)
+
+    return failed
 
-def interactive_mode(schema):
+def interactive_mode(schema, status, cache=None, generator_options=None):
     while True:
-        print("\n" + HELP_TEXT)
+        print("\n" + HELP_TEXT, file=status)
         user_input = input("Enter an option number (or 'q' to quit): ").strip().lower()
         
         if user_input == 'q':
-            print("Exiting the program. Goodbye!")
+            print("Exiting the program. Goodbye!", file=status)
             break
         
         try:
             option = int(user_input)
-            run_generator(option, schema)
+            run_generator(option, schema, status, cache=cache, generator_options=generator_options)
+            save_cache(cache)
         except ValueError:
-            print("Invalid input. Please enter a number or 'q' to quit.")
+            print("Invalid input. Please enter a number or 'q' to quit.", file=status)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import uuid
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# A small CDS schema covering every column type: Event references a Host by
+# foreign key and its Tags through an Array column
+
+COLUMN_TYPES = ['VARCHAR(255)', 'INT', 'FLOAT', 'BOOLEAN', 'DATE', 'DATETIME', 'BLOB', 'Array(VARCHAR(255))']
+PROPERTY_TYPES = ['nullable', 'PrimaryKey', 'indexed', 'unique']
+RELATIONSHIP_TYPES = ['ForeignKey', 'OneToOne', 'ManyToMany']
+
+
+def make_uuid(name):
+    # Stable UUIDs, so the schema is the same on every run
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f'cds-test/{name}'))
+
+
+def make_column(table_name, name, type_name, properties=(), references=None, relationship_type='ForeignKey'):
+    # properties: (name, value) pairs; references: (table, column) names
+    column = {
+        'uuid': make_uuid(f'{table_name}.{name}'),
+        'name': name,
+        'type': make_uuid(f'type/{type_name}'),
+        'properties': [{'type': make_uuid(f'property/{prop}'), 'value': value} for prop, value in properties],
+        'relationship': [],
+    }
+    if references:
+        referenced_table, referenced_column = references
+        column['relationship'].append({
+            'name': f'{table_name}_{referenced_table}',
+            'table_uuid': make_uuid(referenced_table),
+            'column_uuid': make_uuid(f'{referenced_table}.{referenced_column}'),
+            'relationship_type_uuid': make_uuid(f'relationship/{relationship_type}'),
+        })
+    return column
+
+
+def make_table(name, columns):
+    return {'uuid': make_uuid(name), 'name': name, 'columns': columns}
+
+
+def key_column(table_name):
+    return make_column(table_name, 'UUID', 'VARCHAR(255)', [('PrimaryKey', 'true'), ('nullable', False)])
+
+
+def make_schema():
+    return {
+        'tables': [
+            make_table('Host', [
+                key_column('Host'),
+                make_column('Host', 'Name', 'VARCHAR(255)', [('unique', 'true')]),
+            ]),
+            make_table('Tag', [
+                key_column('Tag'),
+                make_column('Tag', 'Label', 'VARCHAR(255)'),
+            ]),
+            make_table('Event', [
+                key_column('Event'),
+                make_column('Event', 'Name', 'VARCHAR(255)', [('nullable', False), ('indexed', 'true')]),
+                make_column('Event', 'Count', 'INT'),
+                make_column('Event', 'Score', 'FLOAT'),
+                make_column('Event', 'Flag', 'BOOLEAN'),
+                make_column('Event', 'Day', 'DATE'),
+                make_column('Event', 'Time', 'DATETIME'),
+                make_column('Event', 'Raw', 'BLOB'),
+                make_column('Event', 'Host', 'VARCHAR(255)', references=('Host', 'UUID')),
+                make_column('Event', 'Tags', 'Array(VARCHAR(255))', references=('Tag', 'UUID'),
+                            relationship_type='ManyToMany'),
+            ]),
+        ],
+        'column_types': [{'uuid': make_uuid(f'type/{name}'), 'name': name} for name in COLUMN_TYPES],
+        'property_types': [{'uuid': make_uuid(f'property/{name}'), 'name': name} for name in PROPERTY_TYPES],
+        'relationship_types': [{'uuid': make_uuid(f'relationship/{name}'), 'name': name}
+                               for name in RELATIONSHIP_TYPES],
+    }
+
+
+# Records matching make_schema(), in the {"table": ..., "record": ...} JSONL
+# form of CDS data files
+RECORDS = [
+    ('Host', {'UUID': 'h1', 'Name': 'web-1'}),
+    ('Host', {'UUID': 'h2', 'Name': 'db-1'}),
+    ('Tag', {'UUID': 't1', 'Label': 'alert'}),
+    ('Tag', {'UUID': 't2', 'Label': 'audit'}),
+] + [
+    ('Event', {'UUID': f'e{i}', 'Name': f'event {i}', 'Count': i, 'Score': i / 2, 'Flag': i % 2 == 0,
+               'Day': '2026-01-02', 'Time': '2026-01-02T03:04:05', 'Raw': 'raw', 'Host': 'h1' if i % 2 else 'h2',
+               'Tags': ['t1', 't2'] if i % 3 else ['t1']})
+    for i in range(10)
+]
+
+
+@pytest.fixture
+def schema():
+    return make_schema()
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data.jsonl'
+    with open(path, 'w', encoding='utf-8') as f:
+        for table_name, record in RECORDS:
+            f.write(json.dumps({'table': table_name, 'record': record}) + '\n')
+    return str(path)
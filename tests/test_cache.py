@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from generators.cache import GenerationCache
+
+
+def make_target(tmp_path):
+    cache = GenerationCache(str(tmp_path / 'manifest.json'))
+    return cache.target('test', __file__)
+
+
+def test_is_fresh_after_write(tmp_path):
+    target = make_target(tmp_path)
+    path = str(tmp_path / 'out.txt')
+    target.write('table', 'v1', path, 'content')
+    assert target.is_fresh('table', 'v1', path)
+    assert not target.is_fresh('table', 'v2', path)
+
+
+def test_is_fresh_detects_same_size_edit(tmp_path):
+    target = make_target(tmp_path)
+    path = str(tmp_path / 'out.txt')
+    target.write('table', 'v1', path, 'content')
+    stat = os.stat(path)
+
+    with open(path, 'w') as f:
+        f.write('CONTENT')
+    # Even an edit that keeps the size and restores the modification time
+    # to within the same second is caught by the nanosecond mtime
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert not target.is_fresh('table', 'v1', path)
+
+    # ...and write() restores the expected content
+    target.write('table', 'v1', path, 'content')
+    with open(path) as f:
+        assert f.read() == 'content'
+
+
+def test_stream_replaces_target(tmp_path):
+    target = make_target(tmp_path)
+    path = str(tmp_path / 'out.txt')
+    with target.stream('table', 'v1', path) as out:
+        out.write('streamed')
+    with open(path) as f:
+        assert f.read() == 'streamed'
+    assert target.is_fresh('table', 'v1', path)
+    assert os.listdir(tmp_path) == ['out.txt']
+
+
+def test_stream_error_removes_temporary_file(tmp_path):
+    target = make_target(tmp_path)
+    path = str(tmp_path / 'out.txt')
+    target.write('table', 'v1', path, 'original')
+
+    with pytest.raises(RuntimeError):
+        with target.stream('table', 'v2', path) as out:
+            out.write('partial')
+            raise RuntimeError('generator failed')
+
+    assert os.listdir(tmp_path) == ['out.txt']
+    with open(path) as f:
+        assert f.read() == 'original'
@@ -0,0 +1,106 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+from conftest import RECORDS
+from generators.generate_csvs import export_csv
+
+
+def write_records(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for table_name, record in records:
+            f.write(json.dumps({'table': table_name, 'record': record}) + '\n')
+    return str(path)
+
+
+def read_manifest(output_dir):
+    with open(os.path.join(output_dir, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def read_rows(output_dir, entry, compression):
+    with open(os.path.join(output_dir, entry['file']), 'rb') as f:
+        data = f.read()
+    assert entry['bytes'] == len(data)
+    assert entry['sha256'] == hashlib.sha256(data).hexdigest()
+    if compression == 'gzip':
+        data = gzip.decompress(data)
+    elif compression == 'zstd':
+        zstandard = pytest.importorskip('zstandard')
+        # Reopened shards hold several frames
+        data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True).read()
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8'), newline='')))
+    assert len(rows) == entry['rows'] + 1
+    return rows
+
+
+def test_single_file_per_table(schema, data_path, tmp_path):
+    output_dir = str(tmp_path / 'csv')
+    stats = export_csv(schema, data_path, output_dir=output_dir)
+    assert stats == {'rows': {'Host': 2, 'Tag': 2, 'Event': 10}, 'skipped': 0, 'files': 3}
+
+    manifest = read_manifest(output_dir)
+    assert manifest['compression'] is None
+    assert [(entry['table'], entry['file'], entry['rows']) for entry in manifest['files']] == [
+        ('Host', 'Host.csv', 2), ('Tag', 'Tag.csv', 2), ('Event', 'Event.csv', 10),
+    ]
+    rows = read_rows(output_dir, manifest['files'][2], None)
+    assert rows[0] == ['UUID', 'Name', 'Count', 'Score', 'Flag', 'Day', 'Time', 'Raw', 'Host', 'Tags']
+    assert rows[4] == ['e3', 'event 3', '3', '1.5', 'false', '2026-01-02', '2026-01-02T03:04:05', 'raw', 'h1', '["t1"]']
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_shards_by_rows(compression, schema, tmp_path):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    # Tables interleaved, one open file and one-row batches: shards are closed
+    # and reopened, which appends gzip members / zstd frames
+    events = [record for record in RECORDS if record[0] == 'Event']
+    others = [record for record in RECORDS if record[0] != 'Event']
+    data_path = write_records(tmp_path / 'interleaved.jsonl',
+                              [record for pair in zip(events, others) for record in pair] + events[len(others):])
+    output_dir = str(tmp_path / 'csv')
+    stats = export_csv(schema, data_path, output_dir=output_dir, batch_size=1, max_rows=3,
+                       compression=compression, max_open=1)
+    suffix = {None: '', 'gzip': '.gz', 'zstd': '.zst'}[compression]
+    events = [entry for entry in read_manifest(output_dir)['files'] if entry['table'] == 'Event']
+    assert [(entry['file'], entry['rows']) for entry in events] == [
+        (f'Event_{number:05d}.csv{suffix}', rows) for number, rows in ((1, 3), (2, 3), (3, 3), (4, 1))
+    ]
+    assert stats['files'] == 6
+
+    uuids = []
+    for entry in events:
+        rows = read_rows(output_dir, entry, compression)
+        assert rows[0][0] == 'UUID'
+        uuids.extend(row[0] for row in rows[1:])
+    assert uuids == [f'e{i}' for i in range(10)]
+
+
+def test_shards_by_bytes(schema, data_path, tmp_path):
+    output_dir = str(tmp_path / 'csv')
+    export_csv(schema, data_path, output_dir=output_dir, max_bytes=200)
+    events = [entry for entry in read_manifest(output_dir)['files'] if entry['table'] == 'Event']
+    assert len(events) > 1
+    assert sum(entry['rows'] for entry in events) == 10
+    for entry in events:
+        read_rows(output_dir, entry, None)
+
+
+def test_unknown_tables_and_empty_tables(schema, tmp_path):
+    data_path = write_records(tmp_path / 'data.jsonl', [('Nope', {})])
+    output_dir = str(tmp_path / 'csv')
+    stats = export_csv(schema, data_path, output_dir=output_dir, compression='gzip')
+    assert stats == {'rows': {'Host': 0, 'Tag': 0, 'Event': 0}, 'skipped': 1, 'files': 3}
+    for entry in read_manifest(output_dir)['files']:
+        assert len(read_rows(output_dir, entry, 'gzip')) == 1
+
+
+def test_unknown_compression(schema, data_path, tmp_path):
+    with pytest.raises(ValueError):
+        export_csv(schema, data_path, output_dir=str(tmp_path / 'csv'), compression='bz2')
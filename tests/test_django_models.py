@@ -0,0 +1,83 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from generators import generate_django_models, generate_sql_sqlite
+from generators.schema_model import compile_schema
+from generators.sql_common import iter_table_defs
+
+pytest.importorskip('django')
+
+# Django settings can only be configured once per process, so the generated
+# app is set up and loaded in a fresh interpreter. Its tables are not created
+# by migrate but from the SQL generators' table definitions, so the test
+# fails when a model no longer matches the SQL.
+SCRIPT = """
+import json, sys
+import django
+from django.conf import settings
+settings.configure(
+    INSTALLED_APPS=['cds_app'],
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'}},
+    DEFAULT_AUTO_FIELD='django.db.models.BigAutoField',
+    TIME_ZONE='UTC',
+)
+django.setup()
+
+from django.core.management import call_command
+call_command('check')
+
+from cds_app import loaders, models
+counts = loaders.load(sys.argv[1], batch_size=4)
+
+event = models.Event.objects.with_related().get(UUID='e4')
+print(json.dumps({
+    'counts': counts,
+    'event': [event.Name, event.Count, event.Score, event.Flag, str(event.Day), event.Time.isoformat(),
+              bytes(event.Raw).decode(), event.Host.Name],
+    'tags': sorted(tag.Label for tag in event.Tags.all()),
+    'tagged': models.Tag.objects.get(UUID='t1').event_set.count(),
+    'rows': sorted([row.Event_ID_id, row.Tags_ID_id] for row in models.Event_Tag.objects.filter(Event_ID='e3')),
+}))
+"""
+
+
+def create_tables(schema, database):
+    # The MySQL and PostgreSQL table layout, which the models follow, in
+    # SQLite types. (The SQLite target names intermediary value columns
+    # after the Array column, without the _ID suffix.)
+    conn = sqlite3.connect(database)
+    try:
+        for table_def in iter_table_defs(compile_schema(schema), generate_sql_sqlite.get_sql_type,
+                                         generate_sql_sqlite.quote):
+            conn.execute(generate_sql_sqlite.render_create_table(table_def))
+            for statement in generate_sql_sqlite.render_create_indexes(table_def):
+                conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_generated_app_loads_into_sql_tables(schema, data_path, tmp_path, monkeypatch):
+    app_dir = tmp_path / 'cds_app'
+    app_dir.mkdir()
+    (app_dir / '__init__.py').write_text('')
+    monkeypatch.chdir(app_dir)
+    generate_django_models.generate(schema)
+    create_tables(schema, str(tmp_path / 'db.sqlite3'))
+
+    result = subprocess.run([sys.executable, '-c', SCRIPT, data_path], cwd=tmp_path,
+                            capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=str(tmp_path)))
+    assert result.returncode == 0, result.stderr
+    output = json.loads(result.stdout.splitlines()[-1])
+
+    assert output['counts'] == {'Host': 2, 'Tag': 2, 'Event': 10, 'Event_Tag': 16}
+    assert output['event'] == ['event 4', 4, 2.0, True, '2026-01-02', '2026-01-02T03:04:05+00:00', 'raw', 'db-1']
+    assert output['tags'] == ['alert', 'audit']
+    assert output['tagged'] == 10
+    assert output['rows'] == [['e3', 't1']]
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from generators import generate_csvs, generate_mongodb, generate_xml
+from generators.file_output import MANIFEST_NAME, atomic_open, map_tables, write_manifest
+
+
+def test_map_tables_keeps_table_order():
+    # Earlier tables sleep longer, so they finish last
+    def work(table):
+        time.sleep((5 - table) / 100)
+        return table, threading.get_ident()
+
+    results = map_tables(work, range(5), jobs=5)
+    assert [table for table, _ in results] == [0, 1, 2, 3, 4]
+    assert len({thread for _, thread in results}) > 1
+    assert map_tables(lambda table: table * 2, range(3), jobs=1) == [0, 2, 4]
+
+
+def test_map_tables_reraises():
+    def work(table):
+        if table == 2:
+            raise KeyError(table)
+        return table
+
+    with pytest.raises(KeyError):
+        map_tables(work, range(4), jobs=2)
+
+
+def test_atomic_open_replaces_only_on_success(tmp_path):
+    path = tmp_path / 'table.csv'
+    path.write_text('old')
+    with pytest.raises(RuntimeError):
+        with atomic_open(str(path)) as f:
+            f.write('partial')
+            raise RuntimeError
+    assert path.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['table.csv']
+
+    with atomic_open(str(path)) as f:
+        f.write('new')
+    assert path.read_text() == 'new'
+    assert os.listdir(tmp_path) == ['table.csv']
+
+
+def test_write_manifest(tmp_path):
+    (tmp_path / 'B.csv').write_text('12345')
+    (tmp_path / 'A.csv').write_text('1')
+    write_manifest(str(tmp_path), [('B', str(tmp_path / 'B.csv')), ('A', str(tmp_path / 'A.csv'))])
+    with open(tmp_path / MANIFEST_NAME) as f:
+        assert json.load(f) == {'files': [
+            {'table': 'B', 'file': 'B.csv', 'bytes': 5},
+            {'table': 'A', 'file': 'A.csv', 'bytes': 1},
+        ]}
+
+
+@pytest.mark.parametrize('module, output_dir, files', [
+    (generate_csvs, 'csv_output', ['Host.csv', 'Tag.csv', 'Event.csv']),
+    (generate_xml, 'xml_output', ['Host.xml', 'Tag.xml', 'Event.xml']),
+    (generate_mongodb, 'mongodb_schemas', ['Host_schema.json', 'Host_indexes.json', 'Tag_schema.json',
+                                           'Tag_indexes.json', 'Event_schema.json', 'Event_indexes.json']),
+])
+def test_manifest_only_on_request(module, output_dir, files, schema, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    module.generate(schema, jobs=3)
+    assert sorted(os.listdir(output_dir)) == sorted(files)
+
+    module.generate(schema, jobs=3, manifest=True)
+    with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+        assert [entry['file'] for entry in json.load(f)['files']] == files
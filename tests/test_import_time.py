@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+
+# Importing main.py must not import any generator module: they are loaded on
+# first use, so a run only pays for the targets it asks for (see
+# benchmarks/bench_import_time.py for the timings)
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Runs in a fresh interpreter, so modules imported by other tests do not count
+PROBE = """
+import json, sys
+import main
+print(json.dumps(sorted(name for name in sys.modules if name.startswith('generators.generate_'))))
+"""
+
+
+def imported_generators(code):
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_main_loads_no_generator():
+    assert imported_generators(PROBE) == []
+
+
+def test_load_generator_imports_only_its_module():
+    code = PROBE.replace('import main\n', 'import main\nmain.load_generator(6)\n')
+    assert imported_generators(code) == ['generators.generate_json_clean']
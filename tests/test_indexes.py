@@ -0,0 +1,57 @@
+from generators import generate_sql_mysql, generate_sql_postgres
+from generators.schema_model import compile_schema
+from generators.sql_common import constraint_name, index_defs
+
+
+def table_defs(schema, generator):
+    return {table_def['name']: table_def for table_def in generator.iter_table_defs(compile_schema(schema))}
+
+
+def test_index_defs(schema):
+    defs = table_defs(schema, generate_sql_postgres)
+    assert index_defs(defs['Host']) == [('uq_Host_Name', ['Name'], True)]
+    assert index_defs(defs['Tag']) == []
+    # The lookup column, then the foreign key
+    assert index_defs(defs['Event']) == [('idx_Event_Name', ['Name'], False), ('idx_Event_Host', ['Host'], False)]
+    # The (owner, value) index also serves lookups by owner
+    assert index_defs(defs['Event_Tag']) == [
+        ('idx_Event_Tag_Event_ID_Tags_ID', ['Event_ID', 'Tags_ID'], False),
+        ('idx_Event_Tag_Tags_ID', ['Tags_ID'], False),
+    ]
+
+
+def test_skipped_types_and_partition_column():
+    table_def = {
+        'name': 'Event',
+        'primary_keys': ['UUID', 'Time'],
+        'foreign_keys': [('Raw', 'Blob', 'UUID')],
+        'data_columns': [('UUID', 'VARCHAR(255)'), ('Name', 'VARCHAR(255)'), ('Raw', 'BLOB'), ('Time', 'DATETIME')],
+        'lookup_columns': [('Name', True), ('Raw', False)],
+        'partition': ('Time', 'daily', []),
+    }
+    assert index_defs(table_def, skip_types=('BLOB',)) == [('uq_Event_Name_Time', ['Name', 'Time'], True)]
+    assert [name for name, _, _ in index_defs(table_def)] == ['uq_Event_Name_Time', 'idx_Event_Raw']
+
+
+def test_constraint_name_fits_limit():
+    assert constraint_name('fk', 'Event', 'Host') == 'fk_Event_Host'
+    table = 'NetworkConnectionObservationRecord'
+    column = 'DestinationAutonomousSystemNumber'
+    name = constraint_name('idx', table, column)
+    assert len(name) == 63
+    assert name.startswith(f'idx_{table}_Destination')
+    assert name == constraint_name('idx', table, column)
+    assert name != constraint_name('idx', table, column + 's')
+    assert len(constraint_name('idx', table, column, max_length=64)) == 64
+
+
+def test_rendered_statements(schema):
+    pg = table_defs(schema, generate_sql_postgres)
+    assert generate_sql_postgres.render_create_indexes(pg['Event_Tag']) == [
+        'CREATE INDEX "idx_Event_Tag_Event_ID_Tags_ID" ON "Event_Tag" ("Event_ID", "Tags_ID");',
+        'CREATE INDEX "idx_Event_Tag_Tags_ID" ON "Event_Tag" ("Tags_ID");',
+    ]
+    mysql = table_defs(schema, generate_sql_mysql)
+    assert generate_sql_mysql.render_create_indexes(mysql['Host']) == [
+        'CREATE UNIQUE INDEX `uq_Host_Name` ON `Host` (`Name`);',
+    ]
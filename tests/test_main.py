@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_main(*args, cwd):
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), *args, '--no-schema-cache'],
+                          cwd=cwd, capture_output=True, text=True)
+
+
+def test_streamed_ddl_keeps_stdout_clean(schema, tmp_path):
+    path = tmp_path / 'schema.json'
+    path.write_text(json.dumps(schema), encoding='utf-8')
+    result = run_main(str(path), '2', '-o', '-', cwd=tmp_path)
+    assert result.returncode == 0
+    assert result.stdout.startswith('CREATE TABLE "Host" (')
+    assert 'CREATE TABLE "Event"' in result.stdout
+    assert 'Successfully loaded' in result.stderr
+
+
+def test_streamed_errors_go_to_stderr(schema, tmp_path):
+    result = run_main(str(tmp_path / 'missing.json'), '2', '-o', '-', cwd=tmp_path)
+    assert result.stdout == ''
+    assert 'not found' in result.stderr
+
+    path = tmp_path / 'schema.json'
+    path.write_text('not json')
+    result = run_main(str(path), '2', '-o', '-', cwd=tmp_path)
+    assert result.stdout == ''
+    assert 'not a valid JSON file' in result.stderr
+
+    path.write_text(json.dumps(schema), encoding='utf-8')
+    result = run_main(str(path), '5', '-o', '-', cwd=tmp_path)
+    assert result.stdout == ''
+    assert '--output requires a single SQL generator' in result.stderr
+
+
+def test_generator_messages_name_the_target(schema, tmp_path):
+    path = tmp_path / 'schema.json'
+    path.write_text(json.dumps(schema), encoding='utf-8')
+    result = run_main(str(path), '6', cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[1:] == ['Generating JSON output...', 'JSON generation complete.']
@@ -0,0 +1,120 @@
+import os
+
+from conftest import key_column, make_column, make_schema, make_table, make_uuid
+from generators import generate_sql_mysql, generate_sql_postgres
+from generators.schema_model import compile_schema
+from generators.sql_migrations import diff_table_defs
+
+
+def table_defs(schema, generator=generate_sql_postgres):
+    return list(generator.iter_table_defs(compile_schema(schema)))
+
+
+def old_schema():
+    schema = make_schema()
+    schema['tables'].append(make_table('Lonely', [key_column('Lonely')]))
+    return schema
+
+
+def new_schema():
+    # Host renamed, Event.Count renamed, Event.Score retyped, a NOT NULL
+    # Severity added, Event.Name replaced by a new column of the same name,
+    # the Lonely table dropped
+    schema = make_schema()
+    host, _, event = schema['tables']
+    host['name'] = 'Server'
+    columns = event['columns']
+    columns[2]['name'] = 'Total'
+    columns[3]['type'] = make_uuid('type/INT')
+    replacement = make_column('Event', 'Label', 'VARCHAR(255)')
+    replacement['name'] = 'Name'
+    columns[1] = replacement
+    columns.append(make_column('Event', 'Severity', 'INT', [('nullable', False)]))
+    return schema
+
+
+def test_no_changes(schema, tmp_path):
+    assert diff_table_defs(table_defs(schema), table_defs(schema)) == []
+    assert generate_sql_postgres.generate_migration(schema, schema, output_dir=str(tmp_path)) == []
+
+
+def test_operations():
+    assert diff_table_defs(table_defs(old_schema()), table_defs(new_schema())) == [
+        # The dropped column's name is reused, so it goes first
+        ('drop_column', 'Event', 'Name', True),
+        # Matched on UUIDs: renamed in place, with the index that follows the name
+        ('rename_table', 'Host', 'Server'),
+        ('rename_index', 'Server', 'uq_Host_Name', 'uq_Server_Name'),
+        ('rename_column', 'Event', 'Count', 'Total'),
+        ('add_column', 'Event', '"Name" VARCHAR(255)'),
+        # NOT NULL columns are added nullable, backfilled, then constrained
+        ('add_column', 'Event', '"Severity" INTEGER'),
+        ('alter_column', 'Event', 'Score', 'REAL', 'INTEGER', False, False, '"Score" INTEGER'),
+        ('backfill', 'Event', 'Severity', 'INTEGER'),
+        ('alter_column', 'Event', 'Severity', 'INTEGER', 'INTEGER', False, True, '"Severity" INTEGER'),
+        # idx_Event_Name goes with its column
+        ('drop_table', 'Lonely', False),
+    ]
+
+
+def test_foreign_keys_follow_renames_and_drops():
+    old = make_schema()
+    new = make_schema()
+    new['tables'][0]['name'] = 'Server'
+    operations = diff_table_defs(table_defs(old), table_defs(new))
+    assert not [operation for operation in operations if 'foreign_key' in operation[0]]
+
+    # Event.Host no longer references a table
+    new['tables'][2]['columns'][8]['relationship'] = []
+    operations = diff_table_defs(table_defs(old), table_defs(new))
+    assert ('drop_foreign_key', 'Event', 'Host', 'Host') in operations
+    assert ('drop_index', 'Event', 'idx_Event_Host', False) in operations
+
+
+def read_steps(paths):
+    steps = {}
+    for path in paths:
+        with open(path) as f:
+            steps[os.path.basename(path)] = f.read()
+    return steps
+
+
+def test_postgres_steps(tmp_path):
+    output_dir = str(tmp_path / 'migrations')
+    paths = generate_sql_postgres.generate_migration(old_schema(), new_schema(), output_dir=output_dir)
+    steps = read_steps(paths)
+    assert list(steps) == ['1_expand.sql', '3_backfill.sql', '4_enforce.sql', '5_contract.sql']
+
+    expand = steps['1_expand.sql'].splitlines()
+    assert expand[1:] == [
+        'BEGIN;',
+        'ALTER TABLE "Event" DROP COLUMN "Name";',
+        'ALTER TABLE "Host" RENAME TO "Server";',
+        'ALTER INDEX "uq_Host_Name" RENAME TO "uq_Server_Name";',
+        'ALTER TABLE "Event" RENAME COLUMN "Count" TO "Total";',
+        'ALTER TABLE "Event" ADD COLUMN "Name" VARCHAR(255);',
+        'ALTER TABLE "Event" ADD COLUMN "Severity" INTEGER;',
+        'COMMIT;',
+    ]
+    assert 'UPDATE "Event" SET "Severity" = 0' in steps['3_backfill.sql']
+    enforce = steps['4_enforce.sql']
+    assert 'ALTER TABLE "Event" ALTER COLUMN "Score" TYPE INTEGER USING "Score"::INTEGER;' in enforce
+    assert enforce.index('CHECK ("Severity" IS NOT NULL) NOT VALID') < enforce.index(
+        'ALTER TABLE "Event" ALTER COLUMN "Severity" SET NOT NULL;')
+    assert steps['5_contract.sql'].splitlines()[1:] == ['DROP TABLE "Lonely";']
+
+    # A rerun without drops removes the stale contract script
+    schema = make_schema()
+    schema['tables'][0]['name'] = 'Server'
+    paths = generate_sql_postgres.generate_migration(make_schema(), schema, output_dir=output_dir)
+    assert list(read_steps(paths)) == ['1_expand.sql']
+    assert sorted(os.listdir(output_dir)) == ['1_expand.sql']
+
+
+def test_mysql_steps(tmp_path):
+    paths = generate_sql_mysql.generate_migration(old_schema(), new_schema(), output_dir=str(tmp_path))
+    steps = read_steps(paths)
+    assert 'RENAME TABLE `Host` TO `Server`;' in steps['1_expand.sql']
+    assert 'ALTER TABLE `Server` RENAME INDEX `uq_Host_Name` TO `uq_Server_Name`;' in steps['1_expand.sql']
+    assert 'ALTER TABLE `Event` MODIFY COLUMN `Severity` INT NOT NULL;' in steps['4_enforce.sql']
+    assert steps['5_contract.sql'].splitlines()[1:] == ['DROP TABLE `Lonely`;']
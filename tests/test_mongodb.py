@@ -0,0 +1,210 @@
+import datetime
+import json
+import os
+
+import pytest
+
+from conftest import RECORDS
+from generators import generate_mongodb
+from generators.schema_model import compile_schema
+
+mongomock = pytest.importorskip('mongomock')
+
+DOCUMENT = {
+    'null': None,
+    'flag': True,
+    'small': 42,
+    'large': 2 ** 40,
+    'negative': -2 ** 31,
+    'score': 1.5,
+    'text': 'café ✓',
+    'raw': b'\x00\x01\xff',
+    'time': datetime.datetime(2026, 1, 2, 3, 4, 5, 678000),
+    'tags': ['t1', None, 3],
+    'host': {'UUID': 'h1', 'Name': 'web-1', 'nested': {'empty': []}},
+}
+
+
+def test_bson_round_trip():
+    encoded = generate_mongodb.encode_bson(DOCUMENT)
+    assert list(generate_mongodb.decode_bson(encoded)) == [DOCUMENT]
+
+
+def test_bson_matches_pymongo():
+    bson = pytest.importorskip('bson')
+    assert generate_mongodb.encode_bson(DOCUMENT) == bson.encode(DOCUMENT)
+
+
+def test_bson_concatenated_stream():
+    documents = [{'n': n} for n in range(3)]
+    data = b''.join(generate_mongodb.encode_bson(document) for document in documents)
+    assert list(generate_mongodb.decode_bson(data)) == documents
+
+
+def test_ejson_round_trip():
+    text = generate_mongodb.encode_ejson(DOCUMENT)
+    assert generate_mongodb.decode_ejson(text) == DOCUMENT
+
+
+def test_ejson_dates_outside_iso_range():
+    # Years before 1970 or after 9999 are written as $numberLong milliseconds
+    document = {'before': datetime.datetime(1969, 12, 31, 23, 59, 59), 'after': datetime.datetime(1, 1, 1)}
+    text = generate_mongodb.encode_ejson(document)
+    assert '$numberLong' in text
+    assert generate_mongodb.decode_ejson(text) == document
+
+
+@pytest.mark.parametrize('format', generate_mongodb.INGEST_FORMATS)
+def test_insert_batches(schema, data_path, tmp_path, format):
+    output_dir = str(tmp_path / 'ingest')
+    stats = generate_mongodb.export_insert_many(schema, data_path, output_dir=output_dir, format=format,
+                                                max_documents=3)
+    assert stats['rows'] == {'Host': 2, 'Tag': 2, 'Event': 10}
+    # 10 events in batches of at most 3
+    assert stats['batches'] == 1 + 1 + 4
+
+    db = mongomock.MongoClient().db
+    inserted = generate_mongodb.insert_batches(db, output_dir)
+    assert inserted == {'Host': 2, 'Tag': 2, 'Event': 10}
+
+    event = db.Event.find_one({'UUID': 'e4'}, {'_id': False})
+    assert event == {
+        'UUID': 'e4', 'Name': 'event 4', 'Count': 4, 'Score': 2.0, 'Flag': True,
+        'Day': datetime.datetime(2026, 1, 2), 'Time': datetime.datetime(2026, 1, 2, 3, 4, 5),
+        'Raw': b'raw', 'Host': 'h2', 'Tags': ['t1', 't2'],
+    }
+
+
+def test_insert_batches_by_size(schema, data_path, tmp_path):
+    # A byte limit that fits at most two events splits the batches too
+    output_dir = str(tmp_path / 'ingest')
+    event_table = next(table for table in compile_schema(schema).tables if table.name == 'Event')
+    converters = generate_mongodb.table_converters(event_table)
+    event_sizes = [len(generate_mongodb.encode_bson(generate_mongodb.record_document(record, converters)[0]))
+                   for table_name, record in RECORDS if table_name == 'Event']
+    max_bytes = 3 * min(event_sizes) - 1
+    assert max(event_sizes) <= max_bytes
+    generate_mongodb.export_insert_many(schema, data_path, output_dir=output_dir, format='bson',
+                                        max_bytes=max_bytes)
+
+    with open(os.path.join(output_dir, 'manifest.json'), encoding='utf-8') as f:
+        batches = [batch for batch in json.load(f)['batches'] if batch['collection'] == 'Event']
+    assert len(batches) >= 5
+    assert all(batch['documents'] <= 2 and batch['bytes'] <= max_bytes for batch in batches)
+    assert sum(batch['documents'] for batch in batches) == 10
+
+    db = mongomock.MongoClient().db
+    assert generate_mongodb.insert_batches(db, output_dir)['Event'] == 10
+    assert db.Event.count_documents({}) == 10
+
+
+def test_invalid_values_are_left_out(schema, tmp_path):
+    data_path = tmp_path / 'data.jsonl'
+    records = [{'UUID': 'e1', 'Name': 'bad', 'Count': 'abc', 'Score': '1.5', 'Time': 'yesterday'},
+               {'UUID': 'e2', 'Name': 'big', 'Count': 2 ** 64}]
+    data_path.write_text(''.join(json.dumps({'table': 'Event', 'record': record}) + '\n' for record in records))
+
+    output_dir = str(tmp_path / 'ingest')
+    stats = generate_mongodb.export_insert_many(schema, str(data_path), output_dir=output_dir, format='bson')
+    assert stats['rows']['Event'] == 2
+    assert stats['invalid'] == 3
+
+    db = mongomock.MongoClient().db
+    generate_mongodb.insert_batches(db, output_dir)
+    assert list(db.Event.find({}, {'_id': False})) == [
+        {'UUID': 'e1', 'Name': 'bad', 'Score': 1.5},
+        {'UUID': 'e2', 'Name': 'big'},
+    ]
+
+
+def test_create_indexes(schema, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generate_mongodb.generate(schema)
+
+    db = mongomock.MongoClient().db
+    generate_mongodb.create_indexes(db)
+
+    host_indexes = db.Host.index_information()
+    assert host_indexes['UUID_1']['key'] == [('UUID', 1)]
+    assert host_indexes['UUID_1']['unique']
+
+    event_indexes = db.Event.index_information()
+    assert event_indexes['Host_1']['key'] == [('Host', 1)]
+    assert event_indexes['Tags_1']['key'] == [('Tags', 1)]
+    assert not event_indexes['Host_1'].get('unique', False)
+
+    db.Host.insert_one({'UUID': 'h1'})
+    with pytest.raises(mongomock.DuplicateKeyError):
+        db.Host.insert_one({'UUID': 'h1'})
+
+
+EMBED = {'ForeignKey': 'embed', 'ManyToMany': 'embed'}
+
+
+def test_embedded_columns(schema):
+    schema = compile_schema(schema)
+    embedded = generate_mongodb.embedded_columns(schema, EMBED)
+    assert [(column.name, rel.table.name, rel.column.name) for column, rel in embedded['Event']] == [
+        ('Host', 'Host', 'UUID'), ('Tags', 'Tag', 'UUID'),
+    ]
+    assert list(embedded) == ['Event']
+    assert generate_mongodb.embedded_columns(schema, {'ForeignKey': 'reference'}) == {}
+    assert generate_mongodb.embedded_columns(schema, None) == {}
+
+    with pytest.raises(ValueError, match='embedding mode'):
+        generate_mongodb.embedded_columns(schema, {'ForeignKey': 'inline'})
+    with pytest.raises(ValueError, match='relationship type'):
+        generate_mongodb.embedded_columns(schema, {'OneToMany': 'embed'})
+
+
+def test_embedded_schema_and_indexes(schema, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generate_mongodb.generate(schema, embed=EMBED)
+    with open(os.path.join(generate_mongodb.SCHEMA_DIR, 'Event_schema.json')) as f:
+        properties = json.load(f)['$jsonSchema']['properties']
+    host = {'bsonType': 'object', 'additionalProperties': False,
+            'properties': {'UUID': {'bsonType': 'string'}, 'Name': {'bsonType': 'string'}}}
+    assert properties['Host'] == host
+    assert properties['Tags']['bsonType'] == 'array'
+    assert list(properties['Tags']['items']['properties']) == ['UUID', 'Label']
+
+    with open(os.path.join(generate_mongodb.SCHEMA_DIR, 'Event_indexes.json')) as f:
+        indexes = json.load(f)['indexes']
+    assert [index['name'] for index in indexes] == ['UUID_1', 'Host.UUID_1', 'Tags.UUID_1']
+
+    db = mongomock.MongoClient().db
+    generate_mongodb.create_indexes(db)
+    assert db.Event.index_information()['Host.UUID_1']['key'] == [('Host.UUID', 1)]
+
+
+def test_denormalizer_embeds_documents(schema):
+    denormalizer = generate_mongodb.Denormalizer(compile_schema(schema), EMBED)
+    assert denormalizer
+    assert not generate_mongodb.Denormalizer(compile_schema(schema), {})
+
+    denormalizer.collect(RECORDS)
+    # Only the referenced collections are kept
+    assert sorted(denormalizer.documents) == [('Host', 'UUID'), ('Tag', 'UUID')]
+
+    document = denormalizer.embed('Event', {'UUID': 'e1', 'Host': 'h9', 'Tags': ['t2', None, 't9']})
+    assert document == {'UUID': 'e1', 'Host': {'UUID': 'h9'},
+                        'Tags': [{'UUID': 't2', 'Label': 'audit'}, {'UUID': 't9'}]}
+    assert denormalizer.unresolved == 2
+    assert denormalizer.embed('Host', {'UUID': 'h1'}) == {'UUID': 'h1'}
+
+
+def test_insert_embedded_batches(schema, data_path, tmp_path):
+    output_dir = str(tmp_path / 'ingest')
+    stats = generate_mongodb.export_insert_many(schema, data_path, output_dir=output_dir, format='bson',
+                                                embed=EMBED)
+    assert stats['rows'] == {'Host': 2, 'Tag': 2, 'Event': 10}
+    assert stats['unresolved'] == 0
+
+    db = mongomock.MongoClient().db
+    generate_mongodb.insert_batches(db, output_dir)
+    event = db.Event.find_one({'UUID': 'e4'}, {'_id': False})
+    assert event['Host'] == {'UUID': 'h2', 'Name': 'db-1'}
+    assert event['Tags'] == [{'UUID': 't1', 'Label': 'alert'}, {'UUID': 't2', 'Label': 'audit'}]
+    # Reads by an embedded field need no $lookup
+    assert db.Event.count_documents({'Host.Name': 'web-1'}) == 5
+    assert db.Event.count_documents({'Tags.Label': 'audit'}) == 6
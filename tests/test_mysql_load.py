@@ -0,0 +1,51 @@
+import json
+import os
+
+from generators.generate_sql_mysql import export_load_data, load_data_value
+
+
+def test_value_escaping():
+    assert load_data_value(None, 'VARCHAR(255)') == '\\N'
+    assert load_data_value('a\\b\tc\nd\re\0f', 'VARCHAR(255)') == 'a\\\\b\\tc\\nd\\re\\0f'
+    assert load_data_value('\\N', 'VARCHAR(255)') == '\\\\N'
+    assert load_data_value('', 'VARCHAR(255)') == ''
+    assert load_data_value({'k': [1]}, 'VARCHAR(255)') == '{"k": [1]}'
+    assert load_data_value(True, 'INT') == '1'
+    assert load_data_value('yes', 'TINYINT(1)') == '1'
+    assert load_data_value(0, 'TINYINT(1)') == '0'
+    assert load_data_value('a\tb', 'BLOB') == '610962'
+    assert load_data_value('2026-01-02T03:04:05+02:00', 'DATETIME') == '2026-01-02 01:04:05'
+    assert load_data_value('2026-01-02T03:04:05', 'DATETIME') == '2026-01-02 03:04:05'
+    assert load_data_value('not\ta date', 'DATETIME') == 'not\\ta date'
+
+
+def test_export_files_and_script(schema, data_path, tmp_path):
+    output_dir = str(tmp_path / 'mysql')
+    stats = export_load_data(schema, data_path, output_dir=output_dir)
+    assert stats == {'rows': {'Host': 2, 'Tag': 2, 'Event': 10, 'Event_Tag': 16}, 'skipped': 0}
+    assert sorted(os.listdir(output_dir)) == ['0001_Host.tsv', '0002_Tag.tsv', '0003_Event.tsv',
+                                              '0004_Event_Tag.tsv', 'load_mysql.sql']
+
+    with open(os.path.join(output_dir, '0003_Event.tsv'), 'rb') as f:
+        lines = f.read().split(b'\n')
+    assert lines[3] == b'e3\tevent 3\t3\t1.5\t0\t2026-01-02\t2026-01-02 03:04:05\t726177\th1'
+    assert lines[-1] == b''
+
+    with open(os.path.join(output_dir, 'load_mysql.sql')) as f:
+        script = f.read()
+    assert script.index('`Host`') < script.index('`Event`') < script.index('`Event_Tag`')
+    assert ("LOAD DATA LOCAL INFILE '0003_Event.tsv' INTO TABLE `Event`\n"
+            "    CHARACTER SET utf8mb4\n"
+            "    FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'\n"
+            "    LINES TERMINATED BY '\\n'\n"
+            "    (`UUID`, `Name`, `Count`, `Score`, `Flag`, `Day`, `Time`, @blob_7, `Host`)\n"
+            "    SET `Raw` = UNHEX(@blob_7);") in script
+
+
+def test_multiline_text_stays_on_one_line(schema, tmp_path):
+    data_path = tmp_path / 'data.jsonl'
+    data_path.write_text(json.dumps({'table': 'Host', 'record': {'UUID': 'h1', 'Name': 'two\nlines\t\\'}}) + '\n')
+    output_dir = str(tmp_path / 'mysql')
+    export_load_data(schema, str(data_path), output_dir=output_dir)
+    with open(os.path.join(output_dir, '0001_Host.tsv'), 'rb') as f:
+        assert f.read() == b'h1\ttwo\\nlines\\t\\\\\n'
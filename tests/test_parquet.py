@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from conftest import RECORDS
+from generators import generate_parquet
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def write_records(path, records, trailer=''):
+    with open(path, 'w', encoding='utf-8') as f:
+        for table_name, record in records:
+            f.write(json.dumps({'table': table_name, 'record': record}) + '\n')
+        f.write(trailer)
+    return str(path)
+
+
+def test_export_reads_back(schema, data_path, tmp_path):
+    output_dir = str(tmp_path / 'parquet')
+    stats = generate_parquet.export_parquet(schema, data_path, output_dir=output_dir)
+    assert stats == {'rows': {'Host': 2, 'Tag': 2, 'Event': 10}, 'skipped': 0, 'invalid': 0}
+
+    events = pq.read_table(os.path.join(output_dir, 'Event.parquet')).to_pylist()
+    assert [event['UUID'] for event in events] == [f'e{i}' for i in range(10)]
+    assert events[4]['Tags'] == ['t1', 't2']
+    assert events[4]['Raw'] == b'raw'
+    assert sorted(os.listdir(output_dir)) == ['Event.parquet', 'Host.parquet', 'Tag.parquet']
+
+
+def test_missing_and_invalid_values_are_null(schema, tmp_path):
+    # UUID and Name are NOT NULL in the schema; the export stores the missing
+    # values as null instead of aborting
+    data_path = write_records(tmp_path / 'data.jsonl', [
+        ('Event', {'Name': 'no key', 'Count': '12'}),
+        ('Event', {'UUID': 'e1', 'Count': 'abc', 'Flag': 'yes'}),
+    ])
+    output_dir = str(tmp_path / 'parquet')
+    stats = generate_parquet.export_parquet(schema, data_path, output_dir=output_dir)
+    assert stats['rows']['Event'] == 2
+    assert stats['invalid'] == 1
+
+    events = pq.read_table(os.path.join(output_dir, 'Event.parquet')).to_pylist()
+    assert [(event['UUID'], event['Name'], event['Count'], event['Flag']) for event in events] == [
+        (None, 'no key', 12, None),
+        ('e1', None, None, True),
+    ]
+
+
+def test_failed_export_keeps_previous_files(schema, data_path, tmp_path):
+    output_dir = str(tmp_path / 'parquet')
+    generate_parquet.export_parquet(schema, data_path, output_dir=output_dir)
+    before = {name: os.path.getmtime(os.path.join(output_dir, name)) for name in os.listdir(output_dir)}
+
+    broken = write_records(tmp_path / 'broken.jsonl', RECORDS, trailer='{"table": "Event", "rec\n')
+    with pytest.raises(ValueError):
+        generate_parquet.export_parquet(schema, broken, output_dir=output_dir)
+
+    after = {name: os.path.getmtime(os.path.join(output_dir, name)) for name in os.listdir(output_dir)}
+    assert after == before
+
+
+def test_parts_replace_previous_export(schema, data_path, tmp_path):
+    # One open writer for three interleaved tables: every switch starts a part
+    output_dir = str(tmp_path / 'parquet')
+    interleaved = write_records(tmp_path / 'interleaved.jsonl', [
+        ('Host', {'UUID': 'h1'}), ('Tag', {'UUID': 't1'}), ('Host', {'UUID': 'h2'}), ('Tag', {'UUID': 't2'}),
+    ])
+    generate_parquet.export_parquet(schema, interleaved, output_dir=output_dir, max_open=1, row_group_size=1)
+    assert 'Host.2.parquet' in os.listdir(output_dir)
+    hosts = pq.read_table([os.path.join(output_dir, name) for name in ('Host.parquet', 'Host.2.parquet')])
+    assert hosts.column('UUID').to_pylist() == ['h1', 'h2']
+
+    generate_parquet.export_parquet(schema, data_path, output_dir=output_dir)
+    assert sorted(os.listdir(output_dir)) == ['Event.parquet', 'Host.parquet', 'Tag.parquet']
@@ -0,0 +1,64 @@
+import datetime
+import types
+
+import pytest
+
+from generators import generate_sql_postgres, sql_common
+from generators.cache import GenerationCache
+from generators.schema_model import compile_schema
+from generators.sql_common import partition_fingerprint, partition_plan
+
+PARTITIONS = {'Event': ('Time', 'daily')}
+
+
+def test_plan_bounds(schema):
+    plan = partition_plan(compile_schema(schema), PARTITIONS, datetime.date(2026, 1, 30), 3)
+    assert plan == {'Event': ('Time', 'daily', [
+        ('20260130', datetime.date(2026, 1, 30), datetime.date(2026, 1, 31)),
+        ('20260131', datetime.date(2026, 1, 31), datetime.date(2026, 2, 1)),
+        ('20260201', datetime.date(2026, 2, 1), datetime.date(2026, 2, 2)),
+    ])}
+
+
+def test_plan_rejects_non_date_column(schema):
+    with pytest.raises(ValueError):
+        partition_plan(compile_schema(schema), {'Event': ('Name', 'daily')})
+
+
+def test_fingerprint_ignores_default_start(schema):
+    # Plans made on different days hash the same unless the start is explicit
+    schema = compile_schema(schema)
+    first = partition_plan(schema, PARTITIONS, datetime.date(2026, 1, 1))
+    second = partition_plan(schema, PARTITIONS, datetime.date(2026, 1, 2))
+    assert partition_fingerprint(first) == partition_fingerprint(second)
+    assert (partition_fingerprint(first, datetime.date(2026, 1, 1))
+            != partition_fingerprint(second, datetime.date(2026, 1, 2)))
+
+    longer = partition_plan(schema, PARTITIONS, datetime.date(2026, 1, 1), periods=7)
+    assert partition_fingerprint(first) != partition_fingerprint(longer)
+
+
+class Tomorrow(datetime.date):
+    @classmethod
+    def today(cls):
+        return datetime.date.today() + datetime.timedelta(days=1)
+
+
+def test_incremental_run_keeps_partitions(schema, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    output = tmp_path / generate_sql_postgres.OUTPUT_PATH
+    cache = GenerationCache()
+    generate_sql_postgres.generate(schema, cache=cache, partitions=PARTITIONS)
+    ddl = output.read_text()
+    mtime = output.stat().st_mtime_ns
+
+    # A rerun the next day without a start date reuses the cached DDL
+    monkeypatch.setattr(sql_common, 'datetime', types.SimpleNamespace(date=Tomorrow, timedelta=datetime.timedelta))
+    generate_sql_postgres.generate(schema, cache=cache, partitions=PARTITIONS)
+    assert output.stat().st_mtime_ns == mtime
+
+    # An explicit start date is part of the key
+    generate_sql_postgres.generate(schema, cache=cache, partitions=PARTITIONS,
+                                   partition_start=datetime.date(2020, 1, 1))
+    assert output.read_text() != ddl
+    assert 'p20200101' in output.read_text()
@@ -0,0 +1,102 @@
+import json
+import os
+import struct
+
+import pytest
+
+from generators.generate_sql_postgres import copy_binary_value, encode_copy_row, export_copy
+
+HOSTS = [
+    {'UUID': 'h\\1', 'Name': 'a\tb\nc\rd'},
+    {'UUID': 'h2'},
+    {'UUID': 'h3', 'Name': ''},
+    {'UUID': 'h4', 'Name': 'say "hi", bye'},
+    {'UUID': 'h5', 'Name': '\\.'},
+    {'UUID': 'h6', 'Name': '\\N'},
+]
+
+
+def export_hosts(schema, tmp_path, copy_format):
+    data_path = tmp_path / 'hosts.jsonl'
+    with open(data_path, 'w', encoding='utf-8') as f:
+        for record in HOSTS:
+            f.write(json.dumps({'table': 'Host', 'record': record}) + '\n')
+    output_dir = str(tmp_path / copy_format)
+    stats = export_copy(schema, str(data_path), output_dir=output_dir, copy_format=copy_format)
+    assert stats == {'rows': {'Host': len(HOSTS)}, 'skipped': 0}
+    extension = {'text': 'dat', 'csv': 'csv', 'binary': 'bin'}[copy_format]
+    with open(os.path.join(output_dir, f'0001_Host.{extension}'), 'rb') as f:
+        return f.read()
+
+
+def test_text_escaping(schema, tmp_path):
+    assert export_hosts(schema, tmp_path, 'text') == (
+        b'h\\\\1\ta\\tb\\nc\\rd\n'
+        b'h2\t\\N\n'
+        b'h3\t\n'
+        b'h4\tsay "hi", bye\n'
+        b'h5\t\\\\.\n'
+        b'h6\t\\\\N\n'
+    )
+
+
+def test_csv_quoting(schema, tmp_path):
+    assert export_hosts(schema, tmp_path, 'csv') == (
+        b'"h\\1","a\tb\nc\rd"\n'
+        b'h2,\n'
+        b'h3,""\n'
+        b'h4,"say ""hi"", bye"\n'
+        b'h5,"\\."\n'
+        b'h6,"\\N"\n'
+    )
+
+
+def test_binary_framing(schema, tmp_path):
+    def field(data):
+        return struct.pack('>i', len(data)) + data
+
+    assert export_hosts(schema, tmp_path, 'binary') == (
+        b'PGCOPY\n\xff\r\n\x00' + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00'
+        + b'\x00\x02' + field(b'h\\1') + field(b'a\tb\nc\rd')
+        + b'\x00\x02' + field(b'h2') + b'\xff\xff\xff\xff'
+        + b'\x00\x02' + field(b'h3') + field(b'')
+        + b'\x00\x02' + field(b'h4') + field(b'say "hi", bye')
+        + b'\x00\x02' + field(b'h5') + field(b'\\.')
+        + b'\x00\x02' + field(b'h6') + field(b'\\N')
+        + b'\xff\xff'
+    )
+
+
+def test_typed_values_in_every_format():
+    sql_types = ['INTEGER', 'REAL', 'BOOLEAN', 'DATE', 'TIMESTAMP', 'BYTEA', 'VARCHAR(255)']
+    values = [7, 1.5, 'yes', '2000-01-02', '2000-01-01T00:00:01Z', 'ab', ['x', 1]]
+
+    assert encode_copy_row(values, sql_types, 'text') == (
+        b'7\t1.5\tt\t2000-01-02\t2000-01-01T00:00:01Z\t\\\\x6162\t["x", 1]\n'
+    )
+    assert encode_copy_row(values, sql_types, 'csv') == (
+        b'7,1.5,t,2000-01-02,2000-01-01T00:00:01Z,\\x6162,"[""x"", 1]"\n'
+    )
+    assert encode_copy_row(values, sql_types, 'binary') == (
+        b'\x00\x07'
+        + b'\x00\x00\x00\x04' + b'\x00\x00\x00\x07'
+        + b'\x00\x00\x00\x04' + b'\x3f\xc0\x00\x00'
+        + b'\x00\x00\x00\x01' + b'\x01'
+        + b'\x00\x00\x00\x04' + b'\x00\x00\x00\x01'
+        + b'\x00\x00\x00\x08' + struct.pack('>q', 1000000)
+        + b'\x00\x00\x00\x02' + b'ab'
+        + b'\x00\x00\x00\x08' + b'["x", 1]'
+    )
+
+
+@pytest.mark.parametrize('copy_format, expected', [
+    ('text', b'\\N\t\\N\n'),
+    ('csv', b',\n'),
+    ('binary', b'\x00\x02\xff\xff\xff\xff\xff\xff\xff\xff'),
+])
+def test_null_row(copy_format, expected):
+    assert encode_copy_row([None, None], ['INTEGER', 'BYTEA'], copy_format) == expected
+
+
+def test_binary_timestamp_converts_to_utc():
+    assert copy_binary_value('2000-01-01T01:00:00+01:00', 'TIMESTAMP') == b'\x00\x00\x00\x08' + struct.pack('>q', 0)
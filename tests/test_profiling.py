@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+
+import pytest
+
+from generators import profiling
+from generators.profiling import phase
+
+
+@pytest.fixture
+def enabled():
+    profiling.enable()
+    yield
+    profiling.disable()
+
+
+def by_phase():
+    return {entry['phase']: entry for entry in profiling.results()}
+
+
+def test_disabled_phases_cost_nothing():
+    assert not profiling.is_enabled()
+    assert phase('a') is phase('b', light=True)
+    func = lambda: None
+    assert profiling.propagate(func) is func
+
+
+def test_nested_phases(enabled):
+    with phase('run'):
+        for _ in range(3):
+            with phase('render', light=True):
+                time.sleep(0.002)
+        with phase('write'):
+            data = [bytes(1000) for _ in range(1000)]
+            del data
+
+    stats = by_phase()
+    assert list(stats) == ['run/render', 'run/write', 'run']
+    assert stats['run/render']['calls'] == 3
+    assert stats['run/render']['peak_bytes'] is None
+    assert stats['run/write']['peak_bytes'] > 1000 * 1000
+    run = stats['run']
+    assert run['peak_bytes'] >= stats['run/write']['peak_bytes']
+    assert run['wall_s'] >= stats['run/render']['wall_s'] + stats['run/write']['wall_s']
+    assert run['self_wall_s'] == pytest.approx(
+        run['wall_s'] - stats['run/render']['wall_s'] - stats['run/write']['wall_s'])
+
+
+def test_worker_phases_nest_under_caller(enabled):
+    def work():
+        with phase('table', light=True):
+            pass
+
+    with phase('XML'):
+        worker = threading.Thread(target=profiling.propagate(work))
+        worker.start()
+        worker.join()
+    # A thread started without propagate() records at the top level
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+
+    assert list(by_phase()) == ['XML/table', 'XML', 'table']
+
+
+def test_report_and_json(enabled, tmp_path):
+    with phase('load schema', light=True):
+        pass
+    entries = profiling.results()
+
+    report = profiling.format_report(entries).splitlines()
+    assert report[0].split() == ['phase', 'calls', 'wall', 's', 'self', 's', 'cpu', 's', 'peak', 'MB', 'written',
+                                 'MB']
+    assert report[1].startswith('load schema ')
+    assert report[1].split()[-2:] == ['-', '-']
+
+    path = tmp_path / 'timings.json'
+    profiling.write_json(str(path), entries)
+    with open(path) as f:
+        assert [entry['phase'] for entry in json.load(f)['phases']] == ['load schema']
+
+
+def test_enable_resets_stats(enabled):
+    with phase('old', light=True):
+        pass
+    profiling.enable()
+    assert profiling.results() == []
@@ -0,0 +1,136 @@
+import json
+import os
+
+import pytest
+
+from conftest import RECORDS
+from generators import records
+from generators.generate_json_sample import export_ndjson
+from generators.records import iter_records
+
+
+def write_records(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for table_name, record in records:
+            f.write(json.dumps({'table': table_name, 'record': record}) + '\n')
+    return str(path)
+
+
+def assert_refused(schema, data_path, **options):
+    with open(data_path if os.path.isfile(data_path) else os.path.join(data_path, 'Event.jsonl'), 'rb') as f:
+        before = f.read()
+    with pytest.raises(ValueError):
+        export_ndjson(schema, data_path, **options)
+    # The same path spelled differently
+    with pytest.raises(ValueError):
+        export_ndjson(schema, os.path.join('.', data_path), output=os.path.abspath('cds_data'), **options)
+    with open(data_path if os.path.isfile(data_path) else os.path.join(data_path, 'Event.jsonl'), 'rb') as f:
+        assert f.read() == before
+
+
+def test_ndjson_export_refuses_its_own_output(schema, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert_refused(schema, write_records('cds_data.jsonl', RECORDS))
+
+    export_ndjson(schema, 'cds_data.jsonl', compression='gzip', output='compressed')
+    os.replace('compressed.jsonl.gz', 'cds_data.jsonl.gz')
+    assert_refused(schema, 'cds_data.jsonl.gz', compression='gzip')
+
+
+def test_ndjson_export_refuses_its_own_directory(schema, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    export_ndjson(schema, write_records('data.jsonl', RECORDS), layout='per-table')
+    assert_refused(schema, 'cds_data', layout='per-table')
+
+    os.makedirs('cds_data/tagged')
+    assert_refused(schema, write_records('cds_data/tagged/data.jsonl', RECORDS), layout='per-table')
+
+
+def test_ndjson_export_to_another_path(schema, data_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stats = export_ndjson(schema, data_path)
+    assert stats == {'rows': {'Host': 2, 'Tag': 2, 'Event': 10}, 'skipped': 0}
+    stats = export_ndjson(schema, 'cds_data.jsonl', output='copy')
+    assert stats['rows'] == {'Host': 2, 'Tag': 2, 'Event': 10}
+    assert list(iter_records('copy.jsonl')) == RECORDS
+
+
+def document(records):
+    tables = {}
+    for table_name, record in records:
+        tables.setdefault(table_name, []).append(record)
+    return tables
+
+
+def test_reads_json_document(tmp_path, monkeypatch):
+    # A tiny read window, so values are split across reads
+    monkeypatch.setattr(records, 'CHUNK_SIZE', 7)
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(document(RECORDS), indent=2), encoding='utf-8')
+    assert list(iter_records(str(path))) == RECORDS
+
+    path.write_text('{"Host": [], "Tag": [{"UUID": 12345678901234567890}]}')
+    assert list(iter_records(str(path))) == [('Tag', {'UUID': 12345678901234567890})]
+    path.write_text(' { } ')
+    assert list(iter_records(str(path))) == []
+
+
+def test_rejects_truncated_json_document(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(document(RECORDS))[:-20])
+    with pytest.raises(ValueError):
+        list(iter_records(str(path)))
+
+
+def test_reads_jsonl_and_reports_bad_lines(tmp_path):
+    path = write_records(tmp_path / 'data.ndjson', RECORDS)
+    with open(path, 'a') as f:
+        f.write('\n   \n')
+    assert list(iter_records(path)) == RECORDS
+
+    with open(path, 'a') as f:
+        f.write('{"table": "Host", \n')
+    with pytest.raises(ValueError, match='data.ndjson:17'):
+        list(iter_records(path))
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_reads_compressed_files(compression, tmp_path):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    suffix = {'gzip': '.gz', 'zstd': '.zst'}[compression]
+    text = json.dumps(document(RECORDS))
+    with records.open_text(str(tmp_path / f'data.json{suffix}'), 'w') as f:
+        f.write(text)
+    assert list(iter_records(str(tmp_path / f'data.json{suffix}'))) == RECORDS
+
+    # Appending adds a gzip member / zstd frame; readers see one stream
+    path = str(tmp_path / f'data.jsonl{suffix}')
+    for table_name, record in RECORDS:
+        with records.open_text(path, 'a') as f:
+            f.write(json.dumps({'table': table_name, 'record': record}) + '\n')
+    assert list(iter_records(path)) == RECORDS
+
+
+def test_reads_per_table_directory(tmp_path):
+    directory = tmp_path / 'tables'
+    directory.mkdir()
+    (directory / 'notes.txt').write_text('not data')
+    for table_name, record in RECORDS:
+        suffix = '.jsonl.gz' if table_name == 'Tag' else '.jsonl'
+        with records.open_text(str(directory / f'{table_name}{suffix}'), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    # Tables come in file name order
+    assert list(iter_records(str(directory))) == RECORDS[4:] + RECORDS[:2] + RECORDS[2:4]
+
+
+def test_writer_layouts_read_back(tmp_path):
+    for layout in ('tagged', 'per-table'):
+        output = str(tmp_path / layout)
+        with records.NDJSONWriter(output, layout, 'gzip', max_open=1) as writer:
+            writer.open_table('Empty')
+            for table_name, record in RECORDS:
+                writer.write(table_name, record)
+        assert writer.counts == {'Empty': 0, 'Host': 2, 'Tag': 2, 'Event': 10}
+        path = output + '.jsonl.gz' if layout == 'tagged' else output
+        assert sorted(iter_records(path), key=RECORDS.index) == RECORDS
@@ -0,0 +1,125 @@
+import json
+import os
+
+import pytest
+
+from generators import schema_loader
+from generators.schema_loader import available_backends, load_raw, load_schema
+
+
+def summary(schema):
+    # Everything the generators read from a compiled schema
+    return [
+        (table.name, [
+            (column.name, column.type_name,
+             [(prop.name, prop.value) for prop in column.properties],
+             [(rel.name, rel.type_name, rel.table.name, rel.column.name) for rel in column.relationships])
+            for column in table.columns
+        ])
+        for table in schema.tables
+    ]
+
+
+@pytest.fixture
+def schema_path(schema, tmp_path):
+    # Parts of a real schema document the model does not use
+    schema = dict(schema, enumerations=[{'uuid': 'e', 'name': 'Levels', 'values': ['low', 'high']}])
+    path = tmp_path / 'schema.json'
+    path.write_text(json.dumps(schema), encoding='utf-8')
+    return str(path)
+
+
+def test_json_is_always_available():
+    assert available_backends()[-1] == 'json'
+
+
+@pytest.mark.parametrize('backend', schema_loader.BACKENDS)
+def test_backends_build_the_same_model(backend, schema, schema_path):
+    if backend not in available_backends():
+        pytest.skip(f'{backend} is not installed')
+    expected = summary(load_schema(schema_path, backend='json', use_mmap=False))
+    assert expected[2][1][9] == ('Tags', 'Array(VARCHAR(255))', [], [('Event_Tag', 'ManyToMany', 'Tag', 'UUID')])
+    assert summary(load_schema(schema_path, backend=backend)) == expected
+    assert summary(load_schema(schema_path, backend=backend, use_mmap=False)) == expected
+
+
+@pytest.mark.parametrize('backend', schema_loader.BACKENDS)
+@pytest.mark.parametrize('content', [b'', b'{"tables": [', b'not json'])
+def test_invalid_documents_raise_value_error(backend, content, tmp_path):
+    if backend not in available_backends():
+        pytest.skip(f'{backend} is not installed')
+    path = tmp_path / 'schema.json'
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        load_raw(str(path), backend=backend)
+
+
+def test_falls_back_when_libraries_are_missing(schema_path, monkeypatch):
+    expected = summary(load_schema(schema_path))
+
+    monkeypatch.setattr(schema_loader, 'msgspec', None)
+    assert available_backends() == (['orjson', 'json'] if schema_loader.orjson else ['json'])
+    with pytest.raises(ImportError):
+        load_raw(schema_path, backend='msgspec')
+
+    monkeypatch.setattr(schema_loader, 'orjson', None)
+    assert available_backends() == ['json']
+    assert isinstance(load_raw(schema_path), dict)
+    assert summary(load_schema(schema_path)) == expected
+
+
+def cached(schema_path, cache_path):
+    return summary(schema_loader.load_schema_cached(schema_path, cache_path))
+
+
+def test_cache_hit_skips_loading(schema_path, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'schema.pickle')
+    expected = cached(schema_path, cache_path)
+
+    def fail(*args):
+        raise AssertionError('schema loaded again')
+
+    monkeypatch.setattr(schema_loader, 'load_schema', fail)
+    assert cached(schema_path, cache_path) == expected
+
+
+def test_cache_invalidated_by_schema_change(schema, schema_path, tmp_path):
+    cache_path = str(tmp_path / 'schema.pickle')
+    cached(schema_path, cache_path)
+
+    schema['tables'][0]['name'] = 'Server'
+    with open(schema_path, 'w', encoding='utf-8') as f:
+        json.dump(schema, f)
+    assert cached(schema_path, cache_path)[0][0] == 'Server'
+
+
+def test_cache_invalidated_by_code_change(schema_path, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'schema.pickle')
+    cached(schema_path, cache_path)
+    loads = []
+    load_schema = schema_loader.load_schema
+    monkeypatch.setattr(schema_loader, 'load_schema', lambda *args: loads.append(args) or load_schema(*args))
+
+    # The model code is hashed from the module sources: an edited copy
+    code_dir = tmp_path / 'code'
+    code_dir.mkdir()
+    for name in ('schema_loader.py', 'schema_model.py'):
+        with open(os.path.join(os.path.dirname(schema_loader.__file__), name)) as f:
+            (code_dir / name).write_text(f.read() + ('\n# edited\n' if name == 'schema_model.py' else ''))
+    monkeypatch.setattr(schema_loader, '__file__', str(code_dir / 'schema_loader.py'))
+    cached(schema_path, cache_path)
+    cached(schema_path, cache_path)
+    assert len(loads) == 1
+
+    monkeypatch.setattr(schema_loader, 'SCHEMA_CACHE_VERSION', schema_loader.SCHEMA_CACHE_VERSION + 1)
+    cached(schema_path, cache_path)
+    assert len(loads) == 2
+
+
+def test_unreadable_cache_is_rebuilt(schema_path, tmp_path):
+    cache_path = tmp_path / 'schema.pickle'
+    expected = cached(schema_path, str(cache_path))
+    cache_path.write_bytes(cache_path.read_bytes()[:-10])
+    assert cached(schema_path, str(cache_path)) == expected
+    assert cached(schema_path, str(cache_path)) == expected
+    assert sorted(os.listdir(tmp_path)) == ['schema.json', 'schema.pickle']
@@ -0,0 +1,57 @@
+import json
+import sqlite3
+
+from conftest import RECORDS
+from generators import generate_sql_sqlite
+
+
+def write_records(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for table_name, record in records:
+            f.write(json.dumps({'table': table_name, 'record': record}) + '\n')
+    return str(path)
+
+
+def table_counts(database):
+    conn = sqlite3.connect(database)
+    try:
+        return {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                for name in ('Host', 'Tag', 'Event', 'Event_Tag')}
+    finally:
+        conn.close()
+
+
+def test_load_records(schema, data_path, tmp_path):
+    # Small batches and commits, so both flush paths run
+    database = str(tmp_path / 'cds.sqlite')
+    stats = generate_sql_sqlite.load(schema, data_path, database=database, batch_size=3, commit_every=7)
+    assert stats == {'rows': {'Host': 2, 'Tag': 2, 'Event': 10, 'Event_Tag': 16}, 'skipped': 0,
+                     'foreign_key_violations': 0}
+    assert table_counts(database) == {'Host': 2, 'Tag': 2, 'Event': 10, 'Event_Tag': 16}
+
+    conn = sqlite3.connect(database)
+    try:
+        assert conn.execute('SELECT "Name", "Count", "Score", "Flag", "Raw", "Host" FROM "Event" '
+                            'WHERE "UUID" = ?', ('e3',)).fetchone() == ('event 3', 3, 1.5, 0, b'raw', 'h1')
+        assert conn.execute('SELECT "Tags" FROM "Event_Tag" WHERE "Event_ID" = ? ORDER BY 1',
+                            ('e3',)).fetchall() == [('t1',)]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert 'idx_Event_Name' in indexes
+    finally:
+        conn.close()
+
+
+def test_load_reports_foreign_key_violations(schema, tmp_path):
+    data_path = write_records(tmp_path / 'data.jsonl', RECORDS + [
+        ('Event', {'UUID': 'e10', 'Name': 'orphan', 'Host': 'h9', 'Tags': ['t1', 't9']}),
+        ('Unknown', {'UUID': 'u1'}),
+    ])
+    database = str(tmp_path / 'cds.sqlite')
+    stats = generate_sql_sqlite.load(schema, data_path, database=database)
+    assert stats['rows'] == {'Host': 2, 'Tag': 2, 'Event': 11, 'Event_Tag': 18}
+    assert stats['skipped'] == 1
+    # The unknown host and the unknown tag
+    assert stats['foreign_key_violations'] == 2
+
+    assert generate_sql_sqlite.load(schema, data_path, database=str(tmp_path / 'unchecked.sqlite'),
+                                    check_foreign_keys=False)['foreign_key_violations'] == 0
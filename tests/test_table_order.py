@@ -0,0 +1,80 @@
+import io
+
+from conftest import key_column, make_column, make_schema, make_table
+from generators import generate_sql_postgres
+from generators.schema_model import compile_schema
+from generators.sql_common import StatementStream, order_tables
+
+
+def table(name, *references):
+    return {'name': name, 'foreign_keys': [(f'{referenced}_ID', referenced, 'UUID') for referenced in references]}
+
+
+def stream_order(tables):
+    emitted = []
+    stream = StatementStream(lambda table_def, deferred: emitted.append((table_def['name'], deferred)),
+                             {table_def['name'] for table_def in tables})
+    for table_def in tables:
+        stream.add(table_def)
+    stream.close()
+    return emitted
+
+
+def names(tables):
+    return [table_def['name'] for table_def in tables]
+
+
+def test_referenced_tables_come_first():
+    tables = [table('Event', 'Host', 'Tag'), table('Host', 'Site'), table('Tag'), table('Site')]
+    ordered, deferred = order_tables(tables)
+    assert names(ordered) == ['Tag', 'Site', 'Host', 'Event']
+    assert deferred == set()
+    assert stream_order(tables) == [('Tag', frozenset()), ('Site', frozenset()), ('Host', frozenset()),
+                                    ('Event', frozenset())]
+
+
+def test_self_and_outside_references_never_block():
+    tables = [table('Node', 'Node', 'Elsewhere'), table('Lonely')]
+    ordered, deferred = order_tables(tables)
+    assert names(ordered) == ['Node', 'Lonely']
+    assert deferred == set()
+    assert stream_order(tables) == [('Node', frozenset()), ('Lonely', frozenset())]
+
+
+def test_cycle_defers_one_edge():
+    tables = [table('A', 'B'), table('B', 'A'), table('C', 'A')]
+    ordered, deferred = order_tables(tables)
+    assert names(ordered) == ['B', 'A', 'C']
+    assert deferred == {('B', 'A')}
+    # The stream holds all three back until close(), then orders them the same way
+    assert stream_order(tables) == [('B', frozenset({'A'})), ('A', frozenset()), ('C', frozenset())]
+
+
+def cyclic_schema():
+    schema = make_schema()
+    schema['tables'] = [
+        make_table('A', [key_column('A'), make_column('A', 'B', 'VARCHAR(255)', references=('B', 'UUID'))]),
+        make_table('B', [key_column('B'), make_column('B', 'A', 'VARCHAR(255)', references=('A', 'UUID'))]),
+        make_table('Node', [key_column('Node'),
+                            make_column('Node', 'Parent', 'VARCHAR(255)', references=('Node', 'UUID'))]),
+        make_table('Lonely', [key_column('Lonely')]),
+    ]
+    return schema
+
+
+def test_postgres_ddl_adds_cycle_key_after_tables():
+    out = io.StringIO()
+    generate_sql_postgres.write_ddl(compile_schema(cyclic_schema()), out)
+    ddl = out.getvalue()
+
+    creates = [line.split('"')[1] for line in ddl.splitlines() if line.startswith('CREATE TABLE')]
+    assert creates == ['Node', 'Lonely', 'B', 'A']
+    assert 'FOREIGN KEY ("Parent") REFERENCES "Node"("UUID")' in ddl
+    assert 'FOREIGN KEY ("B") REFERENCES "B"("UUID")' in ddl
+
+    # B is created before A exists, so its key is added once both tables do
+    b_table = ddl[ddl.index('CREATE TABLE "B"'):ddl.index('CREATE TABLE "A"')]
+    assert 'REFERENCES "A"' not in b_table
+    assert ddl.rstrip('\n').splitlines()[-1] == (
+        'ALTER TABLE "B" ADD CONSTRAINT "fk_B_A" FOREIGN KEY ("A") REFERENCES "A"("UUID");'
+    )
@@ -0,0 +1,88 @@
+import json
+import re
+import zipfile
+
+import pytest
+
+pytest.importorskip('xlsxwriter')
+
+from conftest import key_column, make_schema, make_table
+from generators import generate_xlsx
+from generators.generate_xlsx import MAX_SHEET_NAME, sheet_name
+
+LONG = 'NetworkConnectionObservationRecord'
+
+
+def test_sheet_name_parts():
+    used = set()
+    assert sheet_name('Event', 1, used) == 'Event'
+    assert sheet_name('Event', 2, used) == 'Event_2'
+    assert sheet_name(LONG, 12, used) == LONG[:MAX_SHEET_NAME - 3] + '_12'
+
+
+def test_sheet_name_unique_ignoring_case():
+    used = set()
+    names = [
+        sheet_name(LONG + 'A', 1, used),
+        sheet_name(LONG + 'B', 1, used),
+        sheet_name('event_2', 1, used),
+        sheet_name('Event', 2, used),
+        sheet_name(LONG + 'C', 1, used),
+    ]
+    assert names[0] == LONG[:MAX_SHEET_NAME]
+    assert names[1] == LONG[:MAX_SHEET_NAME - 2] + '~2'
+    assert names[3] == 'Event_2~2'
+    assert names[4] == LONG[:MAX_SHEET_NAME - 2] + '~3'
+    assert all(len(name) <= MAX_SHEET_NAME for name in names)
+    assert len({name.lower() for name in names}) == len(names)
+
+
+def test_export_with_colliding_names(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    schema = make_schema()
+    schema['tables'] += [make_table(LONG + 'A', [key_column(LONG + 'A')]),
+                         make_table(LONG + 'B', [key_column(LONG + 'B')])]
+    data_path = tmp_path / 'data.jsonl'
+    data_path.write_text(''.join(json.dumps({'table': table_name, 'record': {'UUID': str(i)}}) + '\n'
+                                 for i, table_name in enumerate([LONG + 'A', LONG + 'B'])))
+
+    generate_xlsx.generate(schema)
+    stats = generate_xlsx.export_xlsx(schema, str(data_path), output_path=str(tmp_path / 'data.xlsx'))
+    assert stats['rows'][LONG + 'A'] == 1
+    assert stats['rows'][LONG + 'B'] == 1
+
+
+def sheet_names(path):
+    with zipfile.ZipFile(path) as archive:
+        workbook = archive.read('xl/workbook.xml').decode('utf-8')
+    return re.findall(r'<sheet name="([^"]+)"', workbook)
+
+
+def test_sheets_follow_the_data(schema, tmp_path):
+    data_path = tmp_path / 'data.jsonl'
+    data_path.write_text(''.join(json.dumps({'table': table_name, 'record': {'UUID': uuid}}) + '\n'
+                                 for table_name, uuid in [('Event', 'e1'), ('Host', 'h1'), ('Event', 'e2')]))
+    output_path = str(tmp_path / 'data.xlsx')
+    stats = generate_xlsx.export_xlsx(schema, str(data_path), output_path=output_path)
+    assert stats['rows'] == {'Host': 1, 'Tag': 0, 'Event': 2}
+    # Tables with records in the order they appear, then the empty ones
+    assert sheet_names(output_path) == ['Event', 'Host', 'Tag']
+
+
+def test_many_tables_under_a_low_file_limit(tmp_path):
+    # One temporary file per sheet would need 400 descriptors
+    resource = pytest.importorskip('resource')
+    schema = make_schema()
+    schema['tables'] = [make_table(f'T{i}', [key_column(f'T{i}')]) for i in range(400)]
+    data_path = tmp_path / 'data.jsonl'
+    data_path.write_text(''.join(json.dumps({'table': f'T{i}', 'record': {'UUID': str(i)}}) + '\n'
+                                 for i in (7, 3)))
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(200, hard), hard))
+    try:
+        stats = generate_xlsx.export_xlsx(schema, str(data_path), output_path=str(tmp_path / 'data.xlsx'))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert stats['rows']['T7'] == 1
+    assert sheet_names(str(tmp_path / 'data.xlsx'))[:3] == ['T7', 'T3', 'T0']
@@ -0,0 +1,92 @@
+import io
+import json
+import os
+import xml.etree.ElementTree as ET
+from xml.dom import minidom
+
+from generators import generate_xml
+from generators.generate_xml import XMLWriter, write_template, write_xsd
+from generators.schema_model import compile_schema
+
+XS = '{http://www.w3.org/2001/XMLSchema}'
+
+
+def minidom_template(table):
+    # How the templates were written before XMLWriter
+    root = ET.Element(table.name)
+    row_element = ET.SubElement(root, 'Row')
+    for column in table.columns:
+        ET.SubElement(row_element, column.name)
+    return minidom.parseString(ET.tostring(root)).toprettyxml(indent='   ')
+
+
+def test_template_matches_minidom(schema):
+    for table in compile_schema(schema).tables:
+        out = io.StringIO()
+        write_template(table, out)
+        assert out.getvalue() == minidom_template(table)
+
+
+def test_writer_escapes_and_drops_invalid_characters():
+    out = io.StringIO()
+    writer = XMLWriter(out, indent=None)
+    writer.start('Row', {'note': 'a "b" & <c>'})
+    writer.element('Name', 'x < y & z\x00\x1f')
+    writer.empty('Empty')
+    writer.close()
+    assert out.getvalue() == '''<Row note='a "b" &amp; &lt;c&gt;'><Name>x &lt; y &amp; z</Name><Empty/></Row>'''
+
+
+def test_xsd(schema):
+    event = next(table for table in compile_schema(schema).tables if table.name == 'Event')
+    out = io.StringIO()
+    write_xsd(event, out)
+    root = ET.fromstring(out.getvalue())
+
+    table_element = root.find(f'{XS}element')
+    assert table_element.get('name') == 'Event'
+    row = table_element.find(f'{XS}complexType/{XS}sequence/{XS}element')
+    assert (row.get('name'), row.get('minOccurs'), row.get('maxOccurs')) == ('Row', '0', 'unbounded')
+
+    columns = {element.get('name'): element for element in row.find(f'{XS}complexType/{XS}sequence')}
+    assert list(columns) == ['UUID', 'Name', 'Count', 'Score', 'Flag', 'Day', 'Time', 'Raw', 'Host', 'Tags']
+    assert {name: element.get('type') for name, element in columns.items() if name != 'Tags'} == {
+        'UUID': 'xs:string', 'Name': 'xs:string', 'Count': 'xs:long', 'Score': 'xs:double',
+        'Flag': 'xs:boolean', 'Day': 'xs:date', 'Time': 'xs:dateTime', 'Raw': 'xs:string', 'Host': 'xs:string',
+    }
+    # NOT NULL columns are required, everything else optional
+    assert [name for name, element in columns.items() if element.get('minOccurs') != '0'] == ['UUID', 'Name']
+    item = columns['Tags'].find(f'{XS}complexType/{XS}sequence/{XS}element')
+    assert (item.get('name'), item.get('type'), item.get('maxOccurs')) == ('Item', 'xs:string', 'unbounded')
+
+
+def test_export_data(schema, data_path, tmp_path):
+    output_dir = str(tmp_path / 'xml')
+    stats = generate_xml.export_xml(schema, data_path, output_dir=output_dir)
+    assert stats == {'rows': {'Host': 2, 'Tag': 2, 'Event': 10}, 'skipped': 0}
+
+    events = ET.parse(os.path.join(output_dir, 'Event.xml')).getroot()
+    assert len(events) == 10
+    event = events[4]
+    assert event.find('Name').text == 'event 4'
+    assert event.find('Flag').text == 'true'
+    assert [item.text for item in event.find('Tags')] == ['t1', 't2']
+
+
+def test_export_escapes_and_closes_empty_tables(schema, tmp_path):
+    data_path = tmp_path / 'data.jsonl'
+    data_path.write_text(json.dumps({'table': 'Host', 'record': {'UUID': 'h<1>', 'Name': 'a & b\x0b'}}) + '\n')
+    output_dir = str(tmp_path / 'xml')
+    generate_xml.export_xml(schema, str(data_path), output_dir=output_dir, indent='  ')
+
+    with open(os.path.join(output_dir, 'Host.xml'), encoding='utf-8') as f:
+        assert f.read() == (
+            '<?xml version="1.0" ?>\n'
+            '<Host>\n'
+            '  <Row>\n'
+            '    <UUID>h&lt;1&gt;</UUID>\n'
+            '    <Name>a &amp; b</Name>\n'
+            '  </Row>\n'
+            '</Host>\n'
+        )
+    assert len(ET.parse(os.path.join(output_dir, 'Event.xml')).getroot()) == 0